@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+
+"""
+Differential test for faster implementations of the extraction rules. Runs the reference
+implementation and a candidate side by side over a corpus of decisions, compares their records
+field by field, and reports the mismatch rate of each field and the speed of each
+implementation. A candidate can only replace the reference once every field matches.
+
+The target selects what is compared, and the signature the candidate must have:
+
+    pipeline    extract_decision(html) -> context
+    general     extract_general_metadata(html, context)
+    skca_2003   skca_2003_instructions(context, metadata_lines)
+    skca_2015   skca_2015_instructions(context, metadata_lines)
+
+The rule-set targets receive the context and headnote lines the reference pipeline produces
+before it applies the rules. The corpus is any mix of HTML files, directories of them and
+synthetic pages. Records are compared as the API serializes them, so a tuple and a list with the
+same items match; the order of the keywords, which are deduplicated through a set, is ignored.
+
+To guard a change to the reference itself, record its output before the change and compare the
+changed code with the recording afterwards:
+
+    python benchmarks/differential.py pages/ --synthetic 500 --candidate fast:extract_decision
+    python benchmarks/differential.py pages/ --synthetic 500 --record golden.jsonl
+    python benchmarks/differential.py pages/ --synthetic 500 --golden golden.jsonl
+
+The exit status is 1 if any field differs.
+"""
+
+import argparse
+import contextlib
+import copy
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from synthetic_pages import make_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the runs out of the metrics of a server running from the same checkout
+METRICS_DIR = tempfile.TemporaryDirectory(prefix="differential-metrics-")
+os.environ["METADATA_METRICS_DIR"] = METRICS_DIR.name
+
+REFERENCES = {
+    "pipeline": "metadata.pipeline:extract_decision",
+    "general": "metadata.rules.general:extract_general_metadata",
+    "skca_2003": "metadata.rules.skca_2003:skca_2003_instructions",
+    "skca_2015": "metadata.rules.skca_2015:skca_2015_instructions",
+}
+
+# The value recorded for a field that one implementation did not produce
+MISSING = "<missing>"
+
+# The pseudo-field under which an exception raised by an implementation is compared
+ERROR_FIELD = "<error>"
+
+# Fields built from a set, whose order follows string hashing and so changes between processes
+UNORDERED_FIELDS = {"keywords_list"}
+
+
+def load_function(path: str) -> Callable:
+    """
+    Imports a function given as "package.module:function".
+    """
+
+    module_name, _, attribute = path.partition(":")
+    if not attribute:
+        module_name, _, attribute = path.rpartition(".")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def read_corpus(paths: List[str], synthetic: int) -> Iterator[Tuple[str, str]]:
+    """
+    Yields the ID and HTML of each decision: the HTML files given or found in the directories
+    given, by path, then the synthetic pages, by number.
+    """
+
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(
+                os.path.join(directory, name)
+                for directory, _, files in os.walk(path)
+                for name in files
+                if name.lower().endswith((".html", ".htm"))
+            )
+        else:
+            names = [path]
+        for name in names:
+            with open(name, "r", encoding="utf-8", errors="replace") as file:
+                yield name, file.read()
+
+    for index, page in enumerate(make_corpus(synthetic)):
+        yield f"synthetic-{index:05d}", page
+
+
+def prepare(target: str, html: str) -> Tuple:
+    """
+    Returns the arguments of the target for a decision. The rule-set targets get the context
+    and headnote lines that the reference pipeline passes to the rules.
+    """
+
+    if target in ("pipeline", "general"):
+        return (html,)
+
+    from metadata.rules.general import extract_general_metadata
+    from metadata.utils.html_to_markdown_canlii import html_to_markdown, refine_markdown
+    from metadata.utils.markdown import process_markdown
+
+    context: Dict[str, Any] = {}
+    extract_general_metadata(html, context)
+    metadata_lines, _ = process_markdown(refine_markdown(html_to_markdown(html)))
+    return context, metadata_lines
+
+
+def run(target: str, function: Callable, arguments: Tuple) -> Tuple[Dict[str, Any], float]:
+    """
+    Runs one implementation on prepared arguments.
+
+    Returns:
+        Tuple[Dict[str, Any], float]: The decision's record, with the exception under
+        ERROR_FIELD if one was raised, and the seconds the call took.
+    """
+
+    from metadata.serializers import to_json_record
+
+    if target == "pipeline":
+        call_arguments = arguments
+    elif target == "general":
+        call_arguments = (arguments[0], {})
+    else:
+        # The rules modify both arguments, so each implementation gets its own copy
+        call_arguments = (copy.deepcopy(arguments[0]), list(arguments[1]))
+
+    start = time.perf_counter()
+    try:
+        result = function(*call_arguments)
+        error = None
+    except Exception as e:
+        result = None
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+
+    if target == "pipeline":
+        context = result
+    elif target == "general":
+        context = call_arguments[1]
+    else:
+        context = call_arguments[0]
+    if not isinstance(context, dict):
+        context = {}
+    record = to_json_record(context)
+    if error is not None:
+        record[ERROR_FIELD] = error
+    return record, elapsed
+
+
+def compare(
+    reference: Dict[str, Any], candidate: Dict[str, Any], ignore: List[str]
+) -> List[str]:
+    """
+    Returns the fields whose values differ between two records, including fields only one of
+    them has.
+    """
+
+    def value(record: Dict[str, Any], field: str) -> Any:
+        value = record.get(field, MISSING)
+        if field in UNORDERED_FIELDS and isinstance(value, list):
+            return sorted(value, key=repr)
+        return value
+
+    fields = (set(reference) | set(candidate)) - set(ignore)
+    return sorted(field for field in fields if value(reference, field) != value(candidate, field))
+
+
+def shorten(value: Any, length: int = 120) -> str:
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= length else text[: length - 3] + "..."
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="*", help="HTML files or directories of them")
+    parser.add_argument("--synthetic", type=int, default=0, help="Synthetic pages to add")
+    parser.add_argument("--target", choices=REFERENCES, default="pipeline")
+    parser.add_argument("--reference", help="The reference function (default: per target)")
+    parser.add_argument("--candidate", help="The candidate function, as module:function")
+    parser.add_argument("--record", help="Write the reference's records to this JSONL file")
+    parser.add_argument(
+        "--golden", help="Compare the candidate with the records in this JSONL file"
+    )
+    parser.add_argument(
+        "--ignore", action="append", default=[], help="A field to leave out of the comparison"
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per decision")
+    parser.add_argument("--show", type=int, default=10, help="Mismatches to print")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    if not args.paths and not args.synthetic:
+        parser.error("give HTML files, directories or --synthetic")
+    if args.record and (args.candidate or args.golden):
+        parser.error("--record only runs the reference")
+
+    reference_path = args.reference or REFERENCES[args.target]
+    reference = load_function(reference_path)
+    # Against a recording, the candidate defaults to the current reference code
+    candidate_path = args.candidate or (reference_path if args.golden else None)
+    candidate = load_function(candidate_path) if candidate_path else None
+    if candidate is None and not args.record:
+        parser.error("give --candidate, --golden or --record")
+
+    golden: Dict[str, Dict[str, Any]] = {}
+    if args.golden:
+        with open(args.golden, "r", encoding="utf-8") as file:
+            for line in file:
+                item = json.loads(line)
+                if item["target"] != args.target:
+                    parser.error(f"{args.golden} holds records of the {item['target']} target")
+                golden[item["id"]] = item["record"]
+    record_file = open(args.record, "w", encoding="utf-8") if args.record else None
+
+    documents = 0
+    mismatched_documents = 0
+    field_mismatches: Counter = Counter()
+    examples: List[Tuple[str, str, Any, Any]] = []
+    seconds = {"reference": 0.0, "candidate": 0.0}
+    unmatched: List[str] = []
+
+    # The rule sets print as they go; keep that out of the report
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for document_id, html in read_corpus(args.paths, args.synthetic):
+            expected: Optional[Dict[str, Any]] = golden.get(document_id)
+            if args.golden and expected is None:
+                unmatched.append(document_id)
+                continue
+            arguments = prepare(args.target, html)
+
+            # Alternate the implementations so that drift in the machine's speed affects both
+            actual: Optional[Dict[str, Any]] = None
+            reference_times, candidate_times = [], []
+            for _ in range(args.repeat):
+                if not args.golden:
+                    expected, elapsed = run(args.target, reference, arguments)
+                    reference_times.append(elapsed)
+                if candidate is not None:
+                    actual, elapsed = run(args.target, candidate, arguments)
+                    candidate_times.append(elapsed)
+            seconds["reference"] += min(reference_times, default=0.0)
+            seconds["candidate"] += min(candidate_times, default=0.0)
+            documents += 1
+
+            if record_file is not None:
+                line = {"id": document_id, "target": args.target, "record": expected}
+                record_file.write(json.dumps(line) + "\n")
+                continue
+
+            fields = compare(expected, actual, args.ignore)
+            if fields:
+                mismatched_documents += 1
+            for field in fields:
+                field_mismatches[field] += 1
+                if len(examples) < args.show:
+                    values = (expected.get(field, MISSING), actual.get(field, MISSING))
+                    examples.append((document_id, field, *values))
+
+    if record_file is not None:
+        record_file.close()
+        print(
+            f"Recorded {documents} {args.target} records from {reference_path} in "
+            f"{args.record} ({seconds['reference']:.2f}s)"
+        )
+        return
+
+    summary = {
+        "target": args.target,
+        "reference": args.golden or reference_path,
+        "candidate": candidate_path,
+        "documents": documents,
+        "mismatched_documents": mismatched_documents,
+        "field_mismatch_rates": {
+            field: count / documents for field, count in field_mismatches.most_common()
+        },
+        "reference_seconds": None if args.golden else seconds["reference"],
+        "candidate_seconds": seconds["candidate"],
+        "not_in_recording": unmatched,
+    }
+
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(f"Target {args.target}: {documents} documents")
+        print(f"    reference  {summary['reference']}")
+        print(f"    candidate  {candidate_path}")
+        print()
+        print(f"{'implementation':<16}{'docs/s':>10}{'mean ms':>10}")
+        for side in ("reference", "candidate"):
+            if side == "reference" and args.golden:
+                continue
+            rate = documents / seconds[side] if seconds[side] else 0.0
+            mean = seconds[side] * 1000 / documents if documents else 0.0
+            print(f"{side:<16}{rate:>10.1f}{mean:>10.3f}")
+        if not args.golden and seconds["candidate"]:
+            print(f"speedup {seconds['reference'] / seconds['candidate']:.2f}x")
+        print()
+
+        rate = mismatched_documents / documents if documents else 0.0
+        print(f"Documents with a mismatch: {mismatched_documents} ({rate:.1%})")
+        if field_mismatches:
+            print(f"{'field':<32}{'mismatches':>12}{'rate':>8}")
+            for field, count in field_mismatches.most_common():
+                print(f"{field:<32}{count:>12}{count / documents:>8.1%}")
+            print()
+            for document_id, field, expected_value, actual_value in examples:
+                print(f"{document_id} {field}")
+                print(f"    reference  {shorten(expected_value)}")
+                print(f"    candidate  {shorten(actual_value)}")
+        if unmatched:
+            print(f"{len(unmatched)} documents are not in the recording, e.g. {unmatched[0]}")
+
+    sys.exit(1 if field_mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
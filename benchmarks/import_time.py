@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Measures the startup cost of each entry point: the time a fresh interpreter takes to import
+what a web worker, an extraction pool worker or a CLI run needs before it does any work. Each
+target runs in new processes under "python -X importtime"; the fastest of the repeats is
+reported, with the modules that dominate it.
+
+    python benchmarks/import_time.py --repeat 5 --top 10
+    python benchmarks/import_time.py --json >> import_times.jsonl
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUP_DJANGO = (
+    "import os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canlii_analytics.settings'); "
+    "import django; django.setup(); "
+)
+
+# What each kind of process imports before it can serve its first request or command
+TARGETS = {
+    "web": SETUP_DJANGO + "from django.conf import settings; "
+    "__import__(settings.ROOT_URLCONF)",
+    "pool_worker": "import metadata.pipeline",
+    "manage": SETUP_DJANGO + "import django.core.management",
+    "markdown_cli": "import metadata.utils.html_to_markdown_canlii",
+    "extractor_cli": "import metadata.rules.metadata_extractor_canlii",
+}
+
+# "import time: self [us] | cumulative | imported package"
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_target(code: str) -> Tuple[float, int, List[Tuple[int, str]]]:
+    """
+    Imports a target in a fresh interpreter.
+
+    Returns:
+        Tuple[float, int, List[Tuple[int, str]]]: The wall time of the process in seconds, the
+        total import time in microseconds, and the cumulative time of each top-level import.
+    """
+
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    total = 0
+    top_level: List[Tuple[int, str]] = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        total += int(self_us)
+        # Top-level imports are indented by a single space
+        if len(indent) == 1:
+            top_level.append((int(cumulative_us), module))
+    return wall, total, top_level
+
+
+def measure(code: str, repeat: int) -> Dict:
+    """
+    Runs a target repeat times and keeps the fastest run, which is the least disturbed by
+    other processes and by a cold filesystem cache.
+    """
+
+    runs = [run_target(code) for _ in range(repeat)]
+    wall, total, top_level = min(runs, key=lambda run: run[1])
+    return {
+        "wall_ms": min(run[0] for run in runs) * 1000,
+        "import_ms": total / 1000,
+        "top": sorted(top_level, reverse=True),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "targets", nargs="*", help=f"Any of: {', '.join(TARGETS)}. Defaults to all of them."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Modules listed per target")
+    parser.add_argument("--json", action="store_true", help="Print one JSON line per target")
+    args = parser.parse_args()
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    baseline = measure("pass", args.repeat)
+    if not args.json:
+        print(f"Interpreter startup: {baseline['wall_ms']:.1f} ms wall\n")
+
+    for target in args.targets or TARGETS:
+        try:
+            result = measure(TARGETS[target], args.repeat)
+        except RuntimeError as e:
+            # e.g. an optional dependency of a CLI that is not installed
+            print(f"{target}: failed ({e})", file=sys.stderr)
+            continue
+
+        if args.json:
+            print(
+                json.dumps(
+                    {
+                        "target": target,
+                        "wall_ms": round(result["wall_ms"], 1),
+                        "import_ms": round(result["import_ms"], 1),
+                        "startup_ms": round(result["wall_ms"] - baseline["wall_ms"], 1),
+                    }
+                )
+            )
+            continue
+
+        print(
+            f"{target}: {result['wall_ms']:.1f} ms wall, "
+            f"{result['import_ms']:.1f} ms importing"
+        )
+        for cumulative_us, module in result["top"][: args.top]:
+            print(f"    {cumulative_us / 1000:8.1f} ms  {module}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""
+Load test for the metadata views. Posts a CanLII page to the synchronous view ("/") and the
+async worker-pool view ("/async/") from a number of concurrent clients and reports requests per
+second and latency percentiles for each.
+
+Run the server under an ASGI server so that the async view does not fall back to a thread, e.g.
+
+    uvicorn canlii_analytics.asgi:application --port 8000
+    python benchmarks/load_test.py page.html --url http://127.0.0.1:8000 --clients 16
+
+Responses with status 503 (pool saturated) are counted separately from errors.
+"""
+
+import argparse
+import http.cookiejar
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, List
+
+
+def make_opener() -> urllib.request.OpenerDirector:
+    return urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+    )
+
+
+def csrf_token(opener: urllib.request.OpenerDirector, url: str) -> str:
+    """
+    Loads the form once so that the opener holds a CSRF cookie, and returns the token.
+    """
+
+    opener.open(url).read()
+    for handler in opener.handlers:
+        if isinstance(handler, urllib.request.HTTPCookieProcessor):
+            for cookie in handler.cookiejar:
+                if cookie.name == "csrftoken":
+                    return cookie.value
+    raise RuntimeError(f"No CSRF cookie set by {url}")
+
+
+def run_client(
+    url: str, body: str, deadline: float, latencies: List[float], statuses: Dict[int, int]
+) -> None:
+    """
+    Posts the page to the URL repeatedly until the deadline, recording each latency.
+    """
+
+    opener = make_opener()
+    token = csrf_token(opener, url)
+    data = urllib.parse.urlencode({"textfield": body, "csrfmiddlewaretoken": token}).encode()
+
+    while time.perf_counter() < deadline:
+        request = urllib.request.Request(url, data=data, headers={"Referer": url})
+        start = time.perf_counter()
+        try:
+            with opener.open(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except urllib.error.URLError:
+            status = 0
+        elapsed = time.perf_counter() - start
+
+        # list.append and dict updates under the GIL are enough for counters like these
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append(elapsed)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def load_test(url: str, body: str, clients: int, duration: float) -> Dict[str, float]:
+    """
+    Runs the load test against one URL.
+
+    Returns:
+        Dict[str, float]: Requests per second, latency percentiles in milliseconds and the
+        number of 503 and failed responses.
+    """
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=run_client, args=(url, body, deadline, latencies, statuses))
+        for _ in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "ok": len(latencies),
+        "busy": statuses.get(503, 0),
+        "failed": sum(count for status, count in statuses.items() if status not in (200, 503)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("page", help="Path to the HTML source of a CanLII decision")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL")
+    parser.add_argument(
+        "--paths", nargs="+", default=["/", "/async/"], help="View paths to compare"
+    )
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per view")
+    args = parser.parse_args()
+
+    with open(args.page, "r", encoding="utf-8") as file:
+        body = file.read()
+
+    print(f"{'path':<12}{'rps':>8}{'p50 ms':>10}{'p99 ms':>10}{'ok':>8}{'503':>6}{'failed':>8}")
+    for path in args.paths:
+        result = load_test(args.url.rstrip("/") + path, body, args.clients, args.duration)
+        print(
+            f"{path:<12}{result['rps']:>8.1f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            f"{result['ok']:>8}{result['busy']:>6}{result['failed']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+"""
+Times the extraction pipeline on synthetic CanLII pages from synthetic_pages.py: every
+instrumented stage of extract_decision(), and the full flow of the index view (form post,
+cache lookup, extraction, pagination and template render) through Django's test client, for
+corpora of increasing size. The pages are the same on every run, so results taken before and
+after a change are comparable; each size runs --repeat times and the fastest run is kept.
+
+    python benchmarks/pipeline_suite.py --sizes 1 10 100 1000 10000
+    python benchmarks/pipeline_suite.py --sizes 100 --case-links 500 --json >> pipeline.jsonl
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List
+
+from synthetic_pages import make_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the benchmark's counters out of the metrics of a server running from the same checkout.
+# The directory is removed at exit, after the metrics module's final write.
+METRICS_DIR = tempfile.TemporaryDirectory(prefix="pipeline-suite-metrics-")
+os.environ["METADATA_METRICS_DIR"] = METRICS_DIR.name
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def setup_django() -> None:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "canlii_analytics.settings")
+    import django
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    # Lets the test client through ALLOWED_HOSTS, as under the test runner
+    setup_test_environment()
+
+
+def time_stages(pages: Iterator[str]) -> Dict[str, Any]:
+    """
+    Extracts each page with instrumentation enabled.
+
+    Returns:
+        Dict[str, Any]: "documents", "seconds" (the total extraction time, excluding page
+        generation) and "stages", the StageStats of each stage.
+    """
+
+    from metadata import instrumentation
+    from metadata.pipeline import extract_decision
+
+    instrumentation.enable()
+    instrumentation.reset()
+    documents = 0
+    seconds = 0.0
+    for page in pages:
+        start = time.perf_counter()
+        extract_decision(page)
+        seconds += time.perf_counter() - start
+        documents += 1
+    stages = instrumentation.snapshot()
+    instrumentation.disable()
+    return {"documents": documents, "seconds": seconds, "stages": stages}
+
+
+def time_index(pages: Iterator[str]) -> Dict[str, Any]:
+    """
+    Posts each page to the index view, starting from an empty result cache.
+
+    Returns:
+        Dict[str, Any]: "documents", "seconds" and the "latencies" of the requests in seconds.
+    """
+
+    from django.test import Client
+
+    from metadata.cache import get_result_cache
+
+    get_result_cache().clear()
+    client = Client()
+    latencies = []
+    for page in pages:
+        start = time.perf_counter()
+        response = client.post("/", {"textfield": page})
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"The index view responded with {response.status_code}")
+    return {"documents": len(latencies), "seconds": sum(latencies), "latencies": latencies}
+
+
+def best_of(repeat: int, run, corpus) -> Dict[str, Any]:
+    """
+    Runs a benchmark repeat times on fresh copies of the corpus and keeps the fastest run.
+    """
+
+    runs = []
+    for _ in range(repeat):
+        gc.collect()
+        runs.append(run(corpus()))
+    return min(runs, key=lambda result: result["seconds"])
+
+
+def stage_rows(size: int, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rows = []
+    for name, stats in sorted(result["stages"].items(), key=lambda item: -item[1].wall.total):
+        rows.append(
+            {
+                "size": size,
+                "benchmark": "stage",
+                "name": name,
+                "calls": stats.wall.count,
+                "total_ms": stats.wall.total / 1e6,
+                "per_document_ms": stats.wall.total / 1e6 / result["documents"],
+                "p50_ms": stats.wall.quantile(0.5) / 1e6,
+                "p99_ms": stats.wall.quantile(0.99) / 1e6,
+            }
+        )
+    return rows
+
+
+def index_row(size: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    latencies = result["latencies"]
+    return {
+        "size": size,
+        "benchmark": "index",
+        "name": "views.index",
+        "calls": len(latencies),
+        "total_ms": result["seconds"] * 1000,
+        "per_document_ms": result["seconds"] * 1000 / len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def print_rows(title: str, rows: List[Dict[str, Any]]) -> None:
+    columns = ("calls", "total_ms", "per_document_ms", "p50_ms", "p99_ms")
+    print(title)
+    print(f"    {'name':<44}" + "".join(f"{column:>16}" for column in columns))
+    for row in rows:
+        values = [f"{row['calls']:>16}"] + [f"{row[column]:>16.3f}" for column in columns[1:]]
+        print(f"    {row['name']:<44}" + "".join(values))
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--case-links", type=int, default=50)
+    parser.add_argument("--legislation-links", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the best is kept")
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        choices=("stages", "index"),
+        default=["stages", "index"],
+    )
+    parser.add_argument("--json", action="store_true", help="Print one JSON line per row")
+    args = parser.parse_args()
+
+    setup_django()
+
+    def corpus(size):
+        return lambda: make_corpus(
+            size, args.case_links, args.legislation_links, args.paragraphs
+        )
+
+    # The rule sets print as they go; keep that out of the report
+    quiet = contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    # Load the rule sets and compile their patterns before anything is timed
+    with quiet:
+        time_stages(corpus(2)())
+
+    for size in args.sizes:
+        rows = []
+        if "stages" in args.benchmarks:
+            with quiet:
+                result = best_of(args.repeat, time_stages, corpus(size))
+            rows.extend(stage_rows(size, result))
+            documents_per_second = result["documents"] / result["seconds"]
+        if "index" in args.benchmarks:
+            with quiet:
+                result = best_of(args.repeat, time_index, corpus(size))
+            rows.append(index_row(size, result))
+
+        if args.json:
+            for row in rows:
+                rounded = {
+                    key: round(value, 3) if isinstance(value, float) else value
+                    for key, value in row.items()
+                }
+                print(json.dumps(rounded))
+            continue
+
+        title = f"{size} documents"
+        if "stages" in args.benchmarks:
+            title += f" ({documents_per_second:.1f} extracted per second)"
+        print_rows(title, rows)
+
+
+if __name__ == "__main__":
+    main()
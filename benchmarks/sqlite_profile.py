@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+"""
+Compares SQLite profiles for ingestion: the ingest rate while reader processes query the
+decision tables, the readers' latency and lock errors, and optionally the rate of a
+bulk_load() ingest. Each profile runs in its own process against a fresh temporary database.
+Readers are separate processes, like web workers, so they do not compete with the writer for
+the GIL, and pause between queries like a page view would.
+
+    python benchmarks/sqlite_profile.py page.html --decisions 20000 --readers 4 --bulk
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def make_records(page: str, count: int) -> List[Dict[str, Any]]:
+    """
+    Extracts the sample page once and copies the record under distinct primary keys and years.
+    """
+
+    from metadata.pipeline import extract_decision
+    from metadata.serializers import to_json_record
+
+    record = to_json_record(extract_decision(page))
+    records = []
+    for index in range(count):
+        copy = dict(record)
+        copy["primary_key"] = f"{record.get('primary_key', 'decision')}-{index}"
+        copy["decision_year"] = str(2000 + index % 24)
+        records.append(copy)
+    return records
+
+
+def setup_django() -> None:
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "canlii_analytics.settings")
+    import django
+
+    django.setup()
+
+
+def reader(stop, results, pause: float) -> None:
+    """
+    Queries decisions by court and year until stopped, then reports its latencies and errors.
+    """
+
+    setup_django()
+    from django.db import OperationalError, connection
+
+    from metadata.models import Decision
+
+    latencies: List[float] = []
+    errors = 0
+    year = 2000
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            Decision.objects.filter(
+                jurisdiction="Saskatchewan", court_code="skca", decision_year=year
+            ).count()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+        year = 2000 + (year + 1) % 24
+        time.sleep(pause)
+    connection.close()
+    results.put((latencies, errors))
+
+
+def run_profile(page: str, decisions: int, readers: int, chunk_size: int, bulk: bool) -> Dict:
+    """
+    Runs the benchmark in this process. CANLII_SQLITE_PROFILE and CANLII_DB_PATH must be set
+    before Django is configured; the reader processes inherit them.
+    """
+
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+
+    from metadata.db import bulk_load
+    from metadata.ingest import ingest_decisions
+
+    call_command("migrate", verbosity=0)
+    records = make_records(page, decisions)
+
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=reader, args=(stop, results, 0.005)) for _ in range(readers)
+    ]
+    for process in processes:
+        process.start()
+    # Let the readers finish starting Django before the clock starts
+    time.sleep(2)
+
+    start = time.perf_counter()
+    ingest_decisions(records, chunk_size)
+    elapsed = time.perf_counter() - start
+    stop.set()
+
+    latencies: List[float] = []
+    errors = 0
+    for _ in processes:
+        reader_latencies, reader_errors = results.get()
+        latencies.extend(reader_latencies)
+        errors += reader_errors
+    for process in processes:
+        process.join()
+
+    result = {
+        "ingest_per_s": decisions / elapsed,
+        "read_p50_ms": percentile(latencies, 0.50) * 1000,
+        "read_p99_ms": percentile(latencies, 0.99) * 1000,
+        "reads": len(latencies),
+        "read_errors": errors,
+    }
+
+    if bulk:
+        # Re-ingest under new keys into the same database with the indexes suspended
+        for record in records:
+            record["primary_key"] += "-bulk"
+        start = time.perf_counter()
+        with bulk_load():
+            ingest_decisions(records, chunk_size)
+        result["bulk_ingest_per_s"] = decisions / (time.perf_counter() - start)
+
+    connection.close()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("page", help="Path to the HTML source of a CanLII decision")
+    parser.add_argument("--decisions", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--bulk", action="store_true", help="Also time a bulk_load() ingest")
+    parser.add_argument("--profiles", nargs="+", default=["development", "production"])
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    with open(args.page, "r", encoding="utf-8") as file:
+        page = file.read()
+
+    if args.run:
+        result = run_profile(page, args.decisions, args.readers, args.chunk_size, args.bulk)
+        print(json.dumps(result))
+        return
+
+    columns = ["ingest_per_s", "read_p50_ms", "read_p99_ms", "reads", "read_errors"]
+    if args.bulk:
+        columns.append("bulk_ingest_per_s")
+    print(f"{'profile':<12}" + "".join(f"{column:>19}" for column in columns))
+
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                CANLII_SQLITE_PROFILE=profile,
+                CANLII_DB_PATH=os.path.join(directory, "benchmark.sqlite3"),
+            )
+            output = subprocess.run(
+                [sys.executable, __file__, *sys.argv[1:], "--run", profile],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:<12}" + "".join(f"{result[column]:>19.1f}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
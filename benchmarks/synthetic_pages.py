@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+
+"""
+Generates synthetic CanLII decision pages for benchmarks: Saskatchewan Court of Appeal
+decisions with the lbh-* <meta> tags, the judgmentLinks and legislationLinks lists, the
+headnote table in the 2003-2014 or the 2015-onward layout, and a body of numbered paragraphs
+that cite cases and statutes. Names, links and citations are drawn from a seeded generator, so
+the same arguments always give the same pages.
+
+    python benchmarks/synthetic_pages.py pages/ --count 100 --case-links 200 --paragraphs 80
+"""
+
+import argparse
+import html
+import os
+import random
+from datetime import date, timedelta
+from typing import Iterator, List, Optional, Tuple, Union
+
+JUDGES = [
+    "Barrington-Foote", "Caldwell", "Cameron", "Drennan", "Gerwing", "Herauf", "Jackson",
+    "Kalmakoff", "Klebuc", "Lane", "Leurer", "McMurtry", "Ottenbreit", "Richards",
+    "Ryan-Froslie", "Schwann", "Sherstobitoff", "Smith", "Tholl", "Vancise", "Whitmore",
+]
+
+GIVEN_NAMES = [
+    "Aaron", "Brenda", "Carlos", "Denise", "Edward", "Fatima", "Gordon", "Helen", "Ivan",
+    "Jasmine", "Kevin", "Linda", "Mohammed", "Nicole", "Oscar", "Priya", "Ryan", "Sarah",
+]
+
+SURNAMES = [
+    "Anderson", "Bear", "Chen", "Dubois", "Ewanchuk", "Friesen", "Gauthier", "Hnatyshyn",
+    "Iron", "Johnson", "Kowalski", "Lavallee", "McKay", "Nguyen", "Olson", "Petit", "Schmidt",
+]
+
+COMPANIES = [
+    "Prairie Grain Co-operative Ltd.", "Regina Holdings Inc.", "Northern Potash Corp.",
+    "Saskatoon Builders Ltd.", "Qu'Appelle Valley Farms Ltd.", "SGI Canada Insurance Services",
+]
+
+DISPOSITIONS = [
+    "Appeal dismissed", "Appeal allowed", "Appeal allowed in part", "Leave to appeal granted",
+    "Application dismissed",
+]
+
+CROWN = "Her Majesty the Queen"
+
+TRIAL_COURTS = ["QBG", "QBCR", "KBG", "KBCR", "CRIM", "FLD"]
+CENTRES = ["Regina", "Saskatoon", "Prince Albert", "Moose Jaw", "Yorkton", "Swift Current"]
+
+# Courts and collections cited in the body and the judgmentLinks list: (neutral citation code,
+# CanLII path prefix)
+CITED_COURTS = [
+    ("SKCA", "/en/sk/skca/doc"),
+    ("SKQB", "/en/sk/skqb/doc"),
+    ("SCC", "/en/ca/scc/doc"),
+    ("ABCA", "/en/ab/abca/doc"),
+    ("ONCA", "/en/on/onca/doc"),
+    ("BCCA", "/en/bc/bcca/doc"),
+]
+
+REPORTERS = ["Sask R", "WWR", "CCC (3d)", "CR (7th)", "DLR (4th)"]
+
+# Statutes cited in the body and the legislationLinks list: (name, citation, CanLII path)
+STATUTES = [
+    ("the Criminal Code", "RSC 1985, c C-46", "/en/ca/laws/stat/rsc-1985-c-c-46/latest/"),
+    (
+        "the Canadian Charter of Rights and Freedoms",
+        "Part I of the Constitution Act, 1982",
+        "/en/ca/laws/stat/schedule-b-to-the-canada-act-1982-uk-1982-c-11/latest/",
+    ),
+    (
+        "The Queen's Bench Act, 1998",
+        "SS 1998, c Q-1.01",
+        "/en/sk/laws/stat/ss-1998-c-q-1.01/latest/",
+    ),
+    (
+        "The Court of Appeal Act, 2000",
+        "SS 2000, c C-42.1",
+        "/en/sk/laws/stat/ss-2000-c-c-42.1/latest/",
+    ),
+    ("the Youth Criminal Justice Act", "SC 2002, c 1", "/en/ca/laws/stat/sc-2002-c-1/latest/"),
+]
+
+FILLER = [
+    "The appellant submits that the trial judge erred in law.",
+    "I do not accept that submission.",
+    "The standard of review on this question is correctness.",
+    "The findings of fact are entitled to deference absent a palpable and overriding error.",
+    "The Crown concedes that the instruction was incomplete.",
+    "In my view, the error did not occasion a substantial wrong or miscarriage of justice.",
+    "The evidence on this point was largely uncontradicted.",
+    "It follows that this ground of appeal must fail.",
+    "Counsel for the respondent argued that the issue was not raised at trial.",
+    "The sentence imposed was within the range established by the authorities.",
+]
+
+
+def person(rng: random.Random) -> str:
+    return f"{rng.choice(GIVEN_NAMES)} {rng.choice(SURNAMES)}"
+
+
+def case_citation(rng: random.Random, before_year: int) -> str:
+    """
+    A neutral or reporter citation of an earlier decision.
+    """
+
+    year = rng.randint(1990, max(1990, before_year - 1))
+    if rng.random() < 0.7:
+        court, _ = rng.choice(CITED_COURTS)
+        style = f"{rng.choice(SURNAMES)} v {rng.choice(SURNAMES)}"
+        return f"{style}, {year} {court} {rng.randint(1, 400)}"
+    return f"({year}) {rng.randint(1, 500)} {rng.choice(REPORTERS)} {rng.randint(1, 900)}"
+
+
+def paragraph(rng: random.Random, number: int, year: int) -> str:
+    sentences = rng.sample(FILLER, rng.randint(2, 5))
+    if rng.random() < 0.6:
+        sentences.insert(
+            rng.randrange(len(sentences) + 1),
+            f"See {case_citation(rng, year)} at para {rng.randint(1, 120)}.",
+        )
+    if rng.random() < 0.3:
+        name, citation, _ = rng.choice(STATUTES)
+        sentences.append(f"Section {rng.randint(1, 800)} of {name}, {citation}, applies.")
+    return f"<p>[{number}] {html.escape(' '.join(sentences))}</p>"
+
+
+def judgment_links(rng: random.Random, count: int, year: int) -> List[str]:
+    items = []
+    for _ in range(count):
+        code, prefix = rng.choice(CITED_COURTS)
+        cited_year = rng.randint(1990, max(1990, year - 1))
+        document_id = f"{cited_year}{code.lower()}{rng.randint(1, 400)}"
+        path = f"{prefix}/{cited_year}/{document_id}/{document_id}.html"
+        items.append(f'<li data-path="{path}"></li>')
+    return items
+
+
+def legislation_links(rng: random.Random, count: int) -> List[str]:
+    items = []
+    for _ in range(count):
+        _, _, prefix = rng.choice(STATUTES)
+        slug = prefix.rstrip("/").split("/")[-2]
+        section = rng.randint(1, 800)
+        items.append(f'<li data-path="{prefix}{slug}.html#sec{section}_smooth"></li>')
+    return items
+
+
+def short_name(party: str) -> str:
+    """
+    A party as named in a style of cause: "R" for the Crown, and a person by their surname.
+    """
+
+    if party == CROWN:
+        return "R"
+    if party in COMPANIES:
+        return party
+    return party.split()[-1]
+
+
+def trial_court(rng: random.Random) -> str:
+    return f"{rng.choice(TRIAL_COURTS)} {rng.randint(100, 9999)}"
+
+
+def counsel(rng: random.Random) -> List[str]:
+    return [f"{person(rng)} for the Appellant", f"{person(rng)} for the Respondent"]
+
+
+def headnote_2015(
+    rng: random.Random, citation: str, decided: date, parties: Tuple[str, str], judges: List[str]
+) -> List[Tuple[str, Union[str, List[str]]]]:
+    """
+    The rows of the headnote table of a decision from 2015 onward.
+    """
+
+    appellant, respondent = parties
+    author, *others = judges
+    heard = decided - timedelta(days=rng.randint(20, 200))
+    return [
+        ("Citation:", citation),
+        ("Date:", decided.isoformat()),
+        ("Between:", f"{appellant} Appellant And {respondent} Respondent"),
+        ("Before:", f"{', '.join(judges[:-1])} and {judges[-1]} JJ.A."),
+        ("Disposition:", rng.choice(DISPOSITIONS)),
+        ("Written reasons by:", f"The Honourable Mr. Justice {author}"),
+        ("In concurrence:", " ".join(f"The Honourable Madam Justice {name}" for name in others)),
+        ("On appeal from:", f"{trial_court(rng)}, {rng.choice(CENTRES)}"),
+        ("Appeal heard:", f"{heard:%B} {heard.day}, {heard.year}"),
+        ("Counsel:", counsel(rng)),
+        ("File number:", f"{'CACR' if respondent == CROWN else 'CACV'}{rng.randint(1000, 9999)}"),
+        (
+            "Other citations:",
+            f"({decided.year}) {rng.randint(400, 500)} Sask R {rng.randint(1, 300)} -- "
+            f"[{decided.year}] {rng.randint(1, 12)} WWR {rng.randint(1, 900)}",
+        ),
+    ]
+
+
+def headnote_2003(
+    rng: random.Random, citation: str, decided: date, parties: Tuple[str, str], judges: List[str]
+) -> List[Tuple[str, Union[str, List[str]]]]:
+    """
+    The rows of the headnote table of a decision from 2003 to 2014, with "Coram:", "From:" and
+    the parties separated by "- and -".
+    """
+
+    appellant, respondent = parties
+    heard = decided - timedelta(days=rng.randint(20, 200))
+    return [
+        ("Citation:", citation),
+        ("Date:", f"{decided:%Y%m%d}"),
+        ("Between:", [f"{appellant} Appellant", "- and -", f"{respondent} Respondent"]),
+        ("Coram:", f"{', '.join(judges[:-1])} & {judges[-1]} JJ.A."),
+        ("Disposition:", rng.choice(DISPOSITIONS)),
+        ("Written reasons by:", f"The Honourable Mr. Justice {judges[0]}"),
+        ("From:", f"{trial_court(rng)}, J.C. of {rng.choice(CENTRES)}"),
+        ("Appeal heard:", f"{heard:%B} {heard.day}, {heard.year}"),
+        ("Counsel:", counsel(rng)),
+        ("File number:", f"{'CACR' if respondent == CROWN else 'CACV'}{rng.randint(1000, 9999)}"),
+        (
+            "Other citation:",
+            f"({decided.year}) {rng.randint(230, 400)} Sask R {rng.randint(1, 300)}",
+        ),
+    ]
+
+
+def make_page(
+    year: int = 2019,
+    number: int = 1,
+    case_links: int = 50,
+    legislation_links_count: int = 10,
+    paragraphs: int = 40,
+    seed: Optional[int] = None,
+) -> str:
+    """
+    Builds the HTML source of one synthetic decision.
+
+    Args:
+        year (int): The decision year, which selects the headnote layout: 2003-2014 or 2015 on.
+        number (int): The decision's number in its year, e.g. 12 for 2019 SKCA 12.
+        case_links (int): Entries in the judgmentLinks list.
+        legislation_links_count (int): Entries in the legislationLinks list.
+        paragraphs (int): Numbered paragraphs in the body.
+        seed (Optional[int]): Seeds the names and citations. Defaults to one derived from the
+            year and number, so each decision is always the same.
+
+    Returns:
+        str: The page source.
+    """
+
+    rng = random.Random(seed if seed is not None else year * 10000 + number)
+    document_id = f"{year}skca{number}"
+    citation = f"{year} SKCA {number}"
+    decided = date(year, 1, 1) + timedelta(days=rng.randint(0, 364))
+    parties = (person(rng), rng.choice([person(rng), rng.choice(COMPANIES), CROWN]))
+    title = f"{short_name(parties[0])} v {short_name(parties[1])}"
+    judges = rng.sample(JUDGES, 3)
+    headnote = headnote_2015 if year >= 2015 else headnote_2003
+
+    table = []
+    for label, value in headnote(rng, citation, decided, parties, judges):
+        values = [value] if isinstance(value, str) else value
+        cells = "<br>\n".join(html.escape(item) for item in values)
+        table.append(f"<tr>\n<td>{label}</td>\n<td>{cells}</td>\n</tr>")
+
+    meta = {
+        "title": title,
+        "citation": f"{citation} (CanLII)",
+        "decision-date": decided.isoformat(),
+        "lang": "en",
+        "collection": "Court of Appeal for Saskatchewan",
+        "jurisdiction": "Saskatchewan",
+        "keywords": "appeal — sentence | evidence | standard of review",
+        "subjects": "Criminal law — Evidence — Appeal",
+        "document-url": "https://www.canlii.org/en/sk/skca/doc/"
+        f"{year}/{document_id}/{document_id}.html",
+    }
+    meta_tags = "\n".join(
+        f'<meta name="lbh-{name}" content="{html.escape(value)}">' for name, value in meta.items()
+    )
+    body = "\n".join(paragraph(rng, index + 1, year) for index in range(paragraphs))
+
+    # The empty <em> after the judge's name becomes the "__" line that process_markdown()
+    # splits the headnote from the reasons at
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}, {citation} (CanLII)</title>
+{meta_tags}
+</head>
+<body>
+<a href="https://www.canlii.org/en/">Home</a>
+<h2>{html.escape(title)}</h2>
+<table>
+{chr(10).join(table)}
+</table>
+<p>Reasons for Judgment</p>
+<h2>{judges[0]} J.A.</h2>
+<em></em>
+{body}
+<div id="judgmentLinks" style="display: none;">
+<ul>
+{chr(10).join(judgment_links(rng, case_links, year))}
+</ul>
+</div>
+<div id="legislationLinks" style="display: none;">
+<ul>
+{chr(10).join(legislation_links(rng, legislation_links_count))}
+</ul>
+</div>
+<p>Back to top</p>
+</body>
+</html>
+"""
+
+
+def make_corpus(
+    count: int,
+    case_links: int = 50,
+    legislation_links_count: int = 10,
+    paragraphs: int = 40,
+    first_year: int = 2003,
+    last_year: int = 2024,
+) -> Iterator[str]:
+    """
+    Yields count distinct decisions, spread evenly over the years so that both headnote
+    layouts, and 2015 with its fallback to the 2003 rules, are represented.
+    """
+
+    years = list(range(first_year, last_year + 1))
+    for index in range(count):
+        yield make_page(
+            year=years[index % len(years)],
+            number=index // len(years) + 1,
+            case_links=case_links,
+            legislation_links_count=legislation_links_count,
+            paragraphs=paragraphs,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("directory", help="Where to write the pages")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--case-links", type=int, default=50)
+    parser.add_argument("--legislation-links", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    pages = make_corpus(args.count, args.case_links, args.legislation_links, args.paragraphs)
+    for index, page in enumerate(pages):
+        path = os.path.join(args.directory, f"{index:05d}.html")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(page)
+    print(f"Wrote {args.count} pages to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
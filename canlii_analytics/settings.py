@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compresses responses with Brotli or gzip; keep it above anything that reads the body
+    'metadata.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,10 +82,71 @@ WSGI_APPLICATION = 'canlii_analytics.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('CANLII_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        # Keep connections open between requests so the pragmas below are not re-applied and
+        # SQLite's page cache survives
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+# Start write transactions with BEGIN IMMEDIATE, so a writer waits for the lock up front
+# (honouring busy_timeout) rather than failing when a read transaction is upgraded
+if django.VERSION >= (5, 1):
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Pragmas applied to every new SQLite connection (see metadata/db.py). The development profile
+# keeps SQLite's defaults. Deployments set CANLII_SQLITE_PROFILE=production, which uses WAL so
+# that readers are not blocked by a writer. WAL is recorded in the database file itself, so it
+# is not the default: any manage.py command would otherwise convert the checked-in db.sqlite3.
+
+SQLITE_PROFILES = {
+    'development': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,  # Negative values are in KiB, i.e. 64 MB
+        'mmap_size': 268435456,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+    },
+}
+SQLITE_PRAGMAS = SQLITE_PROFILES[os.environ.get('CANLII_SQLITE_PROFILE', 'development')]
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# The "metadata" cache holds extraction results keyed by a hash of the submitted HTML, and the
+# result pages (/results/<digest>/), "Show more" links (/api/links/) and /api/results/ read them
+# back in later requests. The local-memory backend evicts the least recently used entry once
+# MAX_ENTRIES is reached, but it is private to each process: under a server that runs several
+# worker processes those later requests land on other workers and return 404. Set
+# CANLII_CACHE_DIR to a directory all workers can write to so that they share the file-based
+# backend instead.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'metadata': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'metadata-results',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 512,
+        },
+    },
+}
+
+if os.environ.get('CANLII_CACHE_DIR'):
+    CACHES['metadata'].update({
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['CANLII_CACHE_DIR'],
+    })
+
+METADATA_CACHE = 'metadata'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -122,3 +188,52 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Extraction worker pool used by the async view. METADATA_WORKERS defaults to the CPU count;
+# once every worker is busy, up to METADATA_QUEUE_LIMIT more documents wait before requests are
+# turned away with a 503.
+
+METADATA_WORKERS = None
+METADATA_QUEUE_LIMIT = 8
+
+# Case and legislation links rendered with a result page; the rest load on demand from the
+# cached result.
+
+METADATA_LINKS_PAGE_SIZE = 50
+
+# Largest number of decisions accepted by the batch API. Multipart batches upload one file per
+# decision, so Django's limit on uploaded files is raised to match. The batch API reads a JSON
+# body itself rather than through request.body, so DATA_UPLOAD_MAX_MEMORY_SIZE does not apply;
+# METADATA_BATCH_MAX_BYTES caps the size of either kind of batch request instead.
+
+METADATA_BATCH_LIMIT = 1000
+METADATA_BATCH_MAX_BYTES = 100 * 1024 * 1024
+DATA_UPLOAD_MAX_NUMBER_FILES = METADATA_BATCH_LIMIT
+
+# Seconds after which a job document left running by a stopped extraction worker is returned
+# to the queue; workers renew their claims well within this time. A document claimed
+# METADATA_JOB_MAX_ATTEMPTS times without finishing is marked failed.
+
+METADATA_JOB_STALE_SECONDS = 600
+METADATA_JOB_MAX_ATTEMPTS = 3
+
+# Limits on archives uploaded to the jobs API: the size of the upload, the number of HTML files
+# in it, and their sizes once decompressed, each and in total. An archive over any of them is
+# refused with 413.
+
+METADATA_JOB_ARCHIVE_MAX_BYTES = 500 * 1024 * 1024
+METADATA_JOB_MAX_DOCUMENTS = 10000
+METADATA_JOB_DOCUMENT_MAX_BYTES = 10 * 1024 * 1024
+METADATA_JOB_DOCUMENTS_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+
+# Profiling of single extractions; profiles are written to the directory named by the
+# METADATA_PROFILE_DIR environment variable (default .profiles/), which keeps the newest
+# METADATA_PROFILE_MAX_FILES (environment variable, default 200). METADATA_PROFILE profiles every
+# form submission with "cprofile" or "sampling"; with METADATA_PROFILE_HEADER, a request does so
+# by sending "X-Metadata-Profile: cprofile" or "sampling". The header is off by default, even
+# with DEBUG, since any client could use it to slow extractions and fill the disk. Batch and job
+# documents that take at least METADATA_PROFILE_SLOW_SECONDS to extract are profiled by sampling.
+
+METADATA_PROFILE = None
+METADATA_PROFILE_HEADER = False
+METADATA_PROFILE_SLOW_SECONDS = None
@@ -0,0 +1,333 @@
+"""
+JSON API views for scripts that process decisions in bulk rather than through the form.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import etag, require_GET, require_POST
+
+from .cache import (
+    document_digest,
+    get_cached_result,
+    get_result_cache,
+    result_cache_key,
+    result_etag,
+)
+from .jobs import ArchiveTooLarge, archive_max_bytes_setting, create_job, job_progress
+from .metrics import record_cache_lookups
+from .models import ExtractionJob
+from .pipeline import get_extraction_pool
+from .profiling import PROFILE_PATH_KEY, slow_document_profiler
+from .search import search_decisions
+from .serializers import to_json_record
+
+# Largest number of decisions accepted in one batch request
+DEFAULT_BATCH_LIMIT = 1000
+
+# Largest batch request body accepted, in bytes
+DEFAULT_BATCH_MAX_BYTES = 100 * 1024 * 1024
+
+
+class BatchTooLarge(ValueError):
+    """
+    Raised when a batch request body is larger than METADATA_BATCH_MAX_BYTES.
+    """
+
+
+def read_batch_documents(request) -> List[Tuple[str, str]]:
+    """
+    Reads the decisions submitted to the batch endpoint.
+
+    A multipart request contributes every uploaded file, identified by its file name. A JSON
+    request body is an array whose items are either HTML strings, identified by their position,
+    or objects with "html" and an optional "id".
+
+    Returns:
+        List[Tuple[str, str]]: The ID and HTML source of each decision.
+
+    Raises:
+        BatchTooLarge: If the request body is larger than METADATA_BATCH_MAX_BYTES.
+        ValueError: If the request body is not a valid batch.
+    """
+
+    max_bytes = getattr(settings, "METADATA_BATCH_MAX_BYTES", DEFAULT_BATCH_MAX_BYTES)
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_bytes:
+        raise BatchTooLarge(f"A batch may be at most {max_bytes} bytes.")
+
+    if request.content_type == "multipart/form-data":
+        documents = [
+            (upload.name, upload.read().decode("utf-8", errors="replace"))
+            for field in request.FILES
+            for upload in request.FILES.getlist(field)
+        ]
+    else:
+        # Read the stream rather than request.body, which is capped at
+        # DATA_UPLOAD_MAX_MEMORY_SIZE and too small for a batch of decisions. The read is
+        # bounded in case the declared length is missing or wrong.
+        body = request.read(max_bytes + 1)
+        if len(body) > max_bytes:
+            raise BatchTooLarge(f"A batch may be at most {max_bytes} bytes.")
+        try:
+            items = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}") from e
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of decisions.")
+
+        documents = []
+        for position, item in enumerate(items):
+            if isinstance(item, str):
+                documents.append((str(position), item))
+            elif isinstance(item, dict) and isinstance(item.get("html"), str):
+                documents.append((str(item.get("id", position)), item["html"]))
+            else:
+                raise ValueError(f"Item {position} is neither HTML nor an object with 'html'.")
+
+    limit = getattr(settings, "METADATA_BATCH_LIMIT", DEFAULT_BATCH_LIMIT)
+    if len(documents) > limit:
+        raise ValueError(f"A batch may contain at most {limit} decisions.")
+    return documents
+
+
+def stream_batch(documents: List[Tuple[str, str]]) -> Iterator[str]:
+    """
+    Extracts a batch of decisions and yields one NDJSON line per decision as it completes.
+    Cached results are sent first; the rest run concurrently in the extraction pool, so lines
+    are not in submission order. Each line carries the decision's "index", "id" and "digest",
+    and either its "record" or an "error". The digest addresses the result at api/results/.
+    A decision that took longer than METADATA_PROFILE_SLOW_SECONDS to extract also carries the
+    file name of its "profile".
+    """
+
+    cache = get_result_cache()
+    digests = [document_digest(html) for _, html in documents]
+    keys = [result_cache_key(digest) for digest in digests]
+    cached = cache.get_many(keys)
+    record_cache_lookups(len(cached), len(keys) - len(cached))
+
+    misses = []
+    for index, key in enumerate(keys):
+        if key in cached:
+            yield batch_line(documents, digests, index, record=to_json_record(cached[key]))
+        else:
+            misses.append(index)
+
+    results = get_extraction_pool().imap_unordered(
+        (documents[index][1] for index in misses), slow_document_profiler()
+    )
+    for position, result in results:
+        index = misses[position]
+        if isinstance(result, Exception):
+            yield batch_line(
+                documents, digests, index, error=f"{type(result).__name__}: {result}"
+            )
+        else:
+            profile_path = result.pop(PROFILE_PATH_KEY, None)
+            cache.set(keys[index], result)
+            fields = {"record": to_json_record(result)}
+            if profile_path is not None:
+                fields["profile"] = os.path.basename(profile_path)
+            yield batch_line(documents, digests, index, **fields)
+
+
+def batch_line(
+    documents: List[Tuple[str, str]], digests: List[str], index: int, **fields
+) -> str:
+    line = {"index": index, "id": documents[index][0], "digest": digests[index], **fields}
+    return json.dumps(line) + "\n"
+
+
+@csrf_exempt
+@require_POST
+def batch(request):
+    """
+    Extracts many decisions in one request, streaming the records back as NDJSON.
+
+    Example:
+        curl -X POST -H "Content-Type: application/json" \\
+            --data '[{"id": "2019skca12", "html": "<html>..."}]' \\
+            http://127.0.0.1:8000/api/batch/
+    """
+
+    try:
+        documents = read_batch_documents(request)
+    except BatchTooLarge as e:
+        return JsonResponse({"error": str(e)}, status=413)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return StreamingHttpResponse(stream_batch(documents), content_type="application/x-ndjson")
+
+
+@csrf_exempt
+@require_POST
+def jobs(request):
+    """
+    Queues an uploaded zip or tar archive of decisions for background extraction and responds
+    immediately with the job ID. Run "python manage.py extraction_worker" to process jobs. An
+    archive over the METADATA_JOB_* size limits is refused with 413.
+
+    Example:
+        curl -F archive=@decisions.zip http://127.0.0.1:8000/api/jobs/
+    """
+
+    # Refuse an oversized upload before it is parsed; create_job() checks the file's own size
+    max_bytes = archive_max_bytes_setting()
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_bytes:
+        return JsonResponse({"error": f"An archive may be at most {max_bytes} bytes."}, status=413)
+
+    upload = request.FILES.get("archive")
+    if upload is None:
+        return JsonResponse({"error": "Upload the archive in the 'archive' field."}, status=400)
+
+    try:
+        extraction_job = create_job(upload)
+    except ArchiveTooLarge as e:
+        return JsonResponse({"error": str(e)}, status=413)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    status_url = reverse("api_job", args=[extraction_job.pk])
+    response = JsonResponse(
+        {
+            "job": str(extraction_job.pk),
+            "documents": extraction_job.documents.count(),
+            "status_url": status_url,
+        },
+        status=202,
+    )
+    response["Location"] = status_url
+    return response
+
+
+@require_GET
+def job(request, job_id):
+    """
+    Reports a job's progress with the records finished so far. Poll with ?offset=<next_offset>
+    to receive only the records finished since the previous poll.
+    """
+
+    extraction_job = get_object_or_404(ExtractionJob, pk=job_id)
+    try:
+        offset = max(0, int(request.GET.get("offset", 0)))
+        limit = min(1000, max(1, int(request.GET.get("limit", 100))))
+    except ValueError:
+        return JsonResponse({"error": "offset and limit must be integers."}, status=400)
+
+    return JsonResponse(job_progress(extraction_job, offset, limit))
+
+
+@require_GET
+def search(request):
+    """
+    Full-text search over stored decisions.
+
+    Query parameters: q (the words to search for), court, year_from, year_to, limit, offset and
+    raw=1 to pass q to FTS5 unchanged.
+
+    Example:
+        curl "http://127.0.0.1:8000/api/search/?q=sentence+appeal&court=skca&year_from=2015"
+    """
+
+    try:
+        year_from = request.GET.get("year_from")
+        year_to = request.GET.get("year_to")
+        hits = search_decisions(
+            request.GET.get("q", ""),
+            court=request.GET.get("court") or None,
+            year_from=int(year_from) if year_from else None,
+            year_to=int(year_to) if year_to else None,
+            limit=min(100, max(1, int(request.GET.get("limit", 20)))),
+            offset=max(0, int(request.GET.get("offset", 0))),
+            raw=request.GET.get("raw") == "1",
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({"results": [hit._asdict() for hit in hits]})
+
+
+def link_record(link) -> Dict[str, Any]:
+    """
+    Converts a CaseEdge or LegislationEdge into the fields the result page displays.
+    """
+
+    record = to_json_record(link._asdict())
+    record["url"] = link.url
+    if hasattr(link, "court_level"):
+        record["court_level"] = link.court_level
+    if hasattr(link, "jurisdiction_name"):
+        record["jurisdiction_name"] = link.jurisdiction_name
+    return record
+
+
+@require_GET
+@etag(lambda request, digest, **kwargs: result_etag(digest))
+def result(request, digest):
+    """
+    Returns the record extracted from a document, addressed by the SHA-256 of its HTML (the
+    "digest" of a batch line). Responses carry an ETag derived from the digest and the rule-set
+    version, so a client that sends it back in If-None-Match gets 304 Not Modified until the
+    rules change. Responds with 404 once the result has left the cache.
+
+    Example:
+        curl -H 'If-None-Match: "<RULESET_VERSION>-<digest>"' \
+            http://127.0.0.1:8000/api/results/<digest>/
+    """
+
+    context = get_cached_result(digest)
+    if context is None:
+        return JsonResponse({"error": "The result is no longer cached."}, status=404)
+    return JsonResponse(to_json_record(context))
+
+
+@require_GET
+@etag(lambda request, digest, **kwargs: result_etag(digest))
+def links(request, digest, kind):
+    """
+    Returns a page of a decision's case or legislation links from its cached extraction result,
+    for the "show more" buttons on the result page.
+
+    Query parameters: offset and limit. Responds with 404 once the result has left the cache;
+    resubmitting the page source brings it back.
+    """
+
+    field = {"case": "case_links", "legislation": "legislation_links"}.get(kind)
+    if field is None:
+        return JsonResponse({"error": "kind must be 'case' or 'legislation'."}, status=404)
+
+    context = get_cached_result(digest)
+    if context is None:
+        return JsonResponse({"error": "The result is no longer cached."}, status=404)
+
+    try:
+        offset = max(0, int(request.GET.get("offset", 0)))
+        limit = min(500, max(1, int(request.GET.get("limit", 100))))
+    except ValueError:
+        return JsonResponse({"error": "offset and limit must be integers."}, status=400)
+
+    all_links = context.get(field) or []
+    page = all_links[offset : offset + limit]
+    return JsonResponse(
+        {
+            "total": len(all_links),
+            "offset": offset,
+            "next_offset": offset + len(page) if offset + len(page) < len(all_links) else None,
+            "links": [link_record(link) for link in page],
+        }
+    )
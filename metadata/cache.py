@@ -0,0 +1,127 @@
+"""
+Caches extraction results under a hash of the submitted HTML, so that resubmitting the same
+page only costs a cache lookup and the template render.
+
+The cache is the Django cache named by the METADATA_CACHE setting. Keys include the rule-set
+version, so bumping RULESET_VERSION invalidates every earlier result.
+"""
+
+import hashlib
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+
+from .metrics import record_cache_lookups
+from .pipeline import (
+    RULESET_VERSION,
+    STREAM_CHUNK_SIZE,
+    extract_decision,
+    extract_decision_file,
+)
+
+
+def document_digest(submitted_text: str) -> str:
+    """
+    Returns the SHA-256 of a document's HTML, which identifies its cached result.
+    """
+
+    return hashlib.sha256(submitted_text.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """
+    Returns the SHA-256 of a document stored in a file, read in chunks. For a UTF-8 file it is
+    the same as document_digest() of its contents, so uploads and pasted source share results.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(STREAM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def result_cache_key(digest: str) -> str:
+    """
+    Returns the cache key of a document from its digest and the rule-set version.
+    """
+
+    return f"decision:{RULESET_VERSION}:{digest}"
+
+
+def result_etag(digest: str) -> str:
+    """
+    Returns the ETag of anything rendered from a document's result. The result depends only on
+    the document and the rule-set version, so a client that holds the representation for this
+    ETag is up to date even if the result has since left the cache.
+    """
+
+    return f'"{RULESET_VERSION}-{digest}"'
+
+
+def get_cached_result(digest: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the cached result for a document digest, or None if it is not (or no longer) cached.
+    """
+
+    context = get_result_cache().get(result_cache_key(digest))
+    record_cache_lookups(context is not None, context is None)
+    return context
+
+
+def get_result_cache() -> BaseCache:
+    """
+    Returns the cache that holds extraction results.
+    """
+
+    return caches[getattr(settings, "METADATA_CACHE", "default")]
+
+
+def cached_extract_decision(
+    submitted_text: str, digest: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Returns the extraction result for a document from the cache, running extract_decision()
+    and storing its result on a miss.
+
+    Args:
+        submitted_text (str): The HTML source of a CanLII decision.
+        digest (Optional[str]): The document's digest, if the caller has already computed it.
+
+    Returns:
+        Dict[str, Any]: The template context for the decision. The cache returns a fresh copy,
+        so the caller may modify it.
+    """
+
+    cache = get_result_cache()
+    key = result_cache_key(digest or document_digest(submitted_text))
+    context: Optional[Dict[str, Any]] = cache.get(key)
+    record_cache_lookups(context is not None, context is None)
+    if context is None:
+        context = extract_decision(submitted_text)
+        cache.set(key, context)
+    return context
+
+
+def cached_extract_decision_file(path: str, digest: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns the extraction result for a document stored in a file from the cache, running
+    extract_decision_file() and storing its result on a miss.
+
+    Args:
+        path (str): Path to the HTML source of a CanLII decision.
+        digest (Optional[str]): The document's digest, if the caller has already computed it.
+
+    Returns:
+        Dict[str, Any]: The template context for the decision.
+    """
+
+    cache = get_result_cache()
+    key = result_cache_key(digest or file_digest(path))
+    context: Optional[Dict[str, Any]] = cache.get(key)
+    record_cache_lookups(context is not None, context is None)
+    if context is None:
+        context = extract_decision_file(path)
+        cache.set(key, context)
+    return context
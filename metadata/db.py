@@ -0,0 +1,235 @@
+"""
+SQLite tuning: the pragmas applied to every connection, and a bulk-load mode for large
+ingestion runs.
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+
+try:
+    import fcntl
+except ImportError:  # Windows: bulk loads are not protected against running concurrently
+    fcntl = None
+
+# Tables whose secondary indexes and triggers bulk_load() suspends
+BULK_LOAD_TABLES = [
+    "metadata_decision",
+    "metadata_judicialrole",
+    "metadata_party",
+    "metadata_counsel",
+    "metadata_casecitation",
+    "metadata_legislationcitation",
+]
+
+class BulkLoadRunning(RuntimeError):
+    """
+    Raised when a bulk load is started while another one of the same database is running.
+    """
+
+
+# Holds the SQL of the indexes and triggers dropped by a bulk load until they are recreated, so
+# that a load that is killed part way can be recovered by the next connection
+SUSPENDED_SCHEMA_TABLE = "metadata_bulk_load_suspended"
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs) -> None:
+    """
+    Applies the SQLITE_PRAGMAS setting to a new database connection. Connected to Django's
+    connection_created signal in MetadataConfig.ready().
+    """
+
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if pragmas:
+        with connection.cursor() as cursor:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+    recover_bulk_load(connection)
+
+
+def connect_signals() -> None:
+    connection_created.connect(apply_sqlite_pragmas, dispatch_uid="metadata_sqlite_pragmas")
+
+
+def _lock_path(connection) -> Optional[str]:
+    if connection.is_in_memory_db():
+        return None
+    name = str(connection.settings_dict["NAME"])
+    digest = hashlib.sha256(os.path.abspath(name).encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"canlii-bulk-load-{digest}.lock")
+
+
+def _acquire_lock(connection) -> Tuple[bool, Optional[IO]]:
+    """
+    Takes the database's bulk-load lock without waiting.
+
+    Returns:
+        Tuple[bool, Optional[IO]]: Whether the lock was taken, and the open lock file to pass
+        to _release_lock().
+    """
+
+    path = _lock_path(connection)
+    if path is None or fcntl is None:
+        return True, None
+    file = open(path, "a")
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        file.close()
+        return False, None
+    return True, file
+
+
+def _release_lock(file: Optional[IO]) -> None:
+    if file is not None:
+        fcntl.flock(file, fcntl.LOCK_UN)
+        file.close()
+
+
+def _suspended_schema(cursor) -> List[Tuple[str, str, str]]:
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s",
+        [SUSPENDED_SCHEMA_TABLE],
+    )
+    if cursor.fetchone() is None:
+        return []
+    cursor.execute(f"SELECT type, name, sql FROM {SUSPENDED_SCHEMA_TABLE} ORDER BY id")
+    return cursor.fetchall()
+
+
+def _restore_schema(connection) -> bool:
+    """
+    Recreates the indexes and triggers saved by a bulk load and rebuilds the search index, in
+    one transaction.
+
+    Returns:
+        bool: Whether anything was saved to restore.
+    """
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        saved = _suspended_schema(cursor)
+        if not saved:
+            return False
+        # Indexes first: the triggers may rely on them
+        for kind in ("index", "trigger"):
+            for saved_kind, _, sql in saved:
+                if saved_kind == kind:
+                    cursor.execute(sql)
+        if any(kind == "trigger" for kind, _, _ in saved):
+            cursor.execute(
+                "INSERT INTO metadata_decision_fts(metadata_decision_fts) VALUES ('rebuild')"
+            )
+        cursor.execute(f"DROP TABLE {SUSPENDED_SCHEMA_TABLE}")
+    return True
+
+
+def recover_bulk_load(connection) -> bool:
+    """
+    Restores the indexes and triggers of a bulk load that was killed before it could restore
+    them itself. Nothing is done while the bulk load is still running in another process.
+
+    Returns:
+        bool: Whether a killed bulk load was recovered.
+    """
+
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        if not _suspended_schema(cursor):
+            return False
+    acquired, lock = _acquire_lock(connection)
+    if not acquired:
+        return False
+    try:
+        return _restore_schema(connection)
+    finally:
+        _release_lock(lock)
+
+
+def _schema_objects(cursor, kind: str) -> List[Tuple[str, str]]:
+    # Automatic indexes for primary keys and unique constraints have no SQL and are kept
+    placeholders = ", ".join("%s" for _ in BULK_LOAD_TABLES)
+    cursor.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = %s AND sql IS NOT NULL "
+        f"AND tbl_name IN ({placeholders})",
+        [kind, *BULK_LOAD_TABLES],
+    )
+    return cursor.fetchall()
+
+
+@contextmanager
+def bulk_load() -> Iterator[None]:
+    """
+    Suspends index maintenance while a large ingestion runs, then rebuilds everything once.
+
+    Inside the block the secondary indexes and the full-text search triggers on the decision
+    tables are dropped and synchronous is OFF. On exit, even after an error, the indexes and
+    triggers are recreated from their saved SQL and the search index is rebuilt. Unique
+    constraints are kept, so re-ingested decisions are still replaced, but deleting them scans
+    the related tables; bulk loads are meant for mostly new decisions.
+
+    The SQL is saved in the database, in the same transaction that drops the indexes and
+    triggers. If the process is killed inside the block, the next connection opened by any
+    process restores them (see recover_bulk_load()). The process holds a lock for the whole
+    load, so that a second bulk load is refused and other processes do not restore the schema
+    under a running one. Other processes still read and write without the indexes while the
+    load runs, and decisions they write are not searchable until it ends, so bulk loads
+    should run while the web server and extraction workers are stopped.
+
+    Raises:
+        BulkLoadRunning: If another bulk load of the same database is running.
+
+    Example:
+        with bulk_load():
+            ingest_decisions(records)
+    """
+
+    if connection.vendor != "sqlite":
+        yield
+        return
+
+    acquired, lock = _acquire_lock(connection)
+    if not acquired:
+        raise BulkLoadRunning("Another bulk load of this database is running.")
+
+    try:
+        # Finish a load that was killed before starting this one
+        _restore_schema(connection)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {SUSPENDED_SCHEMA_TABLE} "
+                f"(id INTEGER PRIMARY KEY, type TEXT NOT NULL, name TEXT NOT NULL, "
+                f"sql TEXT NOT NULL)"
+            )
+            for kind in ("trigger", "index"):
+                for name, sql in _schema_objects(cursor, kind):
+                    cursor.execute(
+                        f"INSERT INTO {SUSPENDED_SCHEMA_TABLE} (type, name, sql) "
+                        f"VALUES (%s, %s, %s)",
+                        [kind, name, sql],
+                    )
+                    cursor.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            synchronous = cursor.fetchone()[0]
+            cursor.execute("PRAGMA synchronous = OFF")
+
+        try:
+            yield
+        finally:
+            _restore_schema(connection)
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA synchronous = {synchronous}")
+                cursor.execute("ANALYZE")
+    finally:
+        _release_lock(lock)
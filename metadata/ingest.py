@@ -0,0 +1,255 @@
+"""
+Loads extracted decisions into the database.
+
+Records are written with bulk_create in large transactions: one INSERT per table per chunk of
+decisions, instead of a save() per row. Re-ingesting a decision replaces it and everything
+attached to it.
+
+Extraction records do not include the body of the decision, which would make every cached and
+serialized result as large as the decision itself. A record may carry it under "main_content"
+for the full-text index; the ingest_decisions command adds it from the HTML of job documents
+(see extract_main_content()).
+"""
+
+import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.db import transaction
+
+from .models import (
+    CaseCitation,
+    Counsel,
+    Decision,
+    Judge,
+    JudicialRole,
+    LegislationCitation,
+    Party,
+)
+from .serializers import to_json_record
+from .utils.jurisdiction import parse_legislation_key
+from .utils.vocabulary import JUDICIAL_ROLE_FIELDS
+
+# Decisions written per transaction
+DEFAULT_CHUNK_SIZE = 2000
+
+# Rows per INSERT statement. SQLite allows 32766 bound parameters per statement, and the widest
+# table here has about 25 columns.
+INSERT_BATCH_SIZE = 1000
+
+
+def join_values(value: Any, separator: str = ", ") -> str:
+    """
+    Flattens a context value that may be a string, a list of strings or empty into a string.
+    """
+
+    if not value:
+        return ""
+    if isinstance(value, str):
+        return value
+    return separator.join(str(item) for item in value if item)
+
+
+def parse_date(value: Any) -> Optional[datetime.date]:
+    try:
+        return datetime.date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def parse_year(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def build_decision(record: Dict[str, Any]) -> Decision:
+    """
+    Builds an unsaved Decision from an extraction record.
+    """
+
+    citation_key = record.get("citation_key")
+    case_type = record.get("case_type") or ["", ""]
+    if isinstance(case_type, str):
+        case_type = [case_type, ""]
+
+    return Decision(
+        primary_key=record["primary_key"],
+        style_of_cause=(record.get("style_of_cause") or "")[:500],
+        citation=record.get("citation") or "",
+        citation_key=citation_key if isinstance(citation_key, int) and citation_key >= 0 else None,
+        decision_date=parse_date(record.get("decision_date")),
+        decision_year=parse_year(record.get("decision_year")),
+        jurisdiction=record.get("jurisdiction") or "",
+        court_code=record.get("court_code") or "",
+        court_level=record.get("court_level") or "",
+        language=record.get("language") or "",
+        url=record.get("url") or "",
+        docket=join_values(record.get("file_number"))[:128],
+        case_type=case_type[0] or "",
+        case_category=case_type[1] if len(case_type) > 1 else "",
+        disposition=join_values(record.get("disposition"), "; "),
+        appeal_from=join_values(record.get("appeal_from"))[:255],
+        case_heard=join_values(record.get("case_heard"))[:255],
+        keywords=record.get("keywords_list") or [],
+        subjects=record.get("subjects_list") or [],
+        other_citations=record.get("other_citations") or [],
+        rules=record.get("rules") or "",
+        headnote=join_values(record.get("headnote"), "\n"),
+        main_content=record.get("main_content") or "",
+    )
+
+
+def judge_names(record: Dict[str, Any]) -> Iterator[str]:
+    yield from record.get("before") or []
+    for field in JUDICIAL_ROLE_FIELDS:
+        for judge, _ in record.get(field) or []:
+            yield judge
+
+
+def get_judges(names: Iterable[str]) -> Dict[str, int]:
+    """
+    Returns the IDs of the judges with the given names, creating the missing ones.
+    """
+
+    names = set(filter(None, names))
+    judges = dict(Judge.objects.filter(name__in=names).values_list("name", "id"))
+    missing = names - judges.keys()
+    if missing:
+        Judge.objects.bulk_create(
+            [Judge(name=name) for name in missing],
+            batch_size=INSERT_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        judges.update(Judge.objects.filter(name__in=missing).values_list("name", "id"))
+    return judges
+
+
+def build_related(
+    record: Dict[str, Any], decision: Decision, judges: Dict[str, int]
+) -> Dict[type, List[Any]]:
+    """
+    Builds the unsaved rows that belong to one decision, grouped by model.
+    """
+
+    rows: Dict[type, List[Any]] = {
+        JudicialRole: [],
+        Party: [],
+        Counsel: [],
+        CaseCitation: [],
+        LegislationCitation: [],
+    }
+
+    for judge in record.get("before") or []:
+        if judge:
+            rows[JudicialRole].append(
+                JudicialRole(
+                    decision=decision, judge_id=judges[judge], aggregate="before", role="panel"
+                )
+            )
+    for field in JUDICIAL_ROLE_FIELDS:
+        for judge, role in record.get(field) or []:
+            if judge:
+                rows[JudicialRole].append(
+                    JudicialRole(
+                        decision=decision, judge_id=judges[judge], aggregate=field, role=role
+                    )
+                )
+
+    for name, role in record.get("parties") or []:
+        rows[Party].append(Party(decision=decision, name=name[:500], role=role[:64]))
+
+    for party_role, names in record.get("counsel") or []:
+        for name in names:
+            rows[Counsel].append(
+                Counsel(decision=decision, name=name[:255], party_role=party_role[:64])
+            )
+
+    for edge in record.get("case_links") or []:
+        rows[CaseCitation].append(
+            CaseCitation(
+                source=decision,
+                target=edge["target"],
+                jurisdiction=edge["jurisdiction"],
+                court_code=edge["court"],
+                year=edge["year"] or None,
+            )
+        )
+
+    for edge in record.get("legislation_links") or []:
+        for key in parse_legislation_key(edge["target"]):
+            rows[LegislationCitation].append(
+                LegislationCitation(
+                    decision=decision,
+                    target=edge["target"][:255],
+                    jurisdiction=edge["jurisdiction"],
+                    statute=key.statute[:128],
+                    section=key.section,
+                    subsection=key.subsection,
+                )
+            )
+
+    return rows
+
+
+def ingest_chunk(records: List[Dict[str, Any]]) -> int:
+    """
+    Writes one chunk of records in a single transaction.
+    """
+
+    # Later records for the same decision replace earlier ones
+    records = list({record["primary_key"]: record for record in records}.values())
+
+    with transaction.atomic():
+        Decision.objects.filter(
+            primary_key__in=[record["primary_key"] for record in records]
+        ).delete()
+
+        # SQLite and PostgreSQL return the new primary keys, so the related rows can point at
+        # the decisions without another query
+        decisions = Decision.objects.bulk_create(
+            [build_decision(record) for record in records], batch_size=INSERT_BATCH_SIZE
+        )
+
+        judges = get_judges(name for record in records for name in judge_names(record))
+
+        related: Dict[type, List[Any]] = {}
+        for record, decision in zip(records, decisions):
+            for model, rows in build_related(record, decision, judges).items():
+                related.setdefault(model, []).extend(rows)
+        for model, rows in related.items():
+            model.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE)
+
+    return len(records)
+
+
+def ingest_decisions(
+    records: Iterable[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    Loads extracted decisions into the database.
+
+    Args:
+        records (Iterable[Dict[str, Any]]): Contexts from extract_decision(), or the JSON records
+            produced from them by the batch API and the job queue, optionally with the
+            decision's body under "main_content". Records without a primary key are skipped.
+        chunk_size (int): The number of decisions written per transaction.
+
+    Returns:
+        int: The number of decisions written.
+    """
+
+    written = 0
+    chunk: List[Dict[str, Any]] = []
+    for record in records:
+        # Plain JSON types, so that contexts and stored records are handled the same way
+        record = to_json_record(record)
+        if not record.get("primary_key"):
+            continue
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            written += ingest_chunk(chunk)
+            chunk = []
+    if chunk:
+        written += ingest_chunk(chunk)
+    return written
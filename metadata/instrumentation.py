@@ -0,0 +1,390 @@
+"""
+Per-stage timing for the extraction pipeline.
+
+Each stage of extract_decision() runs inside stage(name), and each SKCA rule function is
+decorated with @instrumented. While instrumentation is enabled, every stage records its wall
+time, the CPU time of its thread and, optionally, the peak memory it allocated, into
+histograms kept per stage. While it is disabled, stage() returns a shared no-op context
+manager, so the cost is one function call and a flag check.
+
+Instrumentation is enabled in any process, including the extraction pool's workers, by the
+METADATA_INSTRUMENTATION environment variable: "1" records times, "alloc" also records
+allocations through tracemalloc, which slows extraction down noticeably. It can also be
+switched with enable() and disable().
+
+    METADATA_INSTRUMENTATION=1 python -m metadata.instrumentation page.html --repeat 20
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Sub-buckets per power of two. With 4, a value is placed in a bucket at most 25% wider than
+# itself, which is plenty for telling stages apart.
+SUB_BUCKETS = 4
+
+# Enough buckets for any 64-bit value
+BUCKET_COUNT = 64 * SUB_BUCKETS
+
+
+def bucket_index(value: int) -> int:
+    """
+    Returns the histogram bucket of a non-negative integer: values below SUB_BUCKETS have
+    their own bucket, and every power of two above that is split into SUB_BUCKETS buckets.
+    """
+
+    if value < SUB_BUCKETS:
+        return max(value, 0)
+    shift = value.bit_length() - 3
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def bucket_upper_bound(index: int) -> int:
+    """
+    Returns the largest value that falls in a histogram bucket.
+    """
+
+    if index < SUB_BUCKETS:
+        return index
+    shift, top = divmod(index, SUB_BUCKETS)
+    shift -= 1
+    return ((top + SUB_BUCKETS + 1) << shift) - 1
+
+
+class Histogram:
+    """
+    A log-linear histogram of non-negative integers (nanoseconds or bytes). Recording a value
+    costs a bit_length() and a list increment, and the memory used does not grow with the
+    number of values.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, fraction: float) -> int:
+        """
+        Returns an upper bound on the given quantile of the recorded values, e.g. 0.99 for the
+        99th percentile. Returns 0 if nothing has been recorded.
+        """
+
+        if not self.count:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "Histogram") -> None:
+        """
+        Adds another histogram's values to this one, e.g. to combine processes.
+        """
+
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the histogram as JSON-serializable data, with only the non-empty buckets.
+        """
+
+        return {
+            "buckets": {index: count for index, count in enumerate(self.counts) if count},
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        histogram = cls()
+        for index, bucket_count in data["buckets"].items():
+            histogram.counts[int(index)] = bucket_count
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.max = data["max"]
+        return histogram
+
+    def cumulative_counts(self, bounds: Iterable[int]) -> List[int]:
+        """
+        Returns the number of values at or below each bound, for exposition formats with fixed
+        bucket bounds. Each internal bucket is counted under the first bound that is not below
+        its upper end, so the counts are exact to within the bucket resolution.
+        """
+
+        bounds = list(bounds)
+        cumulative = [0] * len(bounds)
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            upper = min(bucket_upper_bound(index), self.max)
+            for position, bound in enumerate(bounds):
+                if upper <= bound:
+                    cumulative[position] += bucket_count
+                    break
+        for position in range(1, len(cumulative)):
+            cumulative[position] += cumulative[position - 1]
+        return cumulative
+
+
+class StageStats:
+    """
+    The histograms of one stage. alloc is only recorded while allocations are tracked.
+    """
+
+    __slots__ = ("wall", "cpu", "alloc")
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.cpu = Histogram()
+        self.alloc = Histogram()
+
+
+_enabled = False
+_track_allocations = False
+_stats: Dict[str, StageStats] = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+_NULL_STAGE = nullcontext()
+
+
+def enable(track_allocations: bool = False) -> None:
+    """
+    Starts recording stages in this process.
+
+    Args:
+        track_allocations (bool): Whether to record the peak memory allocated by each stage.
+            This starts tracemalloc, which slows everything down, and is only meaningful when
+            one thread is extracting at a time.
+    """
+
+    global _enabled, _track_allocations
+    if track_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _track_allocations = track_allocations
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def is_tracking_allocations() -> bool:
+    return _enabled and _track_allocations
+
+
+def reset() -> None:
+    """
+    Discards everything recorded so far.
+    """
+
+    with _lock:
+        _stats.clear()
+
+
+def snapshot() -> Dict[str, StageStats]:
+    """
+    Returns the stats recorded so far, by stage name. The histograms are live, so callers
+    should not modify them.
+    """
+
+    with _lock:
+        return dict(_stats)
+
+
+class _Stage:
+    """
+    The context manager returned by stage() while instrumentation is enabled.
+    """
+
+    __slots__ = ("name", "wall_start", "cpu_start", "memory_start", "child_peak")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        if _track_allocations:
+            stack = getattr(_local, "stack", None)
+            if stack is None:
+                stack = _local.stack = []
+            current, peak = tracemalloc.get_traced_memory()
+            # Resetting the peak would hide the enclosing stage's peak so far, so hand it up
+            # before starting this stage's
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = current
+            self.child_peak = 0
+            stack.append(self)
+        self.cpu_start = time.thread_time_ns()
+        self.wall_start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter_ns() - self.wall_start
+        cpu = time.thread_time_ns() - self.cpu_start
+
+        allocated = None
+        stack = getattr(_local, "stack", None)
+        if stack and stack[-1] is self:
+            stack.pop()
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            allocated = max(peak - self.memory_start, 0)
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+
+        with _lock:
+            stats = _stats.get(self.name)
+            if stats is None:
+                stats = _stats[self.name] = StageStats()
+            stats.wall.record(wall)
+            stats.cpu.record(cpu)
+            if allocated is not None:
+                stats.alloc.record(allocated)
+        return False
+
+
+def stage(name: str):
+    """
+    Times the enclosed block as the named stage:
+
+        with stage("html_to_markdown"):
+            markdown_content = html_to_markdown(submitted_text)
+
+    Stages may be nested; each records its own total, including the stages inside it.
+    """
+
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def instrumented(function: Callable) -> Callable:
+    """
+    Decorates a function so that each call is timed as a stage named after its module and
+    function, e.g. "skca_2015.define_coram".
+    """
+
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+        with _Stage(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def report(stats: Optional[Dict[str, StageStats]] = None) -> str:
+    """
+    Formats stage stats as a table, the stages that took the most time in total first.
+
+    Args:
+        stats (Optional[Dict[str, StageStats]]): The stats to report. Defaults to snapshot().
+
+    Returns:
+        str: The table. Times are in milliseconds and allocations in kilobytes.
+    """
+
+    stats = snapshot() if stats is None else stats
+    columns = ("count", "total", "wall p50", "wall p99", "cpu p50", "alloc p50", "alloc max")
+    lines = [f"{'stage':<40}" + "".join(f"{column:>11}" for column in columns)]
+    for name, stage_stats in sorted(stats.items(), key=lambda item: -item[1].wall.total):
+        wall, cpu, alloc = stage_stats.wall, stage_stats.cpu, stage_stats.alloc
+        values = (
+            f"{wall.count:>11}",
+            f"{wall.total / 1e6:>11.1f}",
+            f"{wall.quantile(0.5) / 1e6:>11.3f}",
+            f"{wall.quantile(0.99) / 1e6:>11.3f}",
+            f"{cpu.quantile(0.5) / 1e6:>11.3f}",
+            f"{alloc.quantile(0.5) / 1024:>11.1f}" if alloc.count else f"{'-':>11}",
+            f"{alloc.max / 1024:>11.1f}" if alloc.count else f"{'-':>11}",
+        )
+        lines.append(f"{name:<40}" + "".join(values))
+    return "\n".join(lines)
+
+
+def configure_from_environment() -> None:
+    """
+    Enables instrumentation according to the METADATA_INSTRUMENTATION environment variable.
+    """
+
+    setting = os.environ.get("METADATA_INSTRUMENTATION", "").strip().lower()
+    if setting in ("", "0", "off", "false"):
+        return
+    enable(track_allocations=setting == "alloc")
+
+
+configure_from_environment()
+
+
+def main() -> None:
+    """
+    Extracts a decision repeatedly with instrumentation enabled and prints the stage table.
+    """
+
+    import argparse
+
+    # Run as "python -m", this file is __main__, a different module from the one the pipeline
+    # records into
+    from . import instrumentation
+    from .pipeline import extract_decision, extract_decision_file
+
+    parser = argparse.ArgumentParser(description=main.__doc__.strip())
+    parser.add_argument("page", help="Path to the HTML source of a CanLII decision")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--alloc", action="store_true", help="Also record allocations")
+    parser.add_argument(
+        "--stream", action="store_true", help="Extract with extract_decision_file()"
+    )
+    args = parser.parse_args()
+
+    instrumentation.enable(
+        track_allocations=args.alloc or instrumentation.is_tracking_allocations()
+    )
+    with open(args.page, "r", encoding="utf-8") as file:
+        page = file.read()
+    for _ in range(args.repeat):
+        if args.stream:
+            extract_decision_file(args.page)
+        else:
+            extract_decision(page)
+    print(instrumentation.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+A persistent job queue for extracting archives of decisions in the background.
+
+Uploading an archive creates an ExtractionJob with one pending JobDocument per HTML file. The
+extraction_worker management command claims pending documents, runs them through the
+extraction pool and stores each record as it completes. The queue lives in the project
+database, so jobs survive a restart: a worker that shuts down hands its unfinished documents
+back, documents held by a worker that died are returned to pending once their claim goes stale,
+and every other document keeps its state. A worker renews its claims while it works through a
+batch, and only stores a result while it still holds the document's claim. A document that has
+been claimed METADATA_JOB_MAX_ATTEMPTS times without finishing, e.g. because it kills the
+worker extracting it each time, is marked failed instead of being queued again.
+"""
+
+import os
+import socket
+import tarfile
+import time
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import ExtractionJob, JobDocument
+from .pipeline import ExtractionPool, extract_decision
+from .profiling import PROFILE_PATH_KEY
+from .serializers import to_json_record
+
+HTML_EXTENSIONS = (".html", ".htm")
+
+# Seconds after which a running document is assumed to belong to a worker that stopped
+DEFAULT_STALE_SECONDS = 600
+
+# Claims after which a document that never finished is marked failed
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Largest archive accepted by the jobs API, in bytes
+DEFAULT_ARCHIVE_MAX_BYTES = 500 * 1024 * 1024
+
+# Limits on what an archive expands to: the HTML files in one job, the size of each once
+# decompressed and their total size. Archives compress well, so the upload's size alone does not
+# bound them.
+DEFAULT_MAX_DOCUMENTS = 10000
+DEFAULT_DOCUMENT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_DOCUMENTS_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+
+# Decompressed bytes of HTML inserted per query at most, on top of the number of documents
+BULK_CREATE_MAX_BYTES = 50 * 1024 * 1024
+
+
+class ArchiveTooLarge(ValueError):
+    """
+    Raised when an uploaded archive, or what it expands to, exceeds the METADATA_JOB_* limits.
+    """
+
+
+def archive_max_bytes_setting() -> int:
+    return getattr(settings, "METADATA_JOB_ARCHIVE_MAX_BYTES", DEFAULT_ARCHIVE_MAX_BYTES)
+
+
+def iter_archive(
+    upload,
+    max_documents: int = None,
+    document_max_bytes: int = None,
+    max_total_bytes: int = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yields the name and contents of every HTML file in a zip or tar archive (compressed or not).
+    A file is rejected on the size its header declares before it is decompressed, and read no
+    further than the limit in case the header is wrong.
+
+    Args:
+        upload: A file-like object opened in binary mode, e.g. an UploadedFile.
+        max_documents (int): Defaults to the METADATA_JOB_MAX_DOCUMENTS setting.
+        document_max_bytes (int): Defaults to the METADATA_JOB_DOCUMENT_MAX_BYTES setting.
+        max_total_bytes (int): The decompressed size of all the HTML files together. Defaults
+            to the METADATA_JOB_DOCUMENTS_MAX_TOTAL_BYTES setting.
+
+    Raises:
+        ArchiveTooLarge: If the archive has more HTML files than max_documents, or they are
+            larger than document_max_bytes each or max_total_bytes together.
+        ValueError: If the file is not a zip or tar archive.
+    """
+
+    if max_documents is None:
+        max_documents = getattr(settings, "METADATA_JOB_MAX_DOCUMENTS", DEFAULT_MAX_DOCUMENTS)
+    if document_max_bytes is None:
+        document_max_bytes = getattr(
+            settings, "METADATA_JOB_DOCUMENT_MAX_BYTES", DEFAULT_DOCUMENT_MAX_BYTES
+        )
+    if max_total_bytes is None:
+        max_total_bytes = getattr(
+            settings, "METADATA_JOB_DOCUMENTS_MAX_TOTAL_BYTES", DEFAULT_DOCUMENTS_MAX_TOTAL_BYTES
+        )
+
+    count = 0
+    total_bytes = 0
+
+    def read_member(name: str, declared_size: int, open_member: Callable) -> str:
+        nonlocal count, total_bytes
+        count += 1
+        if count > max_documents:
+            raise ArchiveTooLarge(f"An archive may contain at most {max_documents} HTML files.")
+        too_large = f"{name} is larger than {document_max_bytes} bytes."
+        if declared_size > document_max_bytes:
+            raise ArchiveTooLarge(too_large)
+        with open_member() as file:
+            data = file.read(document_max_bytes + 1)
+        if len(data) > document_max_bytes:
+            raise ArchiveTooLarge(too_large)
+        total_bytes += len(data)
+        if total_bytes > max_total_bytes:
+            raise ArchiveTooLarge(
+                f"The HTML files in an archive may be at most {max_total_bytes} bytes in total."
+            )
+        return data.decode("utf-8", errors="replace")
+
+    if zipfile.is_zipfile(upload):
+        upload.seek(0)
+        with zipfile.ZipFile(upload) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(HTML_EXTENSIONS):
+                    yield info.filename, read_member(
+                        info.filename, info.file_size, partial(archive.open, info)
+                    )
+        return
+
+    upload.seek(0)
+    try:
+        archive = tarfile.open(fileobj=upload, mode="r:*")
+    except tarfile.TarError as e:
+        raise ValueError("Expected a zip or tar archive.") from e
+    with archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(HTML_EXTENSIONS):
+                yield member.name, read_member(
+                    member.name, member.size, partial(archive.extractfile, member)
+                )
+
+
+def create_job(upload, batch_size: int = 500) -> ExtractionJob:
+    """
+    Creates a job with one pending document per HTML file in an uploaded archive.
+
+    Args:
+        upload: The uploaded archive.
+        batch_size (int): The number of documents inserted per query.
+
+    Returns:
+        ExtractionJob: The new job.
+
+    Raises:
+        ArchiveTooLarge: If the upload is larger than METADATA_JOB_ARCHIVE_MAX_BYTES or expands
+            beyond the limits of iter_archive().
+        ValueError: If the upload is not an archive or contains no HTML files.
+    """
+
+    max_bytes = archive_max_bytes_setting()
+    if getattr(upload, "size", 0) > max_bytes:
+        raise ArchiveTooLarge(f"An archive may be at most {max_bytes} bytes.")
+
+    with transaction.atomic():
+        job = ExtractionJob.objects.create(name=os.path.basename(getattr(upload, "name", "")))
+        batch: List[JobDocument] = []
+        batch_bytes = 0
+        count = 0
+        for name, html in iter_archive(upload):
+            batch.append(JobDocument(job=job, name=name, html=html))
+            batch_bytes += len(html)
+            if len(batch) >= batch_size or batch_bytes >= BULK_CREATE_MAX_BYTES:
+                JobDocument.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+                batch_bytes = 0
+        JobDocument.objects.bulk_create(batch)
+        count += len(batch)
+
+        if not count:
+            raise ValueError("The archive does not contain any HTML files.")
+
+    return job
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def stale_seconds_setting() -> int:
+    return getattr(settings, "METADATA_JOB_STALE_SECONDS", DEFAULT_STALE_SECONDS)
+
+
+def max_attempts_setting() -> int:
+    return getattr(settings, "METADATA_JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+
+
+def reset_stale_documents(stale_seconds: int = None, max_attempts: int = None) -> int:
+    """
+    Returns documents whose claim is older than the stale timeout to pending, so that another
+    worker picks them up. Documents that have already been claimed max_attempts times are
+    marked failed instead.
+
+    Args:
+        stale_seconds (int): Defaults to the METADATA_JOB_STALE_SECONDS setting.
+        max_attempts (int): Defaults to the METADATA_JOB_MAX_ATTEMPTS setting.
+
+    Returns:
+        int: The number of documents reset or failed.
+    """
+
+    if stale_seconds is None:
+        stale_seconds = stale_seconds_setting()
+    if max_attempts is None:
+        max_attempts = max_attempts_setting()
+    cutoff = timezone.now() - timedelta(seconds=stale_seconds)
+    stale = JobDocument.objects.filter(status=JobDocument.RUNNING, claimed_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=JobDocument.FAILED,
+        error=f"The worker extracting the document stopped {max_attempts} times.",
+        claimed_by="",
+        claimed_at=None,
+        finished_at=timezone.now(),
+    )
+    return failed + stale.update(status=JobDocument.PENDING, claimed_by="", claimed_at=None)
+
+
+def renew_claims(worker: str) -> int:
+    """
+    Moves the claim time of a worker's running documents to now, so that they do not go stale
+    while the worker is still busy with a long batch.
+
+    Returns:
+        int: The number of claims renewed.
+    """
+
+    return JobDocument.objects.filter(status=JobDocument.RUNNING, claimed_by=worker).update(
+        claimed_at=timezone.now()
+    )
+
+
+def release_documents(worker: str) -> int:
+    """
+    Returns the documents a worker has claimed but not finished to pending, e.g. when the
+    worker is shut down. The claim is not counted as an attempt.
+
+    Returns:
+        int: The number of documents released.
+    """
+
+    return JobDocument.objects.filter(status=JobDocument.RUNNING, claimed_by=worker).update(
+        status=JobDocument.PENDING,
+        claimed_by="",
+        claimed_at=None,
+        attempts=F("attempts") - 1,
+    )
+
+
+def claim_documents(limit: int, worker: str) -> List[JobDocument]:
+    """
+    Claims up to limit pending documents, oldest first, for a worker.
+
+    Each claim is a conditional UPDATE that only succeeds while the document is still pending,
+    so two workers can never claim the same document.
+    """
+
+    claimed = []
+    candidates = JobDocument.objects.filter(status=JobDocument.PENDING).order_by("id")
+    for pk in candidates.values_list("pk", flat=True)[: limit * 2]:
+        updated = JobDocument.objects.filter(pk=pk, status=JobDocument.PENDING).update(
+            status=JobDocument.RUNNING,
+            claimed_by=worker,
+            claimed_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+        if updated:
+            claimed.append(pk)
+        if len(claimed) >= limit:
+            break
+    return list(JobDocument.objects.filter(pk__in=claimed).order_by("id"))
+
+
+def process_documents(
+    documents: List[JobDocument], pool: ExtractionPool, function: Callable = extract_decision
+) -> int:
+    """
+    Extracts claimed documents concurrently and stores each result as soon as it is ready. A
+    result is only stored while the document is still claimed by the worker that claimed it;
+    the claims are renewed as the batch goes on. Documents that were in flight when a pool
+    worker died are returned to the queue until they run out of attempts.
+
+    Args:
+        documents (List[JobDocument]): The claimed documents.
+        pool (ExtractionPool): The pool to extract them in.
+        function (Callable): The extraction function, e.g. one wrapped by
+            slow_document_profiler().
+
+    Returns:
+        int: The number of documents whose result was stored.
+    """
+
+    if not documents:
+        return 0
+    worker = documents[0].claimed_by
+    renew_interval = stale_seconds_setting() / 4
+    max_attempts = max_attempts_setting()
+    renewed = time.monotonic()
+
+    stored = 0
+    results = pool.imap_unordered((document.html for document in documents), function)
+    for position, result in results:
+        document = documents[position]
+        claim = JobDocument.objects.filter(
+            pk=document.pk, status=JobDocument.RUNNING, claimed_by=document.claimed_by
+        )
+        if isinstance(result, BrokenProcessPool) and document.attempts < max_attempts:
+            # The worker may have been killed by another document of the batch
+            claim.update(status=JobDocument.PENDING, claimed_by="", claimed_at=None)
+        elif isinstance(result, Exception):
+            stored += claim.update(
+                status=JobDocument.FAILED,
+                error=f"{type(result).__name__}: {result}",
+                finished_at=timezone.now(),
+            )
+        else:
+            # The profile of a slow document stays in METADATA_PROFILE_DIR, named after it
+            result.pop(PROFILE_PATH_KEY, None)
+            stored += claim.update(
+                status=JobDocument.DONE,
+                result=to_json_record(result),
+                error="",
+                finished_at=timezone.now(),
+            )
+
+        if time.monotonic() - renewed >= renew_interval:
+            renew_claims(worker)
+            renewed = time.monotonic()
+    return stored
+
+
+def job_progress(job: ExtractionJob, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+    """
+    Summarizes a job's progress, with the records of finished documents.
+
+    Args:
+        job (ExtractionJob): The job.
+        offset (int): The number of finished documents to skip, in completion order.
+        limit (int): The largest number of finished documents to include.
+
+    Returns:
+        Dict[str, Any]: The job's status, counts per document status and the page of results.
+        "next_offset" is the offset to poll with to receive only newer results.
+    """
+
+    counts = {status: 0 for status, _ in JobDocument.STATUS_CHOICES}
+    for row in job.documents.values("status").annotate(count=Count("id")):
+        counts[row["status"]] = row["count"]
+    total = sum(counts.values())
+
+    if counts[JobDocument.PENDING] == total:
+        status = "queued"
+    elif counts[JobDocument.PENDING] or counts[JobDocument.RUNNING]:
+        status = "running"
+    else:
+        status = "done"
+
+    finished = job.documents.filter(
+        status__in=[JobDocument.DONE, JobDocument.FAILED]
+    ).order_by("finished_at", "id")
+    results = [
+        {"id": name, "status": document_status, "record": result, "error": error}
+        for name, document_status, result, error in finished.values_list(
+            "name", "status", "result", "error"
+        )[offset : offset + limit]
+    ]
+
+    return {
+        "job": str(job.pk),
+        "name": job.name,
+        "status": status,
+        "total": total,
+        "counts": counts,
+        "progress": (counts[JobDocument.DONE] + counts[JobDocument.FAILED]) / total
+        if total
+        else 1.0,
+        "results": results,
+        "next_offset": offset + len(results),
+    }
@@ -0,0 +1,79 @@
+"""
+Processes queued extraction jobs. Run one or more workers alongside the web server:
+
+    python manage.py extraction_worker
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from metadata.jobs import (
+    claim_documents,
+    process_documents,
+    release_documents,
+    reset_stale_documents,
+    worker_name,
+)
+from metadata.pipeline import get_extraction_pool
+from metadata.profiling import slow_document_profiler
+
+
+class Command(BaseCommand):
+    help = "Extracts the documents of queued extraction jobs in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=0,
+            help="Documents claimed at a time (default: twice the number of workers).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait before checking again when the queue is empty.",
+        )
+        parser.add_argument(
+            "--profile-slow",
+            type=float,
+            default=None,
+            metavar="SECONDS",
+            help="Save a sampled profile of every document that takes at least this long to "
+            "extract (default: the METADATA_PROFILE_SLOW_SECONDS setting).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of waiting for new jobs.",
+        )
+
+    def handle(self, *args, **options):
+        pool = get_extraction_pool()
+        batch_size = options["batch_size"] or pool.workers * 2
+        worker = worker_name()
+        function = slow_document_profiler(threshold=options["profile_slow"])
+        self.stdout.write(f"Extraction worker {worker} started with {pool.workers} processes.")
+
+        try:
+            while True:
+                reset = reset_stale_documents()
+                if reset:
+                    self.stdout.write(f"Returned {reset} stale documents to the queue.")
+
+                documents = claim_documents(batch_size, worker)
+                if documents:
+                    processed = process_documents(documents, pool, function)
+                    self.stdout.write(f"Processed {processed} documents.")
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Extraction worker stopped.")
+        finally:
+            # Hand unfinished documents back; if the worker dies without getting here, they are
+            # returned to the queue once their claim goes stale
+            pool.shutdown()
+            release_documents(worker)
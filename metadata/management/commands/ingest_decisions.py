@@ -0,0 +1,85 @@
+"""
+Loads extracted decisions into the database, from NDJSON files written by the batch API or
+from finished extraction jobs:
+
+    python manage.py ingest_decisions results.ndjson
+    python manage.py ingest_decisions --job 0f8c...
+
+The body of a job's decisions is converted again from their stored HTML for the full-text
+index. Extraction records do not include it, so NDJSON decisions are only searchable by their
+body if a line carries it under "main_content".
+"""
+
+import json
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from metadata.db import BulkLoadRunning, bulk_load
+from metadata.ingest import DEFAULT_CHUNK_SIZE, ingest_decisions
+from metadata.models import JobDocument
+from metadata.pipeline import extract_main_content
+
+
+def read_ndjson(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    item = json.loads(line)
+                    # Lines from the batch API wrap the record; bare records are accepted too
+                    record = item.get("record", item)
+                    if record and "record" in item and item.get("main_content"):
+                        record = {**record, "main_content": item["main_content"]}
+                    if record:
+                        yield record
+
+
+def read_jobs(job_ids):
+    documents = JobDocument.objects.filter(job_id__in=job_ids, status=JobDocument.DONE)
+    results = documents.values_list("result", "html").iterator(chunk_size=DEFAULT_CHUNK_SIZE)
+    for result, html in results:
+        yield {**result, "main_content": extract_main_content(html)}
+
+
+class Command(BaseCommand):
+    help = "Loads extracted decisions into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="NDJSON files of extracted records.")
+        parser.add_argument(
+            "--job", action="append", default=[], help="ID of an extraction job to load."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Decisions written per transaction.",
+        )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Drop the secondary and search indexes during the load and rebuild them after. "
+            "Run it while the web server and extraction workers are stopped.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["paths"] and not options["job"]:
+            raise CommandError("Give at least one NDJSON file or --job.")
+
+        start = time.perf_counter()
+        written = 0
+        try:
+            with bulk_load() if options["bulk"] else nullcontext():
+                if options["paths"]:
+                    written += ingest_decisions(
+                        read_ndjson(options["paths"]), options["chunk_size"]
+                    )
+                if options["job"]:
+                    written += ingest_decisions(read_jobs(options["job"]), options["chunk_size"])
+        except BulkLoadRunning as e:
+            raise CommandError(str(e)) from e
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Loaded {written} decisions in {elapsed:.1f}s.")
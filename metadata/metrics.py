@@ -0,0 +1,458 @@
+"""
+Operational metrics for the extraction pipeline, exposed by the /metrics view in the
+Prometheus text format.
+
+Decisions are extracted in several processes (web workers and the extraction pool's workers),
+so each process keeps its own counters, gauges and histograms and writes them every few
+seconds, and when it exits, to a snapshot file in METADATA_METRICS_DIR. The file is named
+after the PID and a random token, so a process that is given the PID of an exited one does not
+overwrite its snapshot. The /metrics view merges every snapshot: counters and histograms are
+summed over all processes, including ones that have exited, so totals do not drop when a
+worker is replaced; gauges only count processes that are still running. The snapshots of
+exited processes are folded into a single file of accumulated totals, EXITED_FILE, and deleted,
+so the directory does not grow with every process ever started. Clear the directory when the
+server is redeployed to start the totals from zero.
+
+The per-stage histograms come from metadata.instrumentation and are only reported while it is
+enabled; everything else is always recorded.
+"""
+
+import atexit
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited processes are kept rather than folded
+    fcntl = None
+
+from . import instrumentation
+from .instrumentation import Histogram
+
+# Where each process writes its snapshot. The default sits next to db.sqlite3.
+METRICS_DIR = os.environ.get(
+    "METADATA_METRICS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".metrics"),
+)
+
+# Seconds between snapshot writes while a process keeps recording
+FLUSH_INTERVAL = 2.0
+
+# The accumulated counters and histograms of exited processes, in METRICS_DIR
+EXITED_FILE = "exited.json"
+
+# Locked while the snapshots are merged, so that two scrapes do not fold the same snapshot
+LOCK_FILE = ".lock"
+
+# Histogram bucket bounds in seconds for the exposition, from 1 ms to a minute
+DURATION_BOUNDS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# The type and help text of every metric, by name
+METRICS = {
+    "canlii_documents_processed_total": (
+        "counter", "Decisions extracted, by the rule set applied to them."
+    ),
+    "canlii_extraction_failures_total": (
+        "counter",
+        "Decisions whose extraction raised an exception or whose page lacked the CanLII "
+        "metadata, by jurisdiction.",
+    ),
+    "canlii_extraction_duration_seconds": (
+        "histogram", "Time to extract one decision, by rule set."
+    ),
+    "canlii_result_cache_requests_total": (
+        "counter", "Lookups in the extraction result cache, by result (hit or miss)."
+    ),
+    "canlii_pool_in_flight": (
+        "gauge", "Decisions submitted to the extraction pool and not yet finished."
+    ),
+    "canlii_pool_capacity": (
+        "gauge", "Decisions the extraction pool accepts before responding with 503."
+    ),
+    "canlii_stage_duration_seconds": (
+        "histogram", "Wall time of each pipeline stage, while instrumentation is enabled."
+    ),
+    "canlii_stage_cpu_seconds": (
+        "histogram", "CPU time of each pipeline stage, while instrumentation is enabled."
+    ),
+    "canlii_job_documents": (
+        "gauge", "Documents in the background extraction queue, by status."
+    ),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_counters: Dict[Tuple[str, Labels], float] = {}
+_gauges: Dict[Tuple[str, Labels], float] = {}
+_histograms: Dict[Tuple[str, Labels], Histogram] = {}
+_lock = threading.Lock()
+_dirty = False
+_writer_pid: Optional[int] = None
+_snapshot_name: Optional[str] = None
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Labels]:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    """
+    Adds to a counter, e.g. inc("canlii_result_cache_requests_total", result="hit").
+    """
+
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _mark_dirty()
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+    _mark_dirty()
+
+
+def observe(name: str, value_ns: int, **labels) -> None:
+    """
+    Records a duration, in nanoseconds, in a histogram.
+    """
+
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.record(value_ns)
+    _mark_dirty()
+
+
+def record_cache_lookups(hits: int, misses: int) -> None:
+    if hits:
+        inc("canlii_result_cache_requests_total", hits, result="hit")
+    if misses:
+        inc("canlii_result_cache_requests_total", misses, result="miss")
+
+
+def observe_extraction(function: Callable) -> Callable:
+    """
+    Decorates an extraction function that returns a decision's context, counting the decision
+    by rule set, timing it, and counting it as a failure if it raises or lacks the CanLII
+    metadata.
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            context = function(*args, **kwargs)
+        except Exception:
+            # The jurisdiction is read from the page, which may be what failed
+            inc("canlii_extraction_failures_total", jurisdiction="unknown", reason="exception")
+            raise
+        rules = context.get("rules", "default")
+        inc("canlii_documents_processed_total", rules=rules)
+        observe("canlii_extraction_duration_seconds", time.perf_counter_ns() - start, rules=rules)
+        if not context.get("case_info_available"):
+            inc(
+                "canlii_extraction_failures_total",
+                jurisdiction=context.get("jurisdiction") or "unknown",
+                reason="missing_metadata",
+            )
+        return context
+
+    return wrapper
+
+
+def _mark_dirty() -> None:
+    """
+    Notes that there is something new to write, and makes sure this process has a writer
+    thread. The thread is started on first use, and again after a fork, since threads do not
+    survive one. The final snapshot is written at exit; a process started by multiprocessing,
+    such as a pool worker, writes it from multiprocessing's own exit hook, which runs whether
+    or not the interpreter's atexit handlers do.
+    """
+
+    global _dirty, _writer_pid, _snapshot_name
+    _dirty = True
+    pid = os.getpid()
+    if _writer_pid != pid:
+        with _lock:
+            if _writer_pid == pid:
+                return
+            _writer_pid = pid
+            _snapshot_name = f"{pid}-{os.urandom(4).hex()}.json"
+        threading.Thread(target=_write_periodically, name="metrics-writer", daemon=True).start()
+        if multiprocessing.parent_process() is not None:
+            multiprocessing.util.Finalize(None, write_snapshot, exitpriority=10)
+        else:
+            atexit.register(write_snapshot)
+
+
+def _write_periodically() -> None:
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if _dirty:
+            write_snapshot()
+
+
+def _snapshot_data() -> Dict[str, Any]:
+    with _lock:
+        data = {
+            "pid": os.getpid(),
+            "counters": [
+                [name, dict(labels), value] for (name, labels), value in _counters.items()
+            ],
+            "gauges": [
+                [name, dict(labels), value] for (name, labels), value in _gauges.items()
+            ],
+            "histograms": [
+                [name, dict(labels), histogram.to_dict()]
+                for (name, labels), histogram in _histograms.items()
+            ],
+        }
+    for stage_name, stats in instrumentation.snapshot().items():
+        data["histograms"].append(
+            ["canlii_stage_duration_seconds", {"stage": stage_name}, stats.wall.to_dict()]
+        )
+        data["histograms"].append(
+            ["canlii_stage_cpu_seconds", {"stage": stage_name}, stats.cpu.to_dict()]
+        )
+    return data
+
+
+def write_snapshot(directory: Optional[str] = None) -> None:
+    """
+    Writes this process's metrics to its snapshot file. The file is replaced atomically, so a
+    reader never sees a partial one. Errors are ignored: metrics must not break extraction.
+    """
+
+    global _dirty
+    directory = directory or METRICS_DIR
+    if _writer_pid != os.getpid():
+        # Name this process's snapshot and set up its periodic and final writes
+        _mark_dirty()
+    _dirty = False
+    path = os.path.join(directory, _snapshot_name)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(_snapshot_data(), file)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+
+
+def process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    # Signal 0 only checks that the process exists on POSIX; on Windows os.kill() would end it
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _add_snapshot(merged: Dict[str, Dict], data: Dict[str, Any], gauges: bool = True) -> None:
+    for metric, labels, value in data.get("counters", []):
+        key = _key(metric, labels)
+        merged["counters"][key] = merged["counters"].get(key, 0) + value
+    if gauges:
+        for metric, labels, value in data.get("gauges", []):
+            key = _key(metric, labels)
+            merged["gauges"][key] = merged["gauges"].get(key, 0) + value
+    for metric, labels, histogram_data in data.get("histograms", []):
+        key = _key(metric, labels)
+        histogram = Histogram.from_dict(histogram_data)
+        if key in merged["histograms"]:
+            merged["histograms"][key].merge(histogram)
+        else:
+            merged["histograms"][key] = histogram
+
+
+@contextmanager
+def _locked(directory: str) -> Iterator[bool]:
+    """
+    Holds the lock of the snapshot directory, waiting for it if necessary.
+
+    Yields:
+        bool: Whether the lock is held; it cannot be on platforms without fcntl.
+    """
+
+    if fcntl is None:
+        yield False
+        return
+    with open(os.path.join(directory, LOCK_FILE), "a") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _fold_exited(directory: str, exited: Dict[str, Dict], dead: Dict[str, Dict]) -> bool:
+    """
+    Adds the counters and histograms of exited processes to the accumulated totals, writes
+    them, and deletes the processes' snapshots. The names of the folded snapshots are saved
+    with the totals, so that if the deletions are interrupted, the next fold deletes them
+    instead of counting them again.
+
+    Returns:
+        bool: Whether the totals were written.
+    """
+
+    totals: Dict[str, Dict] = {"counters": {}, "gauges": {}, "histograms": {}}
+    _add_snapshot(totals, exited, gauges=False)
+    for data in dead.values():
+        _add_snapshot(totals, data, gauges=False)
+
+    path = os.path.join(directory, EXITED_FILE)
+    data = {
+        "counters": [
+            [name, dict(labels), value] for (name, labels), value in totals["counters"].items()
+        ],
+        "histograms": [
+            [name, dict(labels), histogram.to_dict()]
+            for (name, labels), histogram in totals["histograms"].items()
+        ],
+        "folded": sorted(dead),
+    }
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        return False
+
+    exited.clear()
+    exited.update(data)
+    for name in dead:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+    return True
+
+
+def read_snapshots(directory: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Merges the snapshot files of every process, after folding those of exited processes into
+    the accumulated totals.
+
+    Returns:
+        Dict[str, Dict]: The merged "counters", "gauges" and "histograms", each keyed by
+        (name, labels).
+    """
+
+    directory = directory or METRICS_DIR
+    merged: Dict[str, Dict] = {"counters": {}, "gauges": {}, "histograms": {}}
+    if not os.path.isdir(directory):
+        return merged
+
+    with _locked(directory) as locked:
+        exited = _read_json(os.path.join(directory, EXITED_FILE)) or {}
+        # Snapshots already in the totals, left behind by an interrupted fold
+        folded = set(exited.get("folded", []))
+
+        live: Dict[str, Dict] = {}
+        dead: Dict[str, Dict] = {}
+        for name in os.listdir(directory):
+            if not name.endswith(".json") or name == EXITED_FILE:
+                continue
+            if name in folded:
+                if locked:
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        pass
+                continue
+            data = _read_json(os.path.join(directory, name))
+            if data is None:
+                continue
+            if process_alive(data["pid"]):
+                live[name] = data
+            else:
+                dead[name] = data
+
+        if dead and locked and _fold_exited(directory, exited, dead):
+            dead = {}
+
+    _add_snapshot(merged, exited, gauges=False)
+    for data in dead.values():
+        _add_snapshot(merged, data, gauges=False)
+    for data in live.values():
+        _add_snapshot(merged, data)
+    return merged
+
+
+def _format_labels(labels: Labels, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (label, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for label, value in pairs
+    )
+    return "{" + ",".join(f'{label}="{value}"' for label, value in escaped) + "}"
+
+
+def render_metrics(merged: Dict[str, Dict], extra_gauges: Optional[Dict] = None) -> str:
+    """
+    Formats merged metrics in the Prometheus text exposition format.
+
+    Args:
+        merged (Dict[str, Dict]): The result of read_snapshots().
+        extra_gauges (Optional[Dict]): Gauges computed at scrape time, keyed by (name, labels).
+
+    Returns:
+        str: The exposition, one HELP and TYPE block per metric.
+    """
+
+    gauges = dict(merged["gauges"])
+    gauges.update(extra_gauges or {})
+    series: Dict[str, List[str]] = {}
+
+    for values in (merged["counters"], gauges):
+        for (name, labels), value in sorted(values.items()):
+            series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+
+    bounds_ns = [int(bound * 1e9) for bound in DURATION_BOUNDS]
+    for (name, labels), histogram in sorted(merged["histograms"].items()):
+        lines = series.setdefault(name, [])
+        for bound, count in zip(DURATION_BOUNDS, histogram.cumulative_counts(bounds_ns)):
+            bucket_labels = _format_labels(labels, [("le", f"{bound:g}")])
+            lines.append(f"{name}_bucket{bucket_labels} {count}")
+        bucket_labels = _format_labels(labels, [("le", "+Inf")])
+        lines.append(f"{name}_bucket{bucket_labels} {histogram.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total / 1e9:g}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+    output = []
+    for name, lines in series.items():
+        kind, help_text = METRICS.get(name, ("untyped", ""))
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
@@ -0,0 +1,122 @@
+"""
+Response compression. Result pages and API responses are large and repetitive, so they shrink
+well: Brotli is used for clients that accept it when the brotli package is installed, and gzip
+otherwise. Streamed responses are flushed after each item in either encoding, so that records
+streamed by the batch API reach the client as they are produced.
+"""
+
+import re
+import secrets
+import string
+import zlib
+from gzip import GzipFile
+from io import BytesIO
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Brotli's default quality of 11 is meant for static assets; 5 compresses about as well as gzip
+# level 9 at a fraction of the time, which suits responses built per request
+BROTLI_QUALITY = 5
+
+ACCEPTS_BROTLI = re.compile(r"\bbr\b")
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that prefers Brotli when the client and the server both support it, and that
+    flushes gzip streams after each item. The rules for which responses are compressed, and the
+    weakening of strong ETags, are the same as GZipMiddleware's.
+    """
+
+    def process_response(self, request, response):
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        # Async streams, and whole responses for clients without Brotli, are left to
+        # GZipMiddleware
+        if response.streaming and response.is_async:
+            return super().process_response(request, response)
+        if brotli is not None and ACCEPTS_BROTLI.search(accept_encoding):
+            encoding = "br"
+        elif response.streaming and ACCEPTS_GZIP.search(accept_encoding):
+            encoding = "gzip"
+        else:
+            return super().process_response(request, response)
+
+        # Same conditions as GZipMiddleware: skip tiny and already encoded responses
+        if not response.streaming and len(response.content) < 200:
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        if response.streaming:
+            if encoding == "br":
+                response.streaming_content = compress_stream(response.streaming_content)
+            else:
+                response.streaming_content = gzip_stream(
+                    response.streaming_content, self.max_random_bytes
+                )
+            # Delete the Content-Length header, since the compressed length is not known
+            del response.headers["Content-Length"]
+        else:
+            compressed_content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            # Return the uncompressed response if compression would not make it smaller
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        # The compressed body differs from the uncompressed one, so a strong ETag would be
+        # wrong; a weak one still matches conditional requests
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+
+        return response
+
+
+def compress_stream(sequence):
+    """
+    Compresses a streamed response with Brotli, flushing after each item so that streamed
+    records, such as the batch API's NDJSON lines, reach the client as they are produced.
+    """
+
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def gzip_stream(sequence, max_random_bytes: int = 0):
+    """
+    Compresses a streamed response with gzip like django.utils.text.compress_sequence(), which
+    only writes out what the compressor has buffered once the stream ends, but with a sync flush
+    after each item. Like Django's, the gzip header carries a file name of random length, which
+    makes the compressed length a poor guide to the content.
+    """
+
+    buffer = BytesIO()
+    filename = None
+    if max_random_bytes:
+        length = secrets.randbelow(max_random_bytes) + 1
+        filename = "".join(secrets.choice(string.ascii_letters) for _ in range(length))
+    with GzipFile(filename=filename, mode="wb", compresslevel=6, fileobj=buffer, mtime=0) as file:
+        for item in sequence:
+            file.write(item)
+            file.flush(zlib.Z_SYNC_FLUSH)
+            data = buffer.getvalue()
+            if data:
+                yield data
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
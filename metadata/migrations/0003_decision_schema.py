@@ -0,0 +1,144 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata', '0002_extraction_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Decision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('primary_key', models.CharField(max_length=64, unique=True)),
+                ('style_of_cause', models.CharField(blank=True, max_length=500)),
+                ('citation', models.CharField(blank=True, max_length=100)),
+                ('citation_key', models.BigIntegerField(blank=True, null=True)),
+                ('decision_date', models.DateField(blank=True, null=True)),
+                ('decision_year', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('jurisdiction', models.CharField(blank=True, max_length=64)),
+                ('court_code', models.CharField(blank=True, max_length=32)),
+                ('court_level', models.CharField(blank=True, max_length=128)),
+                ('language', models.CharField(blank=True, max_length=16)),
+                ('url', models.URLField(blank=True, max_length=500)),
+                ('docket', models.CharField(blank=True, max_length=128)),
+                ('case_type', models.CharField(blank=True, max_length=32)),
+                ('case_category', models.CharField(blank=True, max_length=32)),
+                ('disposition', models.TextField(blank=True)),
+                ('appeal_from', models.CharField(blank=True, max_length=255)),
+                ('case_heard', models.CharField(blank=True, max_length=255)),
+                ('keywords', models.JSONField(blank=True, default=list)),
+                ('subjects', models.JSONField(blank=True, default=list)),
+                ('other_citations', models.JSONField(blank=True, default=list)),
+                ('rules', models.CharField(blank=True, max_length=64)),
+                ('headnote', models.TextField(blank=True)),
+                ('main_content', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Judge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JudicialRole',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aggregate', models.CharField(max_length=32)),
+                ('role', models.CharField(max_length=32)),
+                ('decision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roles', to='metadata.decision')),
+                ('judge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roles', to='metadata.judge')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='decision',
+            name='judges',
+            field=models.ManyToManyField(related_name='decisions', through='metadata.JudicialRole', to='metadata.judge'),
+        ),
+        migrations.CreateModel(
+            name='LegislationCitation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(max_length=255)),
+                ('jurisdiction', models.CharField(blank=True, max_length=8)),
+                ('statute', models.CharField(max_length=128)),
+                ('section', models.CharField(blank=True, max_length=32)),
+                ('subsection', models.CharField(blank=True, max_length=32)),
+                ('decision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='legislation_citations', to='metadata.decision')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Party',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500)),
+                ('role', models.CharField(blank=True, max_length=64)),
+                ('decision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parties', to='metadata.decision')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Counsel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('party_role', models.CharField(blank=True, max_length=64)),
+                ('decision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counsel', to='metadata.decision')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['name'], name='counsel_name_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CaseCitation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(max_length=64)),
+                ('jurisdiction', models.CharField(blank=True, max_length=8)),
+                ('court_code', models.CharField(blank=True, max_length=32)),
+                ('year', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='case_citations', to='metadata.decision')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['target'], name='casecite_target_idx'), models.Index(fields=['court_code', 'year'], name='casecite_court_year_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='judicialrole',
+            index=models.Index(fields=['judge', 'role'], name='role_judge_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='judicialrole',
+            index=models.Index(fields=['decision', 'aggregate'], name='role_decision_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='decision',
+            index=models.Index(fields=['jurisdiction', 'court_code', 'decision_year'], name='decision_court_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='decision',
+            index=models.Index(fields=['decision_date'], name='decision_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='decision',
+            index=models.Index(fields=['docket'], name='decision_docket_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='decision',
+            index=models.Index(fields=['citation_key'], name='decision_citation_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='legislationcitation',
+            index=models.Index(fields=['statute', 'section'], name='legcite_statute_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='party',
+            index=models.Index(fields=['name'], name='party_name_idx'),
+        ),
+    ]
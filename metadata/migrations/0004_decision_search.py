@@ -0,0 +1,71 @@
+from django.db import migrations
+
+# Full-text index over the searchable Decision columns. It is an external-content FTS5 table:
+# the text lives only in metadata_decision and the triggers keep the index in step with it.
+FTS_COLUMNS = "style_of_cause, headnote, keywords, subjects, main_content"
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE metadata_decision_fts USING fts5(
+        {FTS_COLUMNS},
+        content='metadata_decision',
+        content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER metadata_decision_fts_insert AFTER INSERT ON metadata_decision BEGIN
+        INSERT INTO metadata_decision_fts(rowid, {FTS_COLUMNS})
+        VALUES (new.id, new.style_of_cause, new.headnote, new.keywords, new.subjects,
+                new.main_content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER metadata_decision_fts_delete AFTER DELETE ON metadata_decision BEGIN
+        INSERT INTO metadata_decision_fts(metadata_decision_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, old.style_of_cause, old.headnote, old.keywords, old.subjects,
+                old.main_content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER metadata_decision_fts_update AFTER UPDATE ON metadata_decision BEGIN
+        INSERT INTO metadata_decision_fts(metadata_decision_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', old.id, old.style_of_cause, old.headnote, old.keywords, old.subjects,
+                old.main_content);
+        INSERT INTO metadata_decision_fts(rowid, {FTS_COLUMNS})
+        VALUES (new.id, new.style_of_cause, new.headnote, new.keywords, new.subjects,
+                new.main_content);
+    END
+    """,
+    # Index any decisions loaded before this migration
+    "INSERT INTO metadata_decision_fts(metadata_decision_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS metadata_decision_fts_insert",
+    "DROP TRIGGER IF EXISTS metadata_decision_fts_delete",
+    "DROP TRIGGER IF EXISTS metadata_decision_fts_update",
+    "DROP TABLE IF EXISTS metadata_decision_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite-specific; other databases would need their own full-text index
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata', '0003_decision_schema'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
@@ -1,6 +1,219 @@
+import uuid
+
 from django.db import models
 
 # Create your models here.
 
 class TextSubmission(models.Model):
     text_content = models.TextField()
+
+
+class ExtractionJob(models.Model):
+    """
+    A batch of decisions uploaded as an archive and extracted in the background by the
+    extraction_worker management command. The job's progress is derived from its documents.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name or str(self.id)
+
+
+class JobDocument(models.Model):
+    """
+    One decision in an extraction job. Workers claim pending documents by switching them to
+    running; a document left running by a worker that stopped is reset to pending once its
+    claim is older than METADATA_JOB_STALE_SECONDS, or marked failed once it has been claimed
+    METADATA_JOB_MAX_ATTEMPTS times.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    job = models.ForeignKey(ExtractionJob, on_delete=models.CASCADE, related_name="documents")
+    name = models.CharField(max_length=255)
+    html = models.TextField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=255, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming scans pending documents in upload order; polling counts by job and status
+            models.Index(fields=["status", "id"], name="jobdoc_status_idx"),
+            models.Index(fields=["job", "status"], name="jobdoc_job_status_idx"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Judge(models.Model):
+    """
+    A judge, identified by surname as written in the decisions.
+    """
+
+    name = models.CharField(max_length=128, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Decision(models.Model):
+    """
+    One decision and the metadata extracted from it. List-valued metadata that is only ever
+    displayed (keywords, subjects, other citations) is kept as JSON; everything that is filtered
+    or joined on has its own column or table.
+    """
+
+    primary_key = models.CharField(max_length=64, unique=True)
+    style_of_cause = models.CharField(max_length=500, blank=True)
+    citation = models.CharField(max_length=100, blank=True)
+    citation_key = models.BigIntegerField(null=True, blank=True)
+    decision_date = models.DateField(null=True, blank=True)
+    decision_year = models.PositiveSmallIntegerField(null=True, blank=True)
+    jurisdiction = models.CharField(max_length=64, blank=True)
+    court_code = models.CharField(max_length=32, blank=True)
+    court_level = models.CharField(max_length=128, blank=True)
+    language = models.CharField(max_length=16, blank=True)
+    url = models.URLField(max_length=500, blank=True)
+    docket = models.CharField(max_length=128, blank=True)
+    case_type = models.CharField(max_length=32, blank=True)
+    case_category = models.CharField(max_length=32, blank=True)
+    disposition = models.TextField(blank=True)
+    appeal_from = models.CharField(max_length=255, blank=True)
+    case_heard = models.CharField(max_length=255, blank=True)
+    keywords = models.JSONField(default=list, blank=True)
+    subjects = models.JSONField(default=list, blank=True)
+    other_citations = models.JSONField(default=list, blank=True)
+    rules = models.CharField(max_length=64, blank=True)
+    headnote = models.TextField(blank=True)
+    main_content = models.TextField(blank=True)
+    judges = models.ManyToManyField(Judge, through="JudicialRole", related_name="decisions")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["jurisdiction", "court_code", "decision_year"],
+                name="decision_court_year_idx",
+            ),
+            models.Index(fields=["decision_date"], name="decision_date_idx"),
+            models.Index(fields=["docket"], name="decision_docket_idx"),
+            models.Index(fields=["citation_key"], name="decision_citation_key_idx"),
+        ]
+
+    def __str__(self):
+        return self.citation or self.primary_key
+
+
+class JudicialRole(models.Model):
+    """
+    A judge's part in a decision, from define_judicial_aggregate(). The aggregate is the context
+    field the role came from (e.g. "written_reasons" or "concurring"); panel membership from
+    the "before" field is stored with the aggregate "before" and the role "panel".
+    """
+
+    decision = models.ForeignKey(Decision, on_delete=models.CASCADE, related_name="roles")
+    judge = models.ForeignKey(Judge, on_delete=models.CASCADE, related_name="roles")
+    aggregate = models.CharField(max_length=32)
+    role = models.CharField(max_length=32)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["judge", "role"], name="role_judge_role_idx"),
+            models.Index(fields=["decision", "aggregate"], name="role_decision_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.judge} ({self.role})"
+
+
+class Party(models.Model):
+    decision = models.ForeignKey(Decision, on_delete=models.CASCADE, related_name="parties")
+    name = models.CharField(max_length=500)
+    role = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name"], name="party_name_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.role})"
+
+
+class Counsel(models.Model):
+    decision = models.ForeignKey(Decision, on_delete=models.CASCADE, related_name="counsel")
+    name = models.CharField(max_length=255)
+    party_role = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name"], name="counsel_name_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} for the {self.party_role}"
+
+
+class CaseCitation(models.Model):
+    """
+    A case cited by a decision, from the CanLII judgmentLinks list. The cited decision is
+    identified by its CanLII document ID, whether or not it has been ingested itself.
+    """
+
+    source = models.ForeignKey(
+        Decision, on_delete=models.CASCADE, related_name="case_citations"
+    )
+    target = models.CharField(max_length=64)
+    jurisdiction = models.CharField(max_length=8, blank=True)
+    court_code = models.CharField(max_length=32, blank=True)
+    year = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["target"], name="casecite_target_idx"),
+            models.Index(fields=["court_code", "year"], name="casecite_court_year_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.source} -> {self.target}"
+
+
+class LegislationCitation(models.Model):
+    """
+    A provision cited by a decision, from the CanLII legislationLinks list, parsed with
+    parse_legislation_key().
+    """
+
+    decision = models.ForeignKey(
+        Decision, on_delete=models.CASCADE, related_name="legislation_citations"
+    )
+    target = models.CharField(max_length=255)
+    jurisdiction = models.CharField(max_length=8, blank=True)
+    statute = models.CharField(max_length=128)
+    section = models.CharField(max_length=32, blank=True)
+    subsection = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["statute", "section"], name="legcite_statute_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.decision} -> {self.target}"
@@ -0,0 +1,411 @@
+"""
+The extraction pipeline for a single CanLII decision, and a bounded process pool that runs it
+off the request thread.
+
+extract_decision() is the work done by the index view: the general rule set, the markdown
+conversion and the jurisdiction-specific rule sets. It depends only on the submitted HTML, so
+it can run in a worker process and return its context.
+"""
+
+import asyncio
+import atexit
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .utils.html_to_markdown_canlii import MarkdownConverter, html_to_markdown, refine_markdown
+from .utils.markdown import process_markdown
+from .utils.scanner import scan_citations
+
+from .instrumentation import stage
+from .metrics import observe_extraction, set_gauge
+from .rules.general import (
+    LinkCollector,
+    MetaScanner,
+    apply_general_metadata,
+    extract_general_metadata,
+)
+
+# Version of the rule sets as a whole. Bump it whenever a change to the rules or the pipeline
+# changes the extracted output, so that cached results from the old rules are not reused.
+RULESET_VERSION = "5"
+
+# Characters read at a time when extracting a decision from a file
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def process_main_content(main_content):
+    """
+    Processes the main content of the markdown file.
+    """
+
+    # Split the main_content string whenever the pattern "\n__\n" is found
+    # This will split the main_content into paragraphs
+    paragraphs = main_content.split("\n__\n")
+
+    for paragraph in paragraphs:
+        # Remove any leading or trailing whitespace
+        paragraph = paragraph.strip()
+        # Remove any leading or trailing newlines
+        paragraph = paragraph.replace("\n", " ")
+
+        # Replace "]               " with "] "
+        paragraph = re.sub(r"\]\s+", "] ", paragraph)
+
+
+def apply_jurisdiction_rules(context: Dict[str, Any], metadata_lines: List[str]) -> None:
+    """
+    Checks to see if any special rules apply and runs them.
+
+    Args:
+        context (Dict[str, Any]): The context populated by extract_general_metadata().
+        metadata_lines (List[str]): The headnote lines returned by process_markdown().
+    """
+
+    context["rules"] = "default"
+    if context.get("jurisdiction") != "Saskatchewan":
+        return
+
+    # The rule sets are only loaded once a decision needs them
+    from .rules.skca_2003 import skca_2003_instructions
+    from .rules.skca_2015 import skca_2015_instructions
+
+    decision_year = int(context["decision_year"])
+
+    # Saskatchewan Court of Appeal 2015 rules
+    if decision_year >= 2016:
+        skca_2015_instructions(context, metadata_lines)
+        context["rules"] = "skca_2015"
+
+    if decision_year == 2015:
+        context["rules"] = "skca_2003, skca_2015"
+        skca_2015_instructions(context, metadata_lines)
+        # Check if 'before' section is empty. If so, use the 2003 rules
+        if not context["before"]:
+            skca_2003_instructions(context, metadata_lines)
+            context["rules"] = "skca_2003"
+        else:
+            context["rules"] = "skca_2015"
+
+    if 2003 <= decision_year <= 2014:
+        skca_2003_instructions(context, metadata_lines)
+        context["rules"] = "skca_2003"
+
+
+@observe_extraction
+def extract_decision(submitted_text: str) -> Dict[str, Any]:
+    """
+    Runs every extraction step for one decision.
+
+    Args:
+        submitted_text (str): The HTML source of a CanLII decision.
+
+    Returns:
+        Dict[str, Any]: The template context for the decision.
+    """
+
+    context: Dict[str, Any] = {}
+
+    with stage("extract_decision"):
+        # Extract general metadata from HTML using the general rule set
+        extract_general_metadata(submitted_text, context)
+
+        # Create a markdown file for jurisdiction-specific analysis
+        with stage("html_to_markdown"):
+            markdown_content = html_to_markdown(submitted_text)
+        extract_body_metadata(context, markdown_content)
+
+    return context
+
+
+@observe_extraction
+def extract_decision_file(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Runs every extraction step for one decision stored in a file, reading it in chunks so that
+    the HTML is never held in memory as a whole. The <meta> tags, the link lists and the
+    markdown conversion are all fed from the same pass over the file, and the result is the
+    same as extract_decision() on the file's contents.
+
+    Args:
+        path (str): Path to the HTML source of a CanLII decision, encoded in UTF-8.
+        chunk_size (int): The number of characters read at a time.
+
+    Returns:
+        Dict[str, Any]: The template context for the decision.
+    """
+
+    context: Dict[str, Any] = {}
+    scanner = MetaScanner()
+    collector = LinkCollector()
+    converter = MarkdownConverter()
+
+    with stage("extract_decision_file"):
+        # The meta tags, the links and the markdown conversion share one pass over the file,
+        # which is timed as a whole
+        with stage("read_stream"):
+            with open(path, "r", encoding="utf-8", errors="replace") as file:
+                for chunk in iter(lambda: file.read(chunk_size), ""):
+                    scanner.feed(chunk)
+                    # The link lists come before the body of the decision, so the collector
+                    # usually stops early
+                    if not collector.done:
+                        collector.feed(chunk)
+                    converter.feed(chunk)
+            collector.close()
+            markdown_content = converter.finish()
+
+        apply_general_metadata(scanner.matches, collector, context)
+        extract_body_metadata(context, markdown_content)
+
+    return context
+
+
+def extract_main_content(submitted_text: str) -> str:
+    """
+    Returns the main content of a decision, the markdown body that follows the headnote. It is
+    not part of the context, which is cached and serialized with every result; ingestion
+    converts it separately for the full-text index.
+
+    Args:
+        submitted_text (str): The HTML source of a CanLII decision.
+    """
+
+    _, main_content = process_markdown(refine_markdown(html_to_markdown(submitted_text)))
+    return main_content
+
+
+def extract_body_metadata(context: Dict[str, Any], markdown_content: str) -> None:
+    """
+    The extraction steps that work on the markdown conversion of a decision: the headnote, the
+    citations in the body and the jurisdiction-specific rule sets.
+    """
+
+    with stage("refine_markdown"):
+        refined_markdown_content = refine_markdown(markdown_content)
+
+    # Extract the headnote, file content and assign to context
+    with stage("process_markdown"):
+        metadata_lines, main_content = process_markdown(refined_markdown_content)
+        process_main_content(main_content)
+    context["headnote"] = metadata_lines
+
+    # Find the citations in the body of the decision, with their paragraph numbers
+    with stage("scan_citations"):
+        context["body_citations"] = scan_citations(main_content)
+
+    with stage("apply_jurisdiction_rules"):
+        apply_jurisdiction_rules(context, metadata_lines)
+
+
+class PoolSaturated(Exception):
+    """
+    Raised when the extraction pool already holds as many documents as it will accept.
+    """
+
+
+class ExtractionPool:
+    """
+    A process pool for extract_decision() with a bound on the number of documents in flight.
+
+    A document is in flight from submission until its result is ready. Once every worker is busy
+    and queue_limit more documents are waiting, further submissions raise PoolSaturated instead
+    of joining an ever-growing queue, so the caller can shed load (e.g. with a 503).
+
+    If a worker dies, e.g. when it runs out of memory, the documents in flight fail with
+    BrokenProcessPool and the next submission starts a new set of workers.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_limit: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_limit = queue_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Workers are spawned rather than forked, because forking a threaded server process
+        # can copy locks held by other threads. The pipeline modules do not use Django, so the
+        # workers do not need settings.
+        if self._executor is None:
+            set_gauge("canlii_pool_capacity", self.capacity)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def submit(self, submitted_text: str, function: Callable = extract_decision) -> Future:
+        """
+        Submits a document for extraction.
+
+        Args:
+            submitted_text (str): The HTML source of a CanLII decision, or the path to it when
+                function is extract_decision_file.
+            function (Callable): The extraction function run in the worker.
+
+        Raises:
+            PoolSaturated: If the pool is at capacity.
+        """
+
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise PoolSaturated(f"{self._in_flight} documents already in flight")
+            self._in_flight += 1
+            set_gauge("canlii_pool_in_flight", self._in_flight)
+            executor = self._get_executor()
+
+        try:
+            try:
+                future = executor.submit(function, submitted_text)
+            except BrokenProcessPool:
+                # A worker died since the last submission; start new workers and try once more
+                self._discard_executor(executor)
+                with self._lock:
+                    executor = self._get_executor()
+                future = executor.submit(function, submitted_text)
+        except Exception:
+            self._release()
+            raise
+
+        def done(future: Future) -> None:
+            self._release()
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                self._discard_executor(executor)
+
+        future.add_done_callback(done)
+        return future
+
+    async def extract(
+        self, submitted_text: str, function: Callable = extract_decision
+    ) -> Dict[str, Any]:
+        """
+        Runs extract_decision(), or a wrapper of it such as a profiled one, in a worker process
+        without blocking the event loop.
+
+        Raises:
+            PoolSaturated: If the pool is at capacity.
+            BrokenProcessPool: If the worker died while extracting the document.
+        """
+
+        return await asyncio.wrap_future(self.submit(submitted_text, function))
+
+    async def extract_file(
+        self, path: str, function: Callable = extract_decision_file
+    ) -> Dict[str, Any]:
+        """
+        Runs extract_decision_file() in a worker process without blocking the event loop. Only
+        the path crosses the process boundary; the worker reads the file itself.
+
+        Raises:
+            PoolSaturated: If the pool is at capacity.
+            BrokenProcessPool: If the worker died while extracting the document.
+        """
+
+        return await asyncio.wrap_future(self.submit(path, function))
+
+    def imap_unordered(
+        self, documents: Iterable[str], function: Callable = extract_decision
+    ) -> Iterator[Tuple[int, Union[Dict[str, Any], Exception]]]:
+        """
+        Extracts a sequence of documents concurrently, yielding each result as soon as it is
+        ready. A batch keeps at most one document per worker in flight, which leaves the queue
+        slots free for interactive requests, and waits instead of failing when the pool is
+        saturated.
+
+        Args:
+            documents (Iterable[str]): The HTML source of each decision.
+            function (Callable): The extraction function run in the workers.
+
+        Yields:
+            Tuple[int, Union[Dict[str, Any], Exception]]: The position of the document in the
+            sequence, and its context or the exception raised while extracting it. The
+            documents in flight when a worker dies fail with BrokenProcessPool; the rest are
+            extracted by new workers.
+        """
+
+        pending: Dict[Future, int] = {}
+
+        def collect():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    yield index, future.result()
+                except Exception as e:
+                    yield index, e
+
+        for index, document in enumerate(documents):
+            if len(pending) >= self.workers:
+                yield from collect()
+            while True:
+                try:
+                    pending[self.submit(document, function)] = index
+                    break
+                except BrokenProcessPool as e:
+                    # New workers could not be started either
+                    yield index, e
+                    break
+                except PoolSaturated:
+                    # Wait for one of ours to finish, or briefly for other requests' documents
+                    if pending:
+                        yield from collect()
+                    else:
+                        time.sleep(0.05)
+
+        while pending:
+            yield from collect()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            set_gauge("canlii_pool_in_flight", self._in_flight)
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Drops an executor whose workers have died, so that the next submission starts a new one.
+        """
+
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_EXTRACTION_POOL = None
+
+
+def get_extraction_pool() -> ExtractionPool:
+    """
+    Returns the extraction pool shared by the current process, sized by the METADATA_WORKERS
+    and METADATA_QUEUE_LIMIT settings.
+    """
+
+    global _EXTRACTION_POOL
+    if _EXTRACTION_POOL is None:
+        from django.conf import settings
+
+        _EXTRACTION_POOL = ExtractionPool(
+            workers=getattr(settings, "METADATA_WORKERS", None),
+            queue_limit=getattr(settings, "METADATA_QUEUE_LIMIT", 0),
+        )
+        atexit.register(_EXTRACTION_POOL.shutdown)
+    return _EXTRACTION_POOL
@@ -0,0 +1,329 @@
+"""
+On-demand profiling of a single decision's extraction, for finding out why one document is
+slow without reproducing it by hand.
+
+Two profilers are available:
+
+- "cprofile" runs the extraction under cProfile and writes a .pstats file, with exact call
+  counts but a noticeable overhead. Read it with "python -m pstats" or snakeviz.
+- "sampling" records the extracting thread's stack every few milliseconds from a background
+  thread and writes a .collapsed file, one "frame;frame;frame count" line per distinct stack,
+  which flamegraph.pl and speedscope read. Its overhead is small enough to leave on for whole
+  batches.
+
+Each profile is named after the decision's primary key, the time and the extraction time, e.g.
+"2019skca12-20240105T101500-3412ms-4821.1.collapsed" (the last part is the process ID and a
+sequence number), in METADATA_PROFILE_DIR, which keeps only the METADATA_PROFILE_MAX_FILES
+newest profiles. profiled() wraps an
+extraction function so that it can run in the extraction pool's workers, which write the file
+themselves; the path is returned in the context under PROFILE_PATH_KEY, which callers remove
+before the context is cached or serialized.
+
+    python -m metadata.profiling page.html --profiler sampling
+"""
+
+import cProfile
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from .pipeline import extract_decision
+
+PROFILERS = ("cprofile", "sampling")
+
+# Where profiles are written unless the caller names a directory. The default sits next to
+# db.sqlite3.
+PROFILE_DIR = os.environ.get(
+    "METADATA_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".profiles"),
+)
+
+# How many profiles PROFILE_DIR keeps; the oldest are deleted as new ones are written
+PROFILE_MAX_FILES = int(os.environ.get("METADATA_PROFILE_MAX_FILES", "200"))
+
+PROFILE_EXTENSIONS = (".pstats", ".collapsed")
+
+# Seconds between samples of the sampling profiler
+SAMPLE_INTERVAL = 0.005
+
+# The context key that carries the path of the profile written for a decision
+PROFILE_PATH_KEY = "profile_path"
+
+UNSAFE_FILE_NAME_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# Numbers the profiles written by this process, which may profile the same decision twice in a
+# second
+_profile_numbers = itertools.count(1)
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval, counting each distinct stack.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Starts sampling the calling thread.
+        """
+
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+def collapse_stack(frame) -> str:
+    """
+    Formats a stack, outermost frame first, as the frames joined by semicolons. Each frame is
+    named by its function, file and first line, e.g. "define_coram (skca_2015.py:120)".
+    """
+
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(frames)).replace("\n", " ")
+
+
+def profile_file_name(context: Optional[Dict[str, Any]], elapsed: float, extension: str) -> str:
+    primary_key = (context or {}).get("primary_key") or ("failed" if context is None else "")
+    tag = UNSAFE_FILE_NAME_CHARACTERS.sub("_", primary_key or "decision")
+    timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    number = f"{os.getpid()}.{next(_profile_numbers)}"
+    return f"{tag}-{timestamp}-{round(elapsed * 1000)}ms-{number}.{extension}"
+
+
+def prune_profiles(directory: str, max_files: int = PROFILE_MAX_FILES) -> None:
+    """
+    Deletes the oldest profiles in a directory until at most max_files remain. Other files are
+    left alone, and a profile another process has deleted first is skipped.
+    """
+
+    profiles = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(PROFILE_EXTENSIONS):
+                try:
+                    profiles.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+    profiles.sort()
+    for _, path in profiles[: max(len(profiles) - max_files, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def run_profiled(
+    argument: str,
+    function: Callable = extract_decision,
+    profiler: str = "cprofile",
+    threshold: float = 0.0,
+    directory: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Runs an extraction function under a profiler and writes the profile if the extraction
+    took at least threshold seconds. A profile is also written for an extraction that raises
+    once it is over the threshold, before the exception is re-raised. The directory is then
+    pruned to its PROFILE_MAX_FILES newest profiles.
+
+    Args:
+        argument (str): The HTML source, or the path, passed to the extraction function.
+        function (Callable): extract_decision, extract_decision_file or another function
+            that returns a decision's context.
+        profiler (str): "cprofile" or "sampling".
+        threshold (float): Seconds below which the profile is discarded.
+        directory (Optional[str]): Where to write the profile. Defaults to PROFILE_DIR.
+
+    Returns:
+        Dict[str, Any]: The decision's context, with the profile's path under PROFILE_PATH_KEY
+        if one was written.
+    """
+
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler!r}; expected one of {PROFILERS}.")
+
+    if profiler == "cprofile":
+        recorder = cProfile.Profile()
+        recorder.enable()
+    else:
+        recorder = SamplingProfiler()
+        recorder.start()
+
+    context = None
+    start = time.perf_counter()
+    try:
+        context = function(argument)
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler == "cprofile":
+            recorder.disable()
+        else:
+            recorder.stop()
+
+        if elapsed >= threshold:
+            directory = directory or PROFILE_DIR
+            extension = "pstats" if profiler == "cprofile" else "collapsed"
+            path = os.path.join(directory, profile_file_name(context, elapsed, extension))
+            try:
+                os.makedirs(directory, exist_ok=True)
+                if profiler == "cprofile":
+                    recorder.dump_stats(path)
+                else:
+                    recorder.write(path)
+            except OSError:
+                # A profile that cannot be written must not fail the extraction
+                path = None
+            else:
+                try:
+                    prune_profiles(directory, PROFILE_MAX_FILES)
+                except OSError:
+                    pass
+            if context is not None and path is not None:
+                context[PROFILE_PATH_KEY] = path
+
+    return context
+
+
+def profiled(
+    function: Callable = extract_decision,
+    profiler: Optional[str] = "cprofile",
+    threshold: float = 0.0,
+    directory: Optional[str] = None,
+) -> Callable:
+    """
+    Wraps an extraction function so that it runs under run_profiled(), or returns it unchanged
+    if profiler is None. The wrapper can be pickled, so it can be passed to
+    ExtractionPool.submit() and imap_unordered().
+    """
+
+    if profiler is None:
+        return function
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler!r}; expected one of {PROFILERS}.")
+    return partial(
+        run_profiled,
+        function=function,
+        profiler=profiler,
+        threshold=threshold,
+        directory=directory or PROFILE_DIR,
+    )
+
+
+def slow_document_profiler(
+    function: Callable = extract_decision, threshold: Optional[float] = None
+) -> Callable:
+    """
+    Returns the function batch extractions should run: the extraction function sampled and
+    profiled when it takes at least threshold seconds, or the function itself when there is
+    no threshold.
+
+    Args:
+        function (Callable): The extraction function.
+        threshold (Optional[float]): Seconds. Defaults to the METADATA_PROFILE_SLOW_SECONDS
+            setting.
+    """
+
+    if threshold is None:
+        from django.conf import settings
+
+        threshold = getattr(settings, "METADATA_PROFILE_SLOW_SECONDS", None)
+    if threshold is None:
+        return function
+    return profiled(function, "sampling", threshold)
+
+
+def main() -> None:
+    """
+    Extracts a decision under a profiler, writes the profile and prints its hottest functions.
+    """
+
+    import argparse
+
+    from .pipeline import extract_decision_file
+
+    parser = argparse.ArgumentParser(description=main.__doc__.strip())
+    parser.add_argument("page", help="Path to the HTML source of a CanLII decision")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile")
+    parser.add_argument("--output", help=f"Directory for the profile (default: {PROFILE_DIR})")
+    parser.add_argument(
+        "--stream", action="store_true", help="Extract with extract_decision_file()"
+    )
+    parser.add_argument("--top", type=int, default=15, help="Functions listed")
+    args = parser.parse_args()
+
+    if args.stream:
+        context = run_profiled(
+            args.page, extract_decision_file, args.profiler, directory=args.output
+        )
+    else:
+        with open(args.page, "r", encoding="utf-8") as file:
+            page = file.read()
+        context = run_profiled(page, extract_decision, args.profiler, directory=args.output)
+
+    path = context.get(PROFILE_PATH_KEY)
+    if path is None:
+        sys.exit("The profile could not be written.")
+    print(f"Wrote {path}\n")
+
+    if args.profiler == "cprofile":
+        import pstats
+
+        pstats.Stats(path).sort_stats("cumulative").print_stats(args.top)
+        return
+
+    # The functions that were running when sampled, and those with the most samples beneath
+    own: Counter = Counter()
+    total: Counter = Counter()
+    samples = 0
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            stack, count = line.rsplit(" ", 1)
+            frames = stack.split(";")
+            own[frames[-1]] += int(count)
+            for frame in set(frames):
+                total[frame] += int(count)
+            samples += int(count)
+    print(f"{samples} samples")
+    print(f"{'own':>7}{'total':>7}  function")
+    for frame, count in own.most_common(args.top):
+        print(f"{count / samples:>7.1%}{total[frame] / samples:>7.1%}  {frame}")
+
+
+if __name__ == "__main__":
+    main()
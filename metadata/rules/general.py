@@ -5,10 +5,14 @@ Rules for extracting metadata from any CanLII case.
 """
 
 import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Set
 
-from bs4 import BeautifulSoup
-
+from ..instrumentation import stage
+from ..utils.citations import NeutralCitation, get_citation_codec, parse_citation
 from ..utils.jurisdiction import (
+    court_code_from_name,
+    decode_canlii_path,
     define_jurisprudential_network,
     define_legislative_network,
 )
@@ -20,55 +24,136 @@ def create_primary_key(citation):
     """
 
     # Extract the primary key. This is the file name, minus the extension
-    primary_key = citation.split("/")[-1].split(".")[0]
+    decoded = decode_canlii_path(citation)
+    if decoded is not None:
+        return decoded.document_id
+
+    return citation.split("/")[-1].split(".")[0]
+
+
+# The CanLII <meta> tags read by extract_general_metadata(), by context field
+META_PATTERNS = {
+    field: re.compile(rf'<meta name="lbh-{name}" content="([^"]+)"')
+    for field, name in (
+        ("style_of_cause", "title"),
+        ("citation", "citation"),
+        ("decision_date", "decision-date"),
+        ("language", "lang"),
+        ("court_level", "collection"),
+        ("jurisdiction", "jurisdiction"),
+        ("keywords", "keywords"),
+        ("subjects", "subjects"),
+        ("url", "document-url"),
+    )
+}
+
+# The hidden divs that list the documents a decision cites, and the list each one fills
+LINK_DIVS = {"judgmentLinks": "case_paths", "legislationLinks": "legislation_paths"}
+
+
+class MetaScanner:
+    """
+    Finds the first match of each of the META_PATTERNS in a document fed in chunks, holding on
+    to no more than the tag that may continue into the next chunk.
+    """
+
+    def __init__(self):
+        self.matches: Dict[str, str] = {}
+        self._buffer = ""
+
+    @property
+    def done(self) -> bool:
+        return len(self.matches) == len(META_PATTERNS)
+
+    def feed(self, chunk: str) -> None:
+        if self.done:
+            return
+        self._buffer += chunk
+        for field, pattern in META_PATTERNS.items():
+            if field not in self.matches:
+                match = pattern.search(self._buffer)
+                if match:
+                    self.matches[field] = match.group(1)
+        # Only a tag that is still open can complete in a later chunk, and it starts at the
+        # last "<"
+        self._buffer = self._buffer[self._buffer.rfind("<"):] if "<" in self._buffer else ""
 
-    return primary_key
+
+class LinkCollector(HTMLParser):
+    """
+    Collects the data-path of each <li> in the first judgmentLinks and legislationLinks divs of
+    a document fed in chunks. Paths containing "reflex" are skipped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.case_paths: List[str] = []
+        self.legislation_paths: List[str] = []
+        self._seen: Set[str] = set()
+        self._current: Optional[List[str]] = None
+        self._depth = 0
+
+    @property
+    def done(self) -> bool:
+        return self._current is None and len(self._seen) == len(LINK_DIVS)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            if self._current is not None:
+                self._depth += 1
+                return
+            div_id = dict(attrs).get("id")
+            if div_id in LINK_DIVS and div_id not in self._seen:
+                self._seen.add(div_id)
+                self._current = getattr(self, LINK_DIVS[div_id])
+                self._depth = 1
+        elif tag == "li" and self._current is not None:
+            path = dict(attrs).get("data-path")
+            if path is not None and "reflex" not in path:
+                self._current.append(path)
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self._current is not None:
+            self._depth -= 1
+            if self._depth == 0:
+                self._current = None
 
 
-def extract_citations(html_content):
+def extract_citations(html_content, source=""):
     """
-    Searches the HTML document for judgmelsntLinks and legislationLinks and returns a list of
-    citations.
+    Searches the HTML document for judgmentLinks and legislationLinks and returns the citation
+    edges found in each.
     judgmentLinks are stored in the div tag <DIV ID="judgmentLinks" STYLE="display: none;">
     legislationLinks are stored in the div tag <DIV ID="legislationLinks" STYLE="display: none;">
+
+    Args:
+        html_content (str): The page source.
+        source (str): The primary key of the citing decision, recorded on every edge.
+
+    Returns:
+        Tuple[List[CaseEdge], List[LegislationEdge]]: The case and legislation edges.
     """
 
-    # Extracting judgmentLinks
-    soup = BeautifulSoup(html_content, "html.parser")
-
-    # Find the 'judgmentLinks' div
-    judgment_links_div = soup.find("div", id="judgmentLinks")
-    # Find all 'li' elements within the 'judgmentLinks' div and extract 'data-path', excluding
-    # 'reflex'
-    # Handle in case there is no 'judgmentLinks' div
-    if judgment_links_div:
-        case_paths = [
-            li["data-path"]
-            for li in judgment_links_div.find_all("li")
-            if "data-path" in li.attrs and "reflex" not in li["data-path"]
-        ]
-    else:
-        case_paths = ["None"]
-
-    # Run the judgment_links through the define_jurisprudential_network function
-    case_paths = define_jurisprudential_network(case_paths)
-
-    # Extracting legislationLinks
-    legislation_links_div = soup.find("div", id="legislationLinks")
-    # Find all 'li' elements within the 'legislationLinks' div and extract 'data-path', excluding
-    # 'reflex'. Handle in case there is no 'legislationLinks' div
-    if legislation_links_div:
-        legislation_paths = [
-            li["data-path"]
-            for li in legislation_links_div.find_all("li")
-            if "data-path" in li.attrs and "reflex" not in li["data-path"]
-        ]
-    else:
-        legislation_paths = ["None"]
-    # Remove duplicates
-    legislation_paths = define_legislative_network(list(set(legislation_paths)))
+    collector = LinkCollector()
+    collector.feed(html_content)
+    collector.close()
+    return citation_edges(collector, source)
 
-    return case_paths, legislation_paths
+
+def citation_edges(collector, source=""):
+    """
+    Turns the paths gathered by a LinkCollector into case and legislation edges.
+    """
+
+    # Run the judgment links through the define_jurisprudential_network function
+    case_edges = define_jurisprudential_network(collector.case_paths, source)
+
+    # Remove duplicate legislation links, keeping the order in which the paths appear
+    legislation_edges = define_legislative_network(
+        list(dict.fromkeys(collector.legislation_paths)), source
+    )
+
+    return case_edges, legislation_edges
 
 
 def extract_general_metadata(submitted_text, context):
@@ -77,75 +162,82 @@ def extract_general_metadata(submitted_text, context):
     Move to the rules module.
     """
 
-    context["case_links"] = extract_citations(submitted_text)[0]
-    context["legislation_links"] = extract_citations(submitted_text)[1]
+    with stage("meta_tags"):
+        scanner = MetaScanner()
+        scanner.feed(submitted_text)
+    with stage("extract_citations"):
+        collector = LinkCollector()
+        collector.feed(submitted_text)
+        collector.close()
+    apply_general_metadata(scanner.matches, collector, context)
 
-    # Verify that the required metadata is available
-    style_of_cause_match = re.search(
-        r'<meta name="lbh-title" content="([^"]+)"', submitted_text
-    )
-    citation_match = re.search(
-        r'<meta name="lbh-citation" content="([^"]+)"', submitted_text
-    )
-    decision_date_match = re.search(
-        r'<meta name="lbh-decision-date" content="([^"]+)"', submitted_text
-    )
-    language_match = re.search(
-        r'<meta name="lbh-lang" content="([^"]+)"', submitted_text
-    )
-    court_level_match = re.search(
-        r'<meta name="lbh-collection" content="([^"]+)"', submitted_text
-    )
-    jurisdiction_match = re.search(
-        r'<meta name="lbh-jurisdiction" content="([^"]+)"', submitted_text
-    )
-    keywords_match = re.search(
-        r'<meta name="lbh-keywords" content="([^"]+)"', submitted_text
-    )
-    subjects_match = re.search(
-        r'<meta name="lbh-subjects" content="([^"]+)"', submitted_text
-    )
-    url_match = re.search(
-        r'<meta name="lbh-document-url" content="([^"]+)"', submitted_text
-    )
 
-    # Returns the uncomplicated case information
-    if (
-        style_of_cause_match
-        and citation_match
-        and decision_date_match
-        and url_match
-        and court_level_match
-        and jurisdiction_match
+def apply_general_metadata(meta, collector, context):
+    """
+    Fills the context from the <meta> tag values found by a MetaScanner and the links gathered
+    by a LinkCollector. Documents read in chunks are scanned as they stream, and then handled
+    here exactly like submitted text.
+    """
+
+    # Verify that the required metadata is available
+    if all(
+        field in meta
+        for field in (
+            "style_of_cause", "citation", "decision_date", "url", "court_level", "jurisdiction"
+        )
     ):
-        style_of_cause = style_of_cause_match.group(1)
-        citation = citation_match.group(1).replace("(CanLII)", "").strip()
+        style_of_cause = meta["style_of_cause"]
+        citation = meta["citation"].replace("(CanLII)", "").strip()
 
         context["style_of_cause"] = style_of_cause
         context["citation"] = citation
-        context["decision_year"] = citation[:4]
-        context["decision_date"] = decision_date_match.group(1)
-        context["url"] = url_match.group(1)
-        context["primary_key"] = create_primary_key(url_match.group(1))
-        context["court_level"] = court_level_match.group(1)
-        context["jurisdiction"] = jurisdiction_match.group(1)
+
+        # Parse the neutral citation into a structured, orderable key
+        parsed_citation = parse_citation(citation)
+        if isinstance(parsed_citation, NeutralCitation):
+            context["decision_year"] = str(parsed_citation.year)
+            context["citation_key"] = get_citation_codec().encode(parsed_citation)
+        else:
+            context["decision_year"] = citation[:4]
+            context["citation_key"] = get_citation_codec().key(citation)
+        context["decision_date"] = meta["decision_date"]
+        context["url"] = meta["url"]
+        context["primary_key"] = create_primary_key(meta["url"])
+        context["court_level"] = meta["court_level"]
+        context["jurisdiction"] = meta["jurisdiction"]
+
+        # Prefer the court code in the document URL, falling back to the court name
+        decoded_url = decode_canlii_path(context["url"])
+        if decoded_url is not None:
+            context["court_code"] = decoded_url.collection
+        else:
+            context["court_code"] = court_code_from_name(
+                context["court_level"], context["jurisdiction"]
+            ) or ""
+
         context["case_info_available"] = True
 
     else:
         context["case_info_available"] = False
 
+    # Build the citation edges, keyed by the citing decision's primary key
+    with stage("citation_edges"):
+        context["case_links"], context["legislation_links"] = citation_edges(
+            collector, context.get("primary_key", "")
+        )
+
     # Checks language to determine whether the case is in English or French
-    if language_match:
-        if language_match.group(1) == "en":
+    if "language" in meta:
+        if meta["language"] == "en":
             context["language"] = "English"
-        elif language_match.group(1) == "fr":
+        elif meta["language"] == "fr":
             context["language"] = "French"
     else:
         context["language"] = "None"
 
     # Checks for CanLII keywords and places them into a list
-    if keywords_match:
-        keywords_string = keywords_match.group(1)
+    if "keywords" in meta:
+        keywords_string = meta["keywords"]
         # Splitting at either "—" or "|"
         keywords_list = re.split(r"—|\|", keywords_string)
         context["keywords_list"] = [keyword.strip() for keyword in keywords_list]
@@ -155,8 +247,8 @@ def extract_general_metadata(submitted_text, context):
         context["keywords"] = "None"
 
     # Checks for case subjects and places them into a list
-    if subjects_match:
-        subjects_string = subjects_match.group(1)
+    if "subjects" in meta:
+        subjects_string = meta["subjects"]
         # Checking for separators and splitting if they exist
         if "—" in subjects_string or "|" in subjects_string:
             subjects_list = re.split(r"—|\|", subjects_string)
@@ -8,11 +8,14 @@ Currently designed to work with SKCA decisions from 2015 to present (2023).
 import json
 import os
 import re
-import pandas as pd
-from typing import Tuple, List, Dict, Any
-from dateutil.parser import parse
+from typing import TYPE_CHECKING, Tuple, List, Dict, Any
 import typer
 
+# pandas and dateutil are imported where they are used, so that commands that need neither
+# start without paying for them
+if TYPE_CHECKING:
+    import pandas as pd
+
 app = typer.Typer()
 
 ###
@@ -238,6 +241,8 @@ def extract_dates(text: str) -> List[str]:
     # Find all individual days
     days = re.findall(r"\b\d{1,2}\b", text)
 
+    from dateutil.parser import parse
+
     # List to hold the final dates
     dates = []
 
@@ -462,8 +467,10 @@ def view_directories(directories: List[str]) -> List[str]:
     return files
 
 
-def generate_dataframe(directories: List[str]) -> pd.DataFrame:
+def generate_dataframe(directories: List[str]) -> "pd.DataFrame":
     """Generate a pandas DataFrame from multiple markdown files in multiple directories."""
+    import pandas as pd
+
     files = view_directories(directories)
     metadata_list = []
     for file_path in files:
@@ -9,7 +9,10 @@ Rule set for Saskatchewan Court of Appeal decisions from 2015 onward.
 import re
 
 from typing import List
-from dateutil.parser import parse
+
+from ..instrumentation import instrumented
+from ..utils.citations import get_citation_codec
+from ..utils.vocabulary import STANDARDIZED_ROLES
 
 PARTY_ROLES = [
     "Proposed Intervenors",
@@ -46,6 +49,7 @@ PARTY_ROLES = [
 ]
 
 
+@instrumented
 def define_judicial_aggregate(metadata_dict: dict) -> None:
     """
     Defines a judicial aggregate in the metadata dictionary. Designed to work with skca_2015().
@@ -69,21 +73,6 @@ def define_judicial_aggregate(metadata_dict: dict) -> None:
         "by",
     ]
 
-    standardized_roles = {
-        "written reasons by": "reasons",
-        "majority reasons by": "reasons",
-        "majority reasons": "reasons",
-        "dissenting reasons by": "dissenting reasons",
-        "dissenting reasons": "dissenting reasons",
-        "minority reasons by": "dissenting reasons",
-        "minority reasons": "dissenting reasons",
-        "concurring reasons by": "concurring reasons",
-        "concurring reasons": "concurring reasons",
-        "in concurrence": "concurring",
-        "in dissent": "dissenting",
-        "by": "reasons"
-    }
-
     split_pattern = "The Honourable "
     justice_titles = ["Mr. Justice", "Madam Justice", "Chief Justice"]
 
@@ -99,7 +88,7 @@ def define_judicial_aggregate(metadata_dict: dict) -> None:
                 for title in justice_titles:
                     item = item.replace(title, "").strip()
                 item = item.replace("and", "").strip()
-                standardized_role = standardized_roles.get(key, key)
+                standardized_role = STANDARDIZED_ROLES.get(key, key)
                 processed_values.append((item, standardized_role))
 
             metadata_dict[key] = processed_values
@@ -107,6 +96,7 @@ def define_judicial_aggregate(metadata_dict: dict) -> None:
             metadata_dict[key] = []
 
 
+@instrumented
 def define_parties(metadata_dict: dict) -> None:
     """
     Defines the parties in the metadata dictionary. Designed to work with skca_2015().
@@ -139,6 +129,7 @@ def define_parties(metadata_dict: dict) -> None:
         metadata_dict["between"] = processed_parties
 
 
+@instrumented
 def define_coram(metadata_dict: dict) -> None:
     """
     Identifies the judges who heard the case and saves them as a list in the metadata dictionary.
@@ -203,6 +194,7 @@ def split_party_name_and_roles(text, party_roles):
 
 
 
+@instrumented
 def identify_case_type(metadata_dict: dict) -> None:
     """
     Examines the "docket" key in the metadata dictionary and identifies the case type. To do so,
@@ -272,6 +264,9 @@ def extract_dates(text: str) -> List[str]:
     # Find all individual days
     days = re.findall(r"\b\d{1,2}\b", text)
 
+    # dateutil is slow to import, so it is loaded on the first decision that needs it
+    from dateutil.parser import parse
+
     # List to hold the final dates
     dates = []
 
@@ -284,6 +279,7 @@ def extract_dates(text: str) -> List[str]:
     return dates
 
 
+@instrumented
 def extract_other_citations(metadata_dict: dict) -> None:
     """
     Extracts other citations from the metadata dictionary and saves them as a list.
@@ -307,6 +303,7 @@ def extract_other_citations(metadata_dict: dict) -> None:
         metadata_dict["other citations"] = other_citations_value
 
 
+@instrumented
 def convert_appeal_heard_date(metadata_dict: dict) -> None:
     """
     Converts the "appeal heard" key in the metadata dictionary to a list of dates in YYYY-MM-DD
@@ -338,6 +335,7 @@ def convert_appeal_heard_date(metadata_dict: dict) -> None:
             break  # Assumes only one key is present, remove if multiple keys can be present
 
 
+@instrumented
 def create_metadata_dict(metadata_lines: list) -> dict:
     """
     Creates a metadata dictionary from a list of strings.
@@ -418,6 +416,7 @@ def create_metadata_dict(metadata_lines: list) -> dict:
     return metadata_dict
 
 
+@instrumented
 def extract_counsel(metadata_dict: dict) -> None:
     """
     Extracts counsel from the metadata dictionary and saves it as a list of tuples.
@@ -554,6 +553,7 @@ def create_lawyer_party_tuples(lawyers_parties_list):
     return tuples_list
 
 
+@instrumented
 def skca_2015(metadata_lines: list):
     """
     Extracts metadata from a Saskatchewan Court of Appeal decision from 2015 onward.
@@ -623,6 +623,7 @@ def skca_2015(metadata_lines: list):
     return metadata_dict
 
 
+@instrumented
 def skca_2015_instructions(context, metadata_lines):
 
     context["rules_exist"] = "SKCA 2015 rules"
@@ -650,5 +651,6 @@ def skca_2015_instructions(context, metadata_lines):
     context["counsel"] = case_dict.get("counsel", [])
     context["case_heard"] = case_dict.get("case heard", "")
     context["other_citations"] = case_dict.get("other citations", [])
+    context["other_citation_keys"] = get_citation_codec().keys(context["other_citations"])
     context["disposition_value"] = case_dict.get("disposition", "")
     context["appeal_from"] = case_dict.get("on appeal from", "")
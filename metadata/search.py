@@ -0,0 +1,109 @@
+"""
+Full-text search over stored decisions, backed by the metadata_decision_fts FTS5 index created
+in migration 0004. The index covers the style of cause, headnote, keywords, subjects and main
+content, and is kept in sync with the Decision table by triggers, so newly ingested decisions
+are searchable as soon as their transaction commits.
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+from django.db import DatabaseError, connection
+
+# bm25() column weights, in index column order: a match in the style of cause or the
+# keywords counts for more than one in the body of the decision
+BM25_WEIGHTS = (10.0, 2.0, 4.0, 4.0, 1.0)
+
+# A word, optionally followed by "*" for a prefix search
+TERM_PATTERN = re.compile(r"(\w+)(\*?)")
+
+
+class SearchHit(NamedTuple):
+    primary_key: str
+    citation: str
+    style_of_cause: str
+    court_code: str
+    decision_year: Optional[int]
+    score: float
+    snippet: str
+
+
+def to_fts_query(text: str) -> str:
+    """
+    Turns free text into an FTS5 query that matches decisions containing every word. Each word
+    is quoted, so characters that are FTS5 syntax cannot cause a query error. A trailing "*"
+    on a word is kept as a prefix search.
+    """
+
+    return " ".join(
+        f'"{match.group(1)}"{match.group(2)}' for match in TERM_PATTERN.finditer(text)
+    )
+
+
+def search_decisions(
+    query: str,
+    court: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0,
+    raw: bool = False,
+) -> List[SearchHit]:
+    """
+    Searches the stored decisions, best matches first.
+
+    Args:
+        query (str): The words to search for. With raw=True, an FTS5 query, e.g.
+            'headnote:"sexual assault" AND s276'.
+        court (Optional[str]): Only return decisions of this court code, e.g. "skca".
+        year_from (Optional[int]): Only return decisions from this year onward.
+        year_to (Optional[int]): Only return decisions up to and including this year.
+        limit (int): The largest number of hits to return.
+        offset (int): The number of hits to skip, for paging.
+        raw (bool): Whether the query is passed to FTS5 unchanged.
+
+    Returns:
+        List[SearchHit]: The hits, ranked by bm25 score, with a highlighted snippet of the best
+        matching column.
+
+    Raises:
+        ValueError: If the query is empty or not a valid FTS5 query.
+    """
+
+    match = query.strip() if raw else to_fts_query(query)
+    if not match:
+        raise ValueError("The search query is empty.")
+
+    where = ["metadata_decision_fts MATCH %s"]
+    params: list = [match]
+    if court:
+        where.append("d.court_code = %s")
+        params.append(court.lower())
+    if year_from is not None:
+        where.append("d.decision_year >= %s")
+        params.append(year_from)
+    if year_to is not None:
+        where.append("d.decision_year <= %s")
+        params.append(year_to)
+
+    weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+    sql = f"""
+        SELECT d.primary_key, d.citation, d.style_of_cause, d.court_code, d.decision_year,
+               bm25(metadata_decision_fts, {weights}) AS score,
+               snippet(metadata_decision_fts, -1, '<mark>', '</mark>', '…', 24)
+        FROM metadata_decision_fts
+        JOIN metadata_decision AS d ON d.id = metadata_decision_fts.rowid
+        WHERE {" AND ".join(where)}
+        ORDER BY score
+        LIMIT %s OFFSET %s
+    """
+    params.extend([limit, offset])
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        raise ValueError(f"Invalid search query: {e}") from e
+
+    return [SearchHit(*row) for row in rows]
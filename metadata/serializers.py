@@ -0,0 +1,39 @@
+"""
+Converts extraction contexts into JSON-serializable records for the API views.
+"""
+
+import datetime
+from typing import Any, Dict
+
+
+def to_json_value(value: Any) -> Any:
+    """
+    Converts a context value to plain JSON types. NamedTuples such as CaseEdge and CitationHit
+    become objects, other tuples and sets become lists and dates become ISO 8601 strings.
+    """
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(key): to_json_value(item) for key, item in value.items()}
+    if isinstance(value, tuple) and hasattr(value, "_asdict"):
+        return {key: to_json_value(item) for key, item in value._asdict().items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def to_json_record(context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts the context of one decision into a JSON-serializable record.
+
+    Args:
+        context (Dict[str, Any]): The context returned by extract_decision().
+
+    Returns:
+        Dict[str, Any]: The record.
+    """
+
+    return {key: to_json_value(value) for key, value in context.items()}
@@ -1,3 +1,767 @@
-from django.test import TestCase
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tarfile
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics, profiling
+from .db import SUSPENDED_SCHEMA_TABLE, bulk_load, recover_bulk_load
+from .jobs import (
+    ArchiveTooLarge,
+    claim_documents,
+    iter_archive,
+    process_documents,
+    release_documents,
+    reset_stale_documents,
+)
+from .models import ExtractionJob, JobDocument
+from .pipeline import (
+    ExtractionPool,
+    extract_decision,
+    extract_decision_file,
+    extract_main_content,
+)
+from .search import search_decisions
+from .serializers import to_json_record
+from .utils.citation_graph import CitationGraph
+from .utils.citations import MISSING_KEY, CitationCodec, citation_key, get_citation_codec
+from .utils.jurisdiction import (
+    LegislationKey,
+    decode_canlii_path,
+    define_jurisprudential_network,
+    define_legislative_network,
+    format_legislation_keys,
+    parse_legislation_key,
+)
+from .utils.legislation_index import LegislationIndex
+from .utils.parallel_citations import ParallelCitationIndex
+from .utils.scanner import scan_citations
+from .utils.vocabulary import JUDICIAL_ROLE_FIELDS, CorpusVocabulary
+from .views import requested_profiler
+
+
+def load_synthetic_pages():
+    """
+    Imports the page generator of the benchmarks, which are not a package.
+    """
+
+    path = os.path.join(settings.BASE_DIR, "benchmarks", "synthetic_pages.py")
+    spec = importlib.util.spec_from_file_location("synthetic_pages", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+synthetic_pages = load_synthetic_pages()
+
+
+def quietly(function, *args, **kwargs):
+    """
+    Calls a function with its output discarded; the rule sets print as they go.
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+class DecodeCanLIIPathTests(SimpleTestCase):
+    def test_decision_path(self):
+        decoded = decode_canlii_path("/en/sk/skca/doc/2019/2019skca12/2019skca12.html")
+
+        self.assertEqual(decoded.language, "en")
+        self.assertEqual(decoded.jurisdiction, "sk")
+        self.assertEqual(decoded.collection, "skca")
+        self.assertEqual(decoded.year, 2019)
+        self.assertEqual(decoded.document_id, "2019skca12")
+        self.assertEqual(decoded.anchor, "")
+        self.assertFalse(decoded.is_legislation)
+
+    def test_full_url(self):
+        decoded = decode_canlii_path(
+            "https://www.canlii.org/en/sk/skca/doc/2019/2019skca12/2019skca12.html"
+        )
+
+        self.assertEqual(decoded.document_id, "2019skca12")
+        self.assertEqual(decoded.collection, "skca")
+
+    def test_legislation_path(self):
+        decoded = decode_canlii_path(
+            "/en/ca/laws/stat/rsc-1985-c-c-46/latest/rsc-1985-c-c-46.html#sec276_smooth"
+        )
+
+        self.assertEqual(decoded.jurisdiction, "ca")
+        self.assertEqual(decoded.collection, "stat")
+        self.assertEqual(decoded.year, 0)
+        self.assertEqual(decoded.document_id, "rsc-1985-c-c-46")
+        self.assertEqual(decoded.anchor, "sec276")
+        self.assertTrue(decoded.is_legislation)
+
+    def test_legislation_id_with_dotted_chapter(self):
+        decoded = decode_canlii_path(
+            "/en/sk/laws/stat/ss-2013-c-s-15.1/latest/ss-2013-c-s-15.1.html#sec2"
+        )
+
+        self.assertEqual(decoded.document_id, "ss-2013-c-s-15.1")
+        self.assertEqual(decoded.anchor, "sec2")
+
+    def test_not_a_document_path(self):
+        self.assertIsNone(decode_canlii_path("/en/sk/skca/"))
+        self.assertIsNone(decode_canlii_path("/en/ca/laws/stat/rsc-1985-c-c-46/latest"))
+
+
+class CitationNetworkTests(SimpleTestCase):
+    def test_case_edges(self):
+        edges = define_jurisprudential_network(
+            [
+                "/en/sk/skca/doc/2019/2019skca12/2019skca12.html",
+                "/en/ca/laws/stat/rsc-1985-c-c-46/latest/rsc-1985-c-c-46.html",
+                "/en/sk/",
+            ],
+            source="2020skca1",
+        )
+
+        self.assertEqual(len(edges), 1)
+        self.assertEqual(edges[0].source, "2020skca1")
+        self.assertEqual(edges[0].target, "2019skca12")
+        self.assertEqual(edges[0].court, "skca")
+        self.assertEqual(edges[0].year, 2019)
+
+    def test_legislation_edges_keep_dotted_statute_ids(self):
+        edges = define_legislative_network(
+            [
+                "/en/sk/laws/stat/ss-2013-c-s-15.1/latest/ss-2013-c-s-15.1.html#sec2",
+                "/en/ca/laws/stat/rsc-1985-c-c-46/latest/rsc-1985-c-c-46.html",
+            ],
+            source="2020skca1",
+        )
+
+        self.assertEqual(
+            [edge.target for edge in edges], ["ss-2013-c-s-15.1#sec2", "rsc-1985-c-c-46"]
+        )
+        self.assertEqual(edges[0].keys[0].statute, "ss-2013-c-s-15.1")
+        self.assertEqual(edges[0].keys[0].section, "2")
+
+
+class LegislationKeyTests(SimpleTestCase):
+    def test_provisions(self):
+        self.assertEqual(
+            parse_legislation_key("rsc-1985-c-c-46.html#sec276subsec1_smooth"),
+            [LegislationKey("rsc-1985-c-c-46", "276", "1")],
+        )
+        self.assertEqual(
+            parse_legislation_key("rsc-1985-c-c-46#sec718.2"),
+            [LegislationKey("rsc-1985-c-c-46", "718.2", "")],
+        )
+        self.assertEqual(
+            parse_legislation_key("cqlr-c-c-12.1"), [LegislationKey("cqlr-c-c-12.1", "", "")]
+        )
+
+    def test_joined_provisions(self):
+        # A bare anchor belongs to the statute before it; repeated provisions are dropped
+        self.assertEqual(
+            parse_legislation_key(
+                "rsc-1985-c-c-46#sec276_smooth---sec277---ss-2018-c-1#sec3---rsc-1985-c-c-46#sec276"
+            ),
+            [
+                LegislationKey("rsc-1985-c-c-46", "276", ""),
+                LegislationKey("rsc-1985-c-c-46", "277", ""),
+                LegislationKey("ss-2018-c-1", "3", ""),
+            ],
+        )
+        self.assertEqual(parse_legislation_key("#sec2"), [])
+
+    def test_format(self):
+        self.assertEqual(
+            format_legislation_keys("rsc-1985-c-c-46#sec276subsec1---sec277"),
+            "rsc-1985-c-c-46, s 276(1) & rsc-1985-c-c-46, s 277",
+        )
+        self.assertEqual(format_legislation_keys("rsc-1985-c-c-46"), "rsc-1985-c-c-46")
+
+
+class ExtractDecisionFileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def assertStreamedLikeWhole(self, page, chunk_sizes):
+        path = os.path.join(self.directory, "page.html")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(page)
+        expected = to_json_record(quietly(extract_decision, page))
+        for chunk_size in chunk_sizes:
+            with self.subTest(chunk_size=chunk_size):
+                streamed = to_json_record(quietly(extract_decision_file, path, chunk_size))
+                self.assertEqual(streamed, expected)
+
+    def test_both_headnote_layouts(self):
+        for year in (2005, 2019):
+            with self.subTest(year=year):
+                page = synthetic_pages.make_page(year, 12, case_links=30, seed=1)
+                self.assertStreamedLikeWhole(page, (7, 97, 1024, 65536))
+
+    def test_entities_and_tags_split_between_chunks(self):
+        page = synthetic_pages.make_page(2019, 12, case_links=5, paragraphs=5, seed=1)
+        page = page.replace(
+            'content="Saskatchewan"', 'content="Saskatchewan &amp; Qu&eacute;bec"'
+        ).replace(
+            "<p>Back to top</p>",
+            "<p>R&eacute;gina &amp; Caf\u00e9 &#8212; l&#x2019;appel</p>\n<p>Back to top</p>",
+        )
+        # Every chunk size up to the longest entity, with the page shifted by up to a chunk so
+        # that each tag and entity is cut at each of its characters
+        for shift in range(8):
+            with self.subTest(shift=shift):
+                shifted = f"<!--{'x' * shift}-->\n{page}"
+                self.assertStreamedLikeWhole(shifted, range(1, 9))
+
+
+class ScanCitationsTests(SimpleTestCase):
+    def hits(self, text):
+        return [(hit.kind, hit.text, hit.paragraph) for hit in scan_citations(text)]
+
+    def test_kinds_and_paragraphs(self):
+        text = (
+            "Introduction.\n\n"
+            "[1] As held in R v Grant, 2009 SCC 32, and [1990] 1 SCR 30, the evidence\n"
+            "stands.\n\n"
+            "[2] Sections 8 and 24(2) apply; see s. 718.2(e) of the Criminal Code."
+        )
+        self.assertEqual(
+            self.hits(text),
+            [
+                ("neutral", "2009 SCC 32", 1),
+                ("reporter", "[1990] 1 SCR 30", 1),
+                ("section", "s. 718.2(e) of the Criminal Code", 2),
+            ],
+        )
+
+    def test_wrapped_citation(self):
+        self.assertEqual(
+            self.hits("[3] See Smith v Jones, 2015\nSKCA 101."), [("neutral", "2015 SKCA 101", 3)]
+        )
+
+    def test_act_name_stops_before_the_next_citation(self):
+        self.assertEqual(
+            self.hits("Under s. 276(1) of the Criminal Code and RSC 1985, c C-46"),
+            [("section", "s. 276(1) of the Criminal Code", 0), ("statute", "RSC 1985, c C-46", 0)],
+        )
+        self.assertEqual(
+            self.hits("see s. 5 of the Act and 2019 SKCA 12"),
+            [("section", "s. 5 of the Act", 0), ("neutral", "2019 SKCA 12", 0)],
+        )
+        self.assertEqual(
+            self.hits("s. 8 of the Canadian Charter of Rights and Freedoms applies"),
+            [("section", "s. 8 of the Canadian Charter of Rights and Freedoms", 0)],
+        )
+
+
+class RoleVocabularyTests(SimpleTestCase):
+    def test_extracted_roles_are_in_the_role_vocabulary(self):
+        context = quietly(extract_decision, synthetic_pages.make_page(2019, 12, seed=1))
+        roles = [role for field in JUDICIAL_ROLE_FIELDS for _, role in context.get(field, [])]
+
+        self.assertTrue(roles)
+        vocabulary = CorpusVocabulary()
+        for role in roles:
+            self.assertIn(role, vocabulary.role)
+
+
+class CitationKeyTests(SimpleTestCase):
+    def test_keys_of_known_courts_do_not_depend_on_earlier_citations(self):
+        first, second = CitationCodec(frozen=True), CitationCodec(frozen=True)
+        first.keys(["2021 YYCA 4", "2021 ZZQB 3", "2019 SKCA 12"])
+        second.keys(["2021 ZZQB 3", "2021 YYCA 4", "2019 SKCA 12"])
+
+        self.assertEqual(first.key("2019 SKCA 12"), second.key("2019 SKCA 12"))
+        self.assertEqual(first.key("2021 ZZQB 3"), MISSING_KEY)
+        self.assertEqual(second.key("2021 YYCA 4"), MISSING_KEY)
+
+    def test_shared_codec_is_frozen(self):
+        courts = len(get_citation_codec().courts)
+        citation_key("2021 YYCA 4")
+
+        self.assertTrue(get_citation_codec().frozen)
+        self.assertEqual(len(get_citation_codec().courts), courts)
+
+    def test_keys_sort_by_year_court_and_number(self):
+        keys = [citation_key(text) for text in ("2018 SKCA 9", "2019 SKCA 2", "2019 SKCA 12")]
+
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(str(get_citation_codec().decode(keys[2])), "2019 SKCA 12")
+
+    def test_growing_codec_encodes_unknown_courts(self):
+        codec = CitationCodec()
+
+        key = codec.key("2021 YYCA 4")
+        self.assertNotEqual(key, MISSING_KEY)
+        self.assertEqual(str(codec.decode(key)), "2021 YYCA 4")
+
+
+class SaveOverMemoryMapTests(SimpleTestCase):
+    """
+    Saving a store loaded with mmap=True back to its own directory rewrites the files its
+    arrays are mapped onto.
+    """
+
+    def test_citation_graph(self):
+        graph = CitationGraph()
+        count = 50000
+        graph.add_edges(
+            (f"{year}skca{year}" for year in range(count)),
+            (f"{year}skca{year + 1}" for year in range(count)),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            graph.save(directory)
+            loaded = CitationGraph.load(directory)
+            loaded.save(directory)
+            reloaded = CitationGraph.load(directory, mmap=False)
+
+            self.assertEqual(reloaded.edge_count, count)
+            self.assertEqual(reloaded.cites("7skca7"), ["7skca8"])
+
+    def test_legislation_index(self):
+        index = LegislationIndex()
+        edges = define_legislative_network(
+            ["/en/ca/laws/stat/rsc-1985-c-c-46/latest/rsc-1985-c-c-46.html#sec276"]
+        )
+        for number in range(1000):
+            index.add_decision(f"2019skca{number}", "skca", 2019, edges)
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            LegislationIndex.load(directory).save(directory)
+            reloaded = LegislationIndex.load(directory, mmap=False)
+
+            self.assertEqual(len(reloaded.lookup("rsc-1985-c-c-46", "276")), 1000)
+
+    def test_parallel_citation_index(self):
+        index = ParallelCitationIndex()
+        for number in range(1, 1001):
+            index.add_decision(f"2016skca{number}", f"2016 SKCA {number}", [], "skca", 2016)
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            ParallelCitationIndex.load(directory).save(directory)
+            reloaded = ParallelCitationIndex.load(directory, mmap=False)
+
+            self.assertEqual(reloaded.resolve(["2016 SKCA 500"]), ["2016skca500"])
+
+
+class ExtractionPoolTests(SimpleTestCase):
+    """
+    The workers run os._exit(), which kills a worker when given an exit code and raises
+    TypeError when given a string.
+    """
+
+    def setUp(self):
+        self.pool = ExtractionPool(workers=2, queue_limit=2)
+        self.addCleanup(self.pool.shutdown)
+
+    def test_new_workers_after_a_worker_dies(self):
+        with self.assertRaises(BrokenProcessPool):
+            self.pool.submit(1, os._exit).result()
+
+        with self.assertRaises(TypeError):
+            self.pool.submit("after", os._exit).result()
+        self.assertEqual(self.pool.in_flight, 0)
+
+    def test_batch_reports_a_dead_worker_per_document(self):
+        # With one worker, only the document that kills it is in flight when it dies; with more,
+        # whichever document shares the broken executor fails too
+        pool = ExtractionPool(workers=1, queue_limit=2)
+        self.addCleanup(pool.shutdown)
+        results = dict(pool.imap_unordered(["a", 1, "b", "c", "d"], os._exit))
+
+        self.assertIsInstance(results[1], BrokenProcessPool)
+        for index in (0, 2, 3, 4):
+            self.assertIsInstance(results[index], TypeError)
+        (result,) = dict(pool.imap_unordered(["e"], os._exit)).values()
+        self.assertIsInstance(result, TypeError)
+
+
+class FixedResultPool:
+    """
+    Stands in for an ExtractionPool, returning a fixed result per document.
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+    def imap_unordered(self, documents, function=None):
+        for index, _ in enumerate(documents):
+            yield index, self.results[index]
+
+
+@override_settings(
+    METADATA_JOB_MAX_DOCUMENTS=3,
+    METADATA_JOB_DOCUMENT_MAX_BYTES=1000,
+    METADATA_JOB_DOCUMENTS_MAX_TOTAL_BYTES=2500,
+)
+class ArchiveLimitTests(TestCase):
+    def zip_archive(self, sizes):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for number, size in enumerate(sizes):
+                archive.writestr(f"{number}.html", "x" * size)
+        buffer.seek(0)
+        return buffer
+
+    def tar_archive(self, sizes):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for number, size in enumerate(sizes):
+                info = tarfile.TarInfo(f"{number}.html")
+                info.size = size
+                archive.addfile(info, io.BytesIO(b"x" * size))
+        buffer.seek(0)
+        return buffer
+
+    def post(self, archive, name="decisions.zip"):
+        upload = SimpleUploadedFile(name, archive.getvalue())
+        return self.client.post(reverse("api_jobs"), {"archive": upload})
+
+    def test_archive_within_the_limits(self):
+        for archive in (self.zip_archive([1000, 800, 700]), self.tar_archive([1000, 800, 700])):
+            self.assertEqual([len(html) for _, html in iter_archive(archive)], [1000, 800, 700])
+
+    def test_oversized_document(self):
+        for archive in (self.zip_archive([10, 5000]), self.tar_archive([10, 5000])):
+            with self.assertRaisesMessage(ArchiveTooLarge, "1.html is larger than 1000 bytes"):
+                list(iter_archive(archive))
+
+    def test_size_declared_too_small_is_not_trusted(self):
+        archive = self.zip_archive([5000])
+        with zipfile.ZipFile(archive) as opened:
+            (info,) = opened.infolist()
+        info.file_size = 10
+        with mock.patch.object(zipfile.ZipFile, "infolist", return_value=[info]):
+            with mock.patch.object(zipfile.ZipExtFile, "read", return_value=b"x" * 5000) as read:
+                with self.assertRaises(ArchiveTooLarge):
+                    list(iter_archive(archive))
+        read.assert_called_once_with(1001)
+
+    def test_too_many_documents_and_too_many_bytes(self):
+        with self.assertRaisesMessage(ArchiveTooLarge, "at most 3 HTML files"):
+            list(iter_archive(self.zip_archive([1, 1, 1, 1])))
+        with self.assertRaisesMessage(ArchiveTooLarge, "at most 2500 bytes in total"):
+            list(iter_archive(self.tar_archive([1000, 1000, 1000])))
+
+    def test_api_refuses_oversized_archives(self):
+        response = self.post(self.zip_archive([10, 5000]))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(ExtractionJob.objects.exists())
+
+        with self.settings(METADATA_JOB_ARCHIVE_MAX_BYTES=100):
+            response = self.post(self.zip_archive([500, 500]))
+        self.assertEqual(response.status_code, 413)
+
+        response = self.post(self.zip_archive([500, 500]))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(JobDocument.objects.count(), 2)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.job = ExtractionJob.objects.create(name="archive.zip")
+        self.documents = JobDocument.objects.bulk_create(
+            [JobDocument(job=self.job, name=f"{number}.html", html="") for number in range(2)]
+        )
+
+    def make_stale(self):
+        JobDocument.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+
+    def test_stale_document_is_failed_after_max_attempts(self):
+        for attempt in range(3):
+            self.assertEqual(len(claim_documents(10, "worker-1")), 2)
+            self.make_stale()
+            self.assertEqual(reset_stale_documents(stale_seconds=60, max_attempts=3), 2)
+
+        statuses = set(JobDocument.objects.values_list("status", flat=True))
+        self.assertEqual(statuses, {JobDocument.FAILED})
+        self.assertEqual(claim_documents(10, "worker-1"), [])
+
+    def test_released_documents_keep_their_attempts(self):
+        claim_documents(10, "worker-1")
+        release_documents("worker-1")
+
+        attempts = set(JobDocument.objects.values_list("attempts", flat=True))
+        self.assertEqual(attempts, {0})
+
+    def test_result_is_not_stored_once_the_claim_moved(self):
+        documents = claim_documents(10, "worker-1")
+        self.make_stale()
+        reset_stale_documents(stale_seconds=60)
+        claim_documents(10, "worker-2")
+
+        pool = FixedResultPool([{"primary_key": "a"}, {"primary_key": "b"}])
+        self.assertEqual(process_documents(documents, pool), 0)
+        self.assertEqual(
+            set(JobDocument.objects.values_list("status", "claimed_by")),
+            {(JobDocument.RUNNING, "worker-2")},
+        )
+
+    def test_documents_of_a_dead_pool_worker_are_queued_again(self):
+        documents = claim_documents(10, "worker-1")
+
+        pool = FixedResultPool([{"primary_key": "a"}, BrokenProcessPool("worker died")])
+        self.assertEqual(process_documents(documents, pool), 1)
+        first, second = JobDocument.objects.order_by("id")
+        self.assertEqual(first.status, JobDocument.DONE)
+        self.assertEqual(first.result, {"primary_key": "a"})
+        self.assertEqual(second.status, JobDocument.PENDING)
+
+
+@override_settings(METADATA_BATCH_MAX_BYTES=1000)
+class BatchSizeTests(SimpleTestCase):
+    def test_json_batch_over_the_byte_limit(self):
+        response = self.client.post(
+            reverse("api_batch"), json.dumps(["x" * 2000]), content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_multipart_batch_over_the_byte_limit(self):
+        upload = SimpleUploadedFile("2019skca12.html", b"x" * 2000, content_type="text/html")
+        response = self.client.post(reverse("api_batch"), {"decision": upload})
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_json_batch_within_the_byte_limit_is_validated(self):
+        response = self.client.post(
+            reverse("api_batch"), json.dumps([1]), content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchStreamingTests(SimpleTestCase):
+    def test_gzip_stream_sends_each_record_as_it_completes(self):
+        extracted = []
+
+        class CountingPool(FixedResultPool):
+            def imap_unordered(self, documents, function=None):
+                for index, result in super().imap_unordered(documents, function):
+                    extracted.append(index)
+                    yield index, result
+
+        pool = CountingPool([{"primary_key": "2019skca12"}, {"primary_key": "2019skca13"}])
+        batch = [f"<html>streamed gzip batch {number}</html>" for number in range(2)]
+        with mock.patch("metadata.api.get_extraction_pool", return_value=pool):
+            response = self.client.post(
+                reverse("api_batch"),
+                json.dumps(batch),
+                content_type="application/json",
+                HTTP_ACCEPT_ENCODING="gzip",
+            )
+            self.assertEqual(response["Content-Encoding"], "gzip")
+
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunks = iter(response.streaming_content)
+            received = b""
+            while b"\n" not in received:
+                received += decompressor.decompress(next(chunks))
+            # The first record arrives before the second decision has been extracted
+            self.assertEqual(extracted, [0])
+            self.assertEqual(json.loads(received)["record"]["primary_key"], "2019skca12")
+
+            received += b"".join(decompressor.decompress(chunk) for chunk in chunks)
+        self.assertEqual(len(received.splitlines()), 2)
+        self.assertEqual(extracted, [0, 1])
+
+
+class DecisionBodyTests(TestCase):
+    def setUp(self):
+        self.page = synthetic_pages.make_page(2019, 12, paragraphs=40, seed=1)
+
+    def test_body_is_not_part_of_the_result(self):
+        context = quietly(extract_decision, self.page)
+
+        self.assertNotIn("main_content", context)
+        self.assertIn("uncontradicted", extract_main_content(self.page))
+
+    def test_job_decisions_are_searchable_by_their_body(self):
+        job = ExtractionJob.objects.create(name="archive.zip")
+        JobDocument.objects.create(
+            job=job,
+            name="2019skca12.html",
+            html=self.page,
+            status=JobDocument.DONE,
+            result=to_json_record(quietly(extract_decision, self.page)),
+        )
+        quietly(call_command, "ingest_decisions", job=[str(job.pk)])
+
+        hits = search_decisions("uncontradicted")
+        self.assertEqual([hit.primary_key for hit in hits], ["2019skca12"])
+
+
+@override_settings(METADATA_LINKS_PAGE_SIZE=10)
+class ShowMoreLinksTests(SimpleTestCase):
+    def test_buttons_fetch_links_from_the_reversed_url(self):
+        page = synthetic_pages.make_page(2019, 12, case_links=25, seed=1)
+        response = quietly(self.client.post, reverse("index"), {"textfield": page})
+
+        urls = re.findall(r'data-url="([^"]+)"', response.content.decode())
+        digest = response.context["document_digest"]
+        self.assertEqual(urls[0], reverse("api_links", args=[digest, "case"]))
+        self.assertNotIn("/api/links/{{", response.content.decode())
+
+        links = self.client.get(urls[0], {"offset": 10, "limit": 10}).json()
+        self.assertEqual((len(links["links"]), links["next_offset"]), (10, 20))
+
+
+class BulkLoadTests(TransactionTestCase):
+    def schema(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger')"
+            )
+            return set(cursor.fetchall())
+
+    def test_schema_is_restored_after_the_load(self):
+        schema = self.schema()
+        with bulk_load():
+            self.assertLess(len(self.schema()), len(schema))
+
+        self.assertEqual(self.schema(), schema)
+        self.assertNotIn(SUSPENDED_SCHEMA_TABLE, connection.introspection.table_names())
+
+    def test_killed_load_is_recovered(self):
+        schema = self.schema()
+        # Enter the block and never leave it, as a process killed during the load would
+        load = bulk_load()
+        load.__enter__()
+        self.addCleanup(load.__exit__, None, None, None)
+        self.assertNotIn(("trigger", "metadata_decision_fts_insert"), self.schema())
+
+        self.assertTrue(recover_bulk_load(connection))
+        self.assertEqual(self.schema(), schema)
+        self.assertFalse(recover_bulk_load(connection))
+
+
+class MetricsSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def exited_pid(self):
+        process = subprocess.Popen([sys.executable, "-c", ""])
+        process.wait()
+        return process.pid
+
+    def write(self, name, pid, count):
+        snapshot = {
+            "pid": pid,
+            "counters": [["canlii_documents_processed_total", {"rules": "default"}, count]],
+            "gauges": [["canlii_pool_in_flight", {}, 1]],
+            "histograms": [],
+        }
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as file:
+            json.dump(snapshot, file)
+
+    def processed(self):
+        merged = metrics.read_snapshots(self.directory)
+        key = ("canlii_documents_processed_total", (("rules", "default"),))
+        return merged["counters"].get(key, 0), merged["gauges"]
+
+    def test_exited_processes_are_folded_into_one_file(self):
+        pid = self.exited_pid()
+        self.write(f"{pid}-aaaa.json", pid, 3)
+        self.write(f"{os.getpid()}-bbbb.json", os.getpid(), 4)
+
+        self.assertEqual(self.processed(), (7, {("canlii_pool_in_flight", ()): 1}))
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory) if name.endswith(".json")),
+            sorted([metrics.EXITED_FILE, f"{os.getpid()}-bbbb.json"]),
+        )
+        self.assertEqual(self.processed()[0], 7)
+
+        # A later process with the same PID writes a snapshot of its own
+        self.write(f"{pid}-cccc.json", pid, 1)
+        self.assertEqual(self.processed()[0], 8)
+
+    def test_interrupted_fold_is_not_counted_twice(self):
+        pid = self.exited_pid()
+        self.write(f"{pid}-aaaa.json", pid, 3)
+        self.assertEqual(self.processed()[0], 3)
+
+        # As if the process had stopped before deleting the snapshot it folded
+        self.write(f"{pid}-aaaa.json", pid, 3)
+        self.assertEqual(self.processed()[0], 3)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f"{pid}-aaaa.json")))
+
+    def test_pool_workers_write_their_final_counts(self):
+        with mock.patch.dict(os.environ, {"METADATA_METRICS_DIR": self.directory}):
+            pool = ExtractionPool(workers=1, queue_limit=3)
+            for _ in range(3):
+                pool.submit("canlii_documents_processed_total", metrics.inc).result()
+            # Stop the worker well within the periodic write interval
+            pool._executor.shutdown(wait=True)
+            pool.shutdown()
+
+        merged = metrics.read_snapshots(self.directory)
+        self.assertEqual(merged["counters"][("canlii_documents_processed_total", ())], 3)
+
+
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_profile_header_is_ignored_by_default(self):
+        request = RequestFactory().post("/", HTTP_X_METADATA_PROFILE="sampling")
+        self.assertIsNone(requested_profiler(request))
+        with self.settings(METADATA_PROFILE_HEADER=True):
+            self.assertEqual(requested_profiler(request), "sampling")
+
+    def test_oldest_profiles_are_pruned(self):
+        for number in range(5):
+            path = os.path.join(self.directory, f"decision-{number}.collapsed")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("main 1\n")
+            os.utime(path, (1_000_000 + number, 1_000_000 + number))
+        with open(os.path.join(self.directory, "notes.txt"), "w", encoding="utf-8") as file:
+            file.write("kept")
+
+        profiling.prune_profiles(self.directory, 2)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ["decision-3.collapsed", "decision-4.collapsed", "notes.txt"],
+        )
+
+    def test_written_profiles_are_capped(self):
+        with mock.patch.object(profiling, "PROFILE_MAX_FILES", 3):
+            for _ in range(5):
+                context = profiling.run_profiled(
+                    "<html></html>",
+                    lambda page: {"primary_key": "2019skca12"},
+                    "sampling",
+                    directory=self.directory,
+                )
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), 3)
+        self.assertIn(os.path.basename(context[profiling.PROFILE_PATH_KEY]), names)
@@ -1,6 +1,15 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('async/', views.index_async, name='index_async'),
+    path('results/<str:digest>/', views.result, name='result'),
+    path('metrics', views.metrics, name='metrics'),
+    path('api/batch/', api.batch, name='api_batch'),
+    path('api/jobs/', api.jobs, name='api_jobs'),
+    path('api/jobs/<uuid:job_id>/', api.job, name='api_job'),
+    path('api/results/<str:digest>/', api.result, name='api_result'),
+    path('api/search/', api.search, name='api_search'),
+    path('api/links/<str:digest>/<str:kind>/', api.links, name='api_links'),
 ]
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+
+"""
+Corpus-wide citation graph built from the judgmentLinks of every decision.
+
+Decisions are assigned integer IDs in the order they are first seen. Outgoing ("cites") and
+incoming ("cited by") adjacency are both kept as compressed sparse row (CSR) arrays: an indptr
+array of length n + 1 and an indices array holding the neighbours of node i in
+indices[indptr[i]:indptr[i + 1]]. The arrays are saved as .npy files and can be memory-mapped
+when loaded. New edges are buffered and merged into the CSR arrays on the next query or save.
+"""
+
+import json
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .jurisdiction import COURT_LEVEL_MAPPING, CaseEdge
+from .vocabulary import MISSING_CODE, Vocabulary
+
+INDEX_DTYPE = np.int64
+NODE_DTYPE = np.int32
+
+CSR_FILES = [
+    "forward_indptr",
+    "forward_indices",
+    "reverse_indptr",
+    "reverse_indices",
+]
+
+
+class DecisionTable:
+    """
+    Maps decision primary keys to integer IDs and stores each decision's court code and year.
+    The court of a decision is recorded as a code in a court Vocabulary seeded with the
+    COURT_LEVEL_MAPPING keys.
+    """
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.court_codes = Vocabulary(COURT_LEVEL_MAPPING.keys())
+        self._courts = array("i")
+        self._years = array("h")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, primary_key: object) -> bool:
+        return primary_key in self.ids
+
+    def add(self, primary_key: str, court: str = "", year: int = 0) -> int:
+        """
+        Returns the ID of a decision, adding it to the table if necessary. A known court or year
+        replaces an unknown one recorded earlier.
+
+        Args:
+            primary_key (str): The decision's primary key, e.g. "2019skca12".
+            court (str): The court code, e.g. "skca".
+            year (int): The decision year.
+
+        Returns:
+            int: The decision's ID.
+        """
+
+        node = self.ids.get(primary_key)
+        if node is None:
+            node = len(self.keys)
+            self.ids[primary_key] = node
+            self.keys.append(primary_key)
+            self._courts.append(MISSING_CODE)
+            self._years.append(0)
+
+        if court and self._courts[node] == MISSING_CODE:
+            self._courts[node] = self.court_codes.add(court)
+        if year and not self._years[node]:
+            self._years[node] = year
+
+        return node
+
+    def id(self, primary_key: str) -> int:
+        """
+        Returns the ID of a decision, or -1 if it is not in the table.
+        """
+
+        return self.ids.get(primary_key, -1)
+
+    @property
+    def courts(self) -> np.ndarray:
+        """The court code of every decision, indexed by ID."""
+        return np.frombuffer(self._courts, dtype=np.int32).copy()
+
+    @property
+    def years(self) -> np.ndarray:
+        """The year of every decision, indexed by ID (0 if unknown)."""
+        return np.frombuffer(self._years, dtype=np.int16).copy()
+
+    def courts_of(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the court codes of the given decision IDs without copying the whole column.
+        """
+
+        return np.frombuffer(self._courts, dtype=np.int32)[ids]
+
+    def years_of(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the years of the given decision IDs without copying the whole column.
+        """
+
+        return np.frombuffer(self._years, dtype=np.int16)[ids]
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the table to <directory>/decisions.json, courts.npy and years.npy.
+        """
+
+        with open(os.path.join(directory, "decisions.json"), "w", encoding="utf-8") as file:
+            json.dump(
+                {"keys": self.keys, "court_codes": list(self.court_codes)},
+                file,
+                ensure_ascii=False,
+            )
+        save_array(os.path.join(directory, "courts.npy"), self.courts)
+        save_array(os.path.join(directory, "years.npy"), self.years)
+
+    @classmethod
+    def load(cls, directory: str) -> "DecisionTable":
+        """
+        Loads a table saved with save().
+        """
+
+        table = cls()
+        with open(os.path.join(directory, "decisions.json"), "r", encoding="utf-8") as file:
+            data = json.load(file)
+        table.keys = data["keys"]
+        table.ids = {key: node for node, key in enumerate(table.keys)}
+        table.court_codes = Vocabulary(data["court_codes"])
+        table._courts.frombytes(np.load(os.path.join(directory, "courts.npy")).tobytes())
+        table._years.frombytes(np.load(os.path.join(directory, "years.npy")).tobytes())
+        return table
+
+
+def save_array(path: str, values: np.ndarray) -> None:
+    """
+    Saves an array to a .npy file through a temporary file that then replaces it. The array may
+    be memory-mapped onto the file it is saved to, as after loading with mmap=True, so the file
+    must not be truncated while the array is still being read from it.
+    """
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as file:
+            np.save(file, np.asarray(values))
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def sorted_unique(values: np.ndarray) -> np.ndarray:
+    """
+    Returns the sorted unique values of an integer array. Sorting and masking adjacent
+    duplicates is considerably faster than np.unique for large int64 arrays.
+    """
+
+    values = np.sort(values)
+    if len(values) < 2:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+def build_csr(
+    sources: np.ndarray,
+    targets: np.ndarray,
+    node_count: int,
+    target_count: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds a CSR adjacency from parallel arrays of edge endpoints. Duplicate edges are removed.
+
+    Args:
+        sources (np.ndarray): The source node of every edge.
+        targets (np.ndarray): The target node of every edge.
+        node_count (int): The number of source nodes.
+        target_count (Optional[int]): The number of target nodes, if different from node_count.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The indptr and indices arrays. The neighbours of each node
+        are sorted.
+    """
+
+    # Sorting a single packed (source, target) key is much faster than a lexsort
+    width = max(node_count if target_count is None else target_count, 1)
+    packed = sorted_unique(sources.astype(np.int64) * width + targets)
+    indices = (packed % width).astype(NODE_DTYPE)
+    counts = np.bincount(packed // width, minlength=node_count)
+    indptr = np.zeros(node_count + 1, dtype=INDEX_DTYPE)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, indices
+
+
+def gather_neighbours(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """
+    Returns the concatenated neighbour lists of several nodes without a Python loop.
+    """
+
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=NODE_DTYPE)
+    # Position of each output slot within its node's slice, offset by that slice's start
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return indices[offsets + np.arange(total)]
+
+
+class CitationGraph:
+    """
+    Citation graph over decision primary keys with CSR forward and reverse adjacency.
+
+    Example:
+        graph = CitationGraph()
+        graph.add_decision("2019skca12", "skca", 2019, context["case_links"])
+        graph.cited_by("2015skca5")
+        graph.save("graph/")
+        graph = CitationGraph.load("graph/", mmap=True)
+    """
+
+    def __init__(self):
+        self.decisions = DecisionTable()
+        empty_indptr = np.zeros(1, dtype=INDEX_DTYPE)
+        empty_indices = np.empty(0, dtype=NODE_DTYPE)
+        self.forward_indptr = empty_indptr
+        self.forward_indices = empty_indices
+        self.reverse_indptr = empty_indptr
+        self.reverse_indices = empty_indices
+        self._pending_sources = array("i")
+        self._pending_targets = array("i")
+
+    @property
+    def node_count(self) -> int:
+        """The number of decisions in the graph, cited or citing."""
+        return len(self.decisions)
+
+    @property
+    def edge_count(self) -> int:
+        """The number of distinct citations in the graph."""
+        self.compact()
+        return len(self.forward_indices)
+
+    def add_decision(
+        self, primary_key: str, court: str, year: int, edges: Iterable[CaseEdge]
+    ) -> int:
+        """
+        Adds a decision and its outgoing citations. Cited decisions are added to the graph with
+        the court and year recorded on their edges.
+
+        Args:
+            primary_key (str): The citing decision's primary key.
+            court (str): The citing decision's court code.
+            year (int): The citing decision's year.
+            edges (Iterable[CaseEdge]): The decision's judgmentLinks edges.
+
+        Returns:
+            int: The ID of the citing decision.
+        """
+
+        add = self.decisions.add
+        source = add(primary_key, court, year)
+        for edge in edges:
+            self._pending_sources.append(source)
+            self._pending_targets.append(add(edge.target, edge.court, edge.year))
+        return source
+
+    def add_edges(self, sources: Iterable[str], targets: Iterable[str]) -> None:
+        """
+        Adds citations given as parallel sequences of citing and cited primary keys.
+        """
+
+        add = self.decisions.add
+        for source, target in zip(sources, targets):
+            self._pending_sources.append(add(source))
+            self._pending_targets.append(add(target))
+
+    def edge_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the (source, target) ID arrays of every citation, ordered by source.
+        """
+
+        self.compact()
+        sources = np.repeat(
+            np.arange(self.node_count, dtype=NODE_DTYPE), np.diff(self.forward_indptr)
+        )
+        return sources, np.asarray(self.forward_indices)
+
+    def compact(self) -> None:
+        """
+        Merges buffered edges into the CSR arrays. Duplicate citations are removed.
+        """
+
+        node_count = self.node_count
+        if not self._pending_sources and len(self.forward_indptr) == node_count + 1:
+            return
+
+        existing_sources = np.repeat(
+            np.arange(len(self.forward_indptr) - 1, dtype=np.int64),
+            np.diff(self.forward_indptr),
+        )
+        sources = np.concatenate(
+            [existing_sources, np.frombuffer(self._pending_sources, dtype=np.int32)]
+        )
+        targets = np.concatenate(
+            [
+                np.asarray(self.forward_indices, dtype=np.int64),
+                np.frombuffer(self._pending_targets, dtype=np.int32),
+            ]
+        )
+
+        self.forward_indptr, self.forward_indices = build_csr(sources, targets, node_count)
+        self.reverse_indptr, self.reverse_indices = build_csr(targets, sources, node_count)
+        self._pending_sources = array("i")
+        self._pending_targets = array("i")
+
+    def _neighbour_ids(self, node: int, reverse: bool) -> np.ndarray:
+        self.compact()
+        indptr, indices = (
+            (self.reverse_indptr, self.reverse_indices)
+            if reverse
+            else (self.forward_indptr, self.forward_indices)
+        )
+        return np.asarray(indices[indptr[node] : indptr[node + 1]])
+
+    def _keys(self, nodes: np.ndarray) -> List[str]:
+        keys = self.decisions.keys
+        return [keys[node] for node in nodes.tolist()]
+
+    def cites(self, primary_key: str) -> List[str]:
+        """
+        Returns the primary keys of the decisions cited by a decision.
+        """
+
+        node = self.decisions.id(primary_key)
+        if node < 0:
+            return []
+        return self._keys(self._neighbour_ids(node, reverse=False))
+
+    def cited_by(self, primary_key: str) -> List[str]:
+        """
+        Returns the primary keys of the decisions that cite a decision.
+        """
+
+        node = self.decisions.id(primary_key)
+        if node < 0:
+            return []
+        return self._keys(self._neighbour_ids(node, reverse=True))
+
+    def neighbourhood(
+        self, primary_key: str, hops: int = 2, direction: str = "both"
+    ) -> List[str]:
+        """
+        Returns the decisions within a number of citation hops of a decision, excluding the
+        decision itself.
+
+        Args:
+            primary_key (str): The decision at the centre of the neighbourhood.
+            hops (int): The maximum number of hops.
+            direction (str): "out" follows citations, "in" follows citing decisions and "both"
+                follows either.
+
+        Returns:
+            List[str]: The primary keys in the neighbourhood, ordered by ID.
+        """
+
+        if direction not in ("out", "in", "both"):
+            raise ValueError(f"Unknown direction: {direction}")
+
+        node = self.decisions.id(primary_key)
+        if node < 0:
+            return []
+
+        self.compact()
+        adjacency = []
+        if direction in ("out", "both"):
+            adjacency.append((self.forward_indptr, self.forward_indices))
+        if direction in ("in", "both"):
+            adjacency.append((self.reverse_indptr, self.reverse_indices))
+
+        visited = np.zeros(self.node_count, dtype=bool)
+        visited[node] = True
+        frontier = np.array([node], dtype=NODE_DTYPE)
+        for _ in range(hops):
+            reached = np.concatenate(
+                [gather_neighbours(indptr, indices, frontier) for indptr, indices in adjacency]
+            )
+            frontier = sorted_unique(reached[~visited[reached]])
+            if not len(frontier):
+                break
+            visited[frontier] = True
+
+        visited[node] = False
+        return self._keys(np.flatnonzero(visited))
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the graph to a directory of .npy files plus the decision table.
+        """
+
+        self.compact()
+        os.makedirs(directory, exist_ok=True)
+        for name in CSR_FILES:
+            save_array(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        self.decisions.save(directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "CitationGraph":
+        """
+        Loads a graph saved with save().
+
+        Args:
+            directory (str): The directory the graph was saved to.
+            mmap (bool): Whether to memory-map the CSR arrays rather than read them into memory.
+                Appending to a memory-mapped graph is supported; the merged arrays are held in
+                memory until the graph is saved again.
+
+        Returns:
+            CitationGraph: The loaded graph.
+        """
+
+        graph = cls()
+        mmap_mode: Optional[str] = "r" if mmap else None
+        for name in CSR_FILES:
+            setattr(
+                graph, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            )
+        graph.decisions = DecisionTable.load(directory)
+        return graph
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+"""
+Parses neutral citations ("2019 SKCA 12") and reporter citations ("[2003] 4 WWR 123",
+"(2016) 480 Sask R 1") and packs them into orderable 64-bit integer keys, so that joins, sorts
+and deduplication across the corpus can run on NumPy int64 arrays instead of strings.
+
+Key layout (the sign bit is always 0):
+
+    bit  62      kind: 0 for a neutral citation, 1 for a reporter citation
+    bits 50-61   year
+    bits 34-49   court code (neutral) or reporter series code (reporter)
+    bits  0-33   decision number (neutral), or volume << 20 | page (reporter)
+
+Neutral keys therefore sort by year, then court code, then decision number.
+
+Keys are only comparable when they were encoded with the same vocabularies. The codec shared by
+the extraction pipeline (get_citation_codec()) is frozen to the seeded courts and series, so a
+decision's citation_key is the same in every worker and every run; a citation with a court or
+series outside them has no key. A codec that grows, like a ParallelCitationIndex's, must be
+saved with its keys.
+"""
+
+import re
+from typing import TYPE_CHECKING, Iterable, List, NamedTuple, Optional, Union
+
+# NumPy is only needed for encode_many(), so it is imported there rather than by every process
+# that parses a citation
+if TYPE_CHECKING:
+    import numpy as np
+
+from .jurisdiction import COURT_LEVEL_MAPPING
+from .vocabulary import MISSING_CODE, Vocabulary
+
+# Key returned for citations that cannot be parsed or encoded
+MISSING_KEY = -1
+
+# Version of the seeded vocabularies of the frozen codec. Keys persisted under one version are
+# not comparable with keys of another. Appending courts to COURT_LEVEL_MAPPING or series to
+# REPORTER_SERIES keeps existing codes; removing or reordering entries changes them, and must
+# bump this version along with RULESET_VERSION.
+CITATION_CODEC_VERSION = 1
+
+KIND_SHIFT = 62
+YEAR_SHIFT = 50
+CODE_SHIFT = 34
+VOLUME_SHIFT = 20
+
+YEAR_LIMIT = 1 << 12
+CODE_LIMIT = 1 << 16
+NUMBER_LIMIT = 1 << 34
+VOLUME_LIMIT = 1 << 14
+PAGE_LIMIT = 1 << 20
+
+# Neutral citation court identifiers that are not CanLII collection codes
+NEUTRAL_ONLY_COURTS = [
+    "canlii",
+]
+
+# Common reporter series, in normalized form. Codes for these series are the same from run to
+# run; a codec that grows adds other series to its vocabulary as they are encountered. Only
+# append to this list (see CITATION_CODEC_VERSION).
+REPORTER_SERIES = [
+    "SCR",
+    "Sask R",
+    "WWR",
+    "DLR",
+    "DLR (2d)",
+    "DLR (3d)",
+    "DLR (4th)",
+    "CCC",
+    "CCC (2d)",
+    "CCC (3d)",
+    "CR",
+    "CR (3d)",
+    "CR (4th)",
+    "CR (5th)",
+    "CR (6th)",
+    "CR (7th)",
+    "WCB",
+    "WCB (2d)",
+    "AR",
+    "BCLR",
+    "BCAC",
+    "OR",
+    "OR (2d)",
+    "OR (3d)",
+    "OAC",
+    "Man R (2d)",
+    "NSR (2d)",
+    "NBR (2d)",
+    "Nfld & PEIR",
+    "FC",
+    "FTR",
+    "NR",
+    "CRR",
+    "CRR (2d)",
+    "ACWS",
+    "ACWS (3d)",
+    "RFL",
+    "RFL (3d)",
+    "RFL (4th)",
+    "RFL (5th)",
+    "RFL (6th)",
+    "RFL (7th)",
+    "RFL (8th)",
+    "CPC",
+    "CPC (5th)",
+    "CPC (6th)",
+    "CPC (7th)",
+    "CPC (8th)",
+    "Admin LR",
+    "Admin LR (3d)",
+    "Admin LR (4th)",
+    "Admin LR (5th)",
+    "Admin LR (6th)",
+    "Admin LR (7th)",
+]
+
+NEUTRAL_CITATION_PATTERN = re.compile(
+    r"(?P<year>\d{4})\s+(?P<court>[A-Za-z][A-Za-z0-9]*)\s+(?P<number>\d+)"
+)
+REPORTER_CITATION_PATTERN = re.compile(
+    r"[\[(](?P<year>\d{4})[\])],?\s+(?:(?P<volume>\d+)\s+)?(?P<series>\D.*?)\s+(?P<page>\d+)"
+)
+CANLII_SUFFIX_PATTERN = re.compile(r"\s*\(CanLII\)\s*$")
+
+
+class NeutralCitation(NamedTuple):
+    """
+    A neutral citation, e.g. "2019 SKCA 12". The court is the lowercase court identifier.
+    """
+
+    year: int
+    court: str
+    number: int
+
+    def __str__(self) -> str:
+        court = "CanLII" if self.court == "canlii" else self.court.upper()
+        return f"{self.year} {court} {self.number}"
+
+
+class ReporterCitation(NamedTuple):
+    """
+    A reporter citation, e.g. "(2016) 480 Sask R 1". The volume is 0 for series without volumes.
+    """
+
+    year: int
+    volume: int
+    series: str
+    page: int
+
+    def __str__(self) -> str:
+        volume = f"{self.volume} " if self.volume else ""
+        return f"({self.year}) {volume}{self.series} {self.page}"
+
+
+Citation = Union[NeutralCitation, ReporterCitation]
+
+
+def normalize_reporter_series(series: str) -> str:
+    """
+    Normalizes a reporter series name: periods are dropped and whitespace is collapsed, so
+    "Sask. R." and "Sask R", or "S.C.R." and "SCR", are the same series.
+    """
+
+    series = series.replace(".", "")
+    series = re.sub(r"\s+", " ", series).strip()
+    # Keep the space before an edition marker, e.g. "CCC(3d)" -> "CCC (3d)"
+    return re.sub(r"\s*\(\s*(\w+)\s*\)", r" (\1)", series)
+
+
+def parse_citation(text: str) -> Optional[Citation]:
+    """
+    Parses a neutral or reporter citation.
+
+    Args:
+        text (str): The citation, e.g. "2019 SKCA 12", "2019 SKCA 12 (CanLII)" or
+            "[2003] 4 WWR 123".
+
+    Returns:
+        Optional[Citation]: A NeutralCitation or ReporterCitation, or None if the text is not a
+        citation.
+    """
+
+    text = CANLII_SUFFIX_PATTERN.sub("", text).strip()
+
+    neutral_match = NEUTRAL_CITATION_PATTERN.fullmatch(text)
+    if neutral_match:
+        return NeutralCitation(
+            year=int(neutral_match.group("year")),
+            court=neutral_match.group("court").lower(),
+            number=int(neutral_match.group("number")),
+        )
+
+    reporter_match = REPORTER_CITATION_PATTERN.fullmatch(text)
+    if reporter_match:
+        return ReporterCitation(
+            year=int(reporter_match.group("year")),
+            volume=int(reporter_match.group("volume") or 0),
+            series=normalize_reporter_series(reporter_match.group("series")),
+            page=int(reporter_match.group("page")),
+        )
+
+    return None
+
+
+class CitationCodec:
+    """
+    Encodes citations as int64 keys and decodes them again. Court and reporter series codes come
+    from append-only vocabularies seeded with COURT_LEVEL_MAPPING and REPORTER_SERIES, so keys for
+    known courts and series are stable across runs. Save the vocabularies with the keys if new
+    courts or series may have been added.
+
+    A frozen codec never adds to its vocabularies, whatever grow is passed, so its keys depend
+    only on the seeded vocabularies and not on the citations the process has seen before.
+    """
+
+    def __init__(
+        self,
+        courts: Optional[Vocabulary] = None,
+        series: Optional[Vocabulary] = None,
+        frozen: bool = False,
+    ):
+        self.courts = courts or Vocabulary(list(COURT_LEVEL_MAPPING) + NEUTRAL_ONLY_COURTS)
+        self.series = series or Vocabulary(REPORTER_SERIES)
+        self.frozen = frozen
+
+    def encode(self, citation: Citation, grow: bool = True) -> int:
+        """
+        Packs a parsed citation into an int64 key.
+
+        Args:
+            citation (Citation): The parsed citation.
+            grow (bool): Whether an unknown court or series is added to the vocabularies. If
+                False, or if the codec is frozen, a citation with an unknown court or series
+                encodes as MISSING_KEY.
+
+        Raises:
+            ValueError: If a field does not fit in its bits.
+        """
+
+        if isinstance(citation, NeutralCitation):
+            vocabulary, value = self.courts, citation.court
+        else:
+            vocabulary, value = self.series, citation.series
+        code = vocabulary.add(value) if grow and not self.frozen else vocabulary.code(value)
+        if code == MISSING_CODE:
+            return MISSING_KEY
+
+        if isinstance(citation, NeutralCitation):
+            kind, low = 0, citation.number
+            if low >= NUMBER_LIMIT:
+                raise ValueError(f"Decision number out of range: {citation}")
+        else:
+            kind = 1
+            if citation.volume >= VOLUME_LIMIT or citation.page >= PAGE_LIMIT:
+                raise ValueError(f"Volume or page out of range: {citation}")
+            low = (citation.volume << VOLUME_SHIFT) | citation.page
+
+        if citation.year >= YEAR_LIMIT or code >= CODE_LIMIT:
+            raise ValueError(f"Year or code out of range: {citation}")
+
+        return (kind << KIND_SHIFT) | (citation.year << YEAR_SHIFT) | (code << CODE_SHIFT) | low
+
+    def decode(self, key: int) -> Optional[Citation]:
+        """
+        Unpacks an int64 key into a citation, or returns None for MISSING_KEY.
+        """
+
+        key = int(key)
+        if key == MISSING_KEY:
+            return None
+
+        year = (key >> YEAR_SHIFT) & (YEAR_LIMIT - 1)
+        code = (key >> CODE_SHIFT) & (CODE_LIMIT - 1)
+        low = key & (NUMBER_LIMIT - 1)
+
+        if key >> KIND_SHIFT:
+            return ReporterCitation(
+                year=year,
+                volume=low >> VOLUME_SHIFT,
+                series=self.series.value(code),
+                page=low & (PAGE_LIMIT - 1),
+            )
+        return NeutralCitation(year=year, court=self.courts.value(code), number=low)
+
+    def key(self, text: str, grow: bool = True) -> int:
+        """
+        Parses and encodes a citation string, returning MISSING_KEY if it cannot be encoded.
+        """
+
+        citation = parse_citation(text)
+        if citation is None:
+            return MISSING_KEY
+        try:
+            return self.encode(citation, grow)
+        except ValueError:
+            return MISSING_KEY
+
+    def keys(self, texts: Iterable[str], grow: bool = True) -> List[int]:
+        """
+        Parses and encodes a list of citation strings.
+        """
+
+        return [self.key(text, grow) for text in texts]
+
+    def encode_many(self, texts: Iterable[str], grow: bool = True) -> "np.ndarray":
+        """
+        Parses and encodes citation strings into an int64 array. Citations that cannot be
+        encoded are MISSING_KEY.
+        """
+
+        import numpy as np
+
+        return np.fromiter((self.key(text, grow) for text in texts), dtype=np.int64)
+
+    def court_code(self, court: str) -> int:
+        """
+        Returns the code of a court identifier without adding it, or MISSING_CODE.
+        """
+
+        return self.courts.code(court.lower()) if court else MISSING_CODE
+
+
+_CITATION_CODEC = None
+
+
+def get_citation_codec() -> CitationCodec:
+    """
+    Returns the frozen citation codec shared by the current process, whose keys are the same in
+    every process (see CITATION_CODEC_VERSION).
+    """
+
+    global _CITATION_CODEC
+    if _CITATION_CODEC is None:
+        _CITATION_CODEC = CitationCodec(frozen=True)
+    return _CITATION_CODEC
+
+
+def citation_key(text: str) -> int:
+    """
+    Returns the int64 key of a citation string, or MISSING_KEY if it cannot be parsed or its
+    court or series is not in the shared codec's vocabularies.
+    """
+
+    return get_citation_codec().key(text)
@@ -9,10 +9,8 @@ import os
 import shutil
 import glob
 
-import html2text
-import typer
-
-app = typer.Typer()
+# html2text is imported by MarkdownConverter and typer by main(), so that importing this
+# module (as every web worker does) does not load either of them
 
 UNWANTED_PATTERNS = [
     r"\[ !\[CanLII Logo\]\(.+?\) \]\(.+?\)",
@@ -29,9 +27,6 @@ UNWANTED_PATTERNS = [
     r"\nExpanded Collapsed\n",
 ]
 
-HTML2TEXT_HANDLER = html2text.HTML2Text()
-HTML2TEXT_HANDLER.ignore_links = False
-
 DATE_PATTERN = re.compile(r"Date:\s*\n")
 FILE_NUMBER_PATTERN = re.compile(r"File number:\s*\n")
 CITATION_PATTERN = re.compile(r"Citation:\s*\n")
@@ -41,7 +36,49 @@ FOOTER_PATTERN = re.compile(r"Back to top.*$", re.DOTALL)
 
 def html_to_markdown(html_content: str) -> str:
     """..."""
-    return HTML2TEXT_HANDLER.handle(html_content)
+    converter = MarkdownConverter()
+    converter.feed(html_content)
+    return converter.finish()
+
+
+class MarkdownConverter:
+    """
+    Converts HTML fed in chunks to markdown, with the same output as html_to_markdown() on the
+    whole document.
+    """
+
+    def __init__(self):
+        import html2text
+
+        # HTML2Text keeps parser state on the instance, so each conversion gets its own
+        # handler; a shared one breaks when documents are converted on several threads at once
+        self._handler = html2text.HTML2Text()
+        self._handler.ignore_links = False
+        self._pending = ""
+
+    def feed(self, chunk: str) -> None:
+        # HTML2Text spaces out a run of text that arrives in two pieces, so everything from the
+        # last "<" is held back until the next chunk. The handler only ever sees text that
+        # ends where a tag begins.
+        data = self._pending + chunk
+        cut = data.rfind("<")
+        if cut <= 0:
+            self._pending = data
+            return
+        self._handler.feed(data[:cut])
+        self._pending = data[cut:]
+
+    def finish(self) -> str:
+        # The steps of HTML2Text.handle() after the data has been fed
+        handler = self._handler
+        handler.feed(self._pending)
+        handler.feed("")
+        markdown = handler.optwrap(handler.finish())
+        if handler.pad_tables:
+            from html2text import pad_tables_in_text
+
+            return pad_tables_in_text(markdown)
+        return markdown
 
 
 def convert_file(html_filepath: str, markdown_filepath: str) -> None:
@@ -53,10 +90,13 @@ def convert_file(html_filepath: str, markdown_filepath: str) -> None:
         markdown_filepath (str): Path to the output markdown file.
     """
 
+    # Read the HTML in chunks, so that large decisions are not held in memory twice
+    converter = MarkdownConverter()
     with open(html_filepath, "r", encoding="utf-8") as file:
-        html_content = file.read()
+        for chunk in iter(lambda: file.read(64 * 1024), ""):
+            converter.feed(chunk)
 
-    markdown_content = html_to_markdown(html_content)
+    markdown_content = converter.finish()
     refined_markdown_content = refine_markdown(markdown_content)
 
     with open(markdown_filepath, "w", encoding="utf-8") as file:
@@ -94,10 +134,7 @@ def create_directories(base_directory):
     return html_dir, md_dir
 
 
-@app.command()
-def convert_all_html_to_markdown(
-    directory: str = typer.Argument(os.getcwd(), help="Directory containing HTML files")
-):
+def convert_all_html_to_markdown(directory: str = os.getcwd()):
     """Converts all HTML files in the given directory to Markdown and sorts them."""
     html_dir, md_dir = create_directories(directory)
 
@@ -119,6 +156,17 @@ def main():
     This is the main entry point for the CLI. It is called when the module is
     executed as a script.
     """
+    import typer
+
+    app = typer.Typer()
+
+    @app.command()
+    def convert_all(
+        directory: str = typer.Argument(os.getcwd(), help="Directory containing HTML files")
+    ):
+        """Converts all HTML files in the given directory to Markdown and sorts them."""
+        convert_all_html_to_markdown(directory)
+
     app()
 
 
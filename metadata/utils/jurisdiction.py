@@ -3,7 +3,8 @@
 # Convert Canadian provincial/territorial jurisdiction shorthands to full names
 
 import re
-from django.utils.html import escape
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 # Define a dictionary to map jurisdiction codes to full names
 JURISDICTIONAL_MAPPING = {
@@ -418,6 +419,7 @@ COURT_LEVEL_MAPPING = {
 }
 
 
+@lru_cache(maxsize=None)
 def convert_jurisdiction(jurisdiction: str) -> str:
     """
     Anticipate lowercase two-letter jurisdiction code and return full name.
@@ -433,6 +435,7 @@ def convert_jurisdiction(jurisdiction: str) -> str:
 # Define a dictionary to map court level codes to full names
 
 
+@lru_cache(maxsize=None)
 def convert_court_level(court_level: str) -> str:
     """
     Anticipate lowercase two-letter court level code and return full name.
@@ -444,111 +447,298 @@ def convert_court_level(court_level: str) -> str:
     return COURT_LEVEL_MAPPING.get(court_level, court_level)
 
 
-def define_jurisprudential_network(urls):
+# Reverse indexes from full names back to codes. Several tribunals share a name (e.g. "Labour
+# Arbitration Awards"), so each name maps to every code that uses it, in mapping order.
+JURISDICTION_CODES_BY_NAME: Dict[str, str] = {
+    name: code for code, name in JURISDICTIONAL_MAPPING.items()
+}
+COURT_CODES_BY_NAME: Dict[str, Tuple[str, ...]] = {}
+for _code, _name in COURT_LEVEL_MAPPING.items():
+    COURT_CODES_BY_NAME[_name] = COURT_CODES_BY_NAME.get(_name, ()) + (_code,)
+
+
+def court_code_from_name(court_name: str, jurisdiction: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the court code for a full court name, e.g. "Court of Appeal for Saskatchewan" gives
+    "skca". Where several courts share the name, the jurisdiction code or full jurisdiction name
+    is used to choose between them.
+
+    Args:
+        court_name (str): The full court name.
+        jurisdiction (Optional[str]): The jurisdiction code ("sk") or name ("Saskatchewan").
+
+    Returns:
+        Optional[str]: The court code, or None if the name is unknown.
+    """
+
+    codes = COURT_CODES_BY_NAME.get(court_name)
+    if not codes:
+        return None
+    if len(codes) > 1 and jurisdiction:
+        prefix = JURISDICTION_CODES_BY_NAME.get(jurisdiction, jurisdiction.lower())
+        for code in codes:
+            if code.startswith(prefix):
+                return code
+    return codes[0]
+
+
+class CanLIIPath(NamedTuple):
+    """
+    A decoded CanLII document path. For decisions, the collection is the court code and the
+    year is the decision year; for legislation, the collection is the legislation type ("stat",
+    "regu") and the year is 0.
+    """
+
+    language: str
+    jurisdiction: str
+    collection: str
+    year: int
+    document_id: str
+    anchor: str
+    is_legislation: bool
+
+
+@lru_cache(maxsize=65536)
+def decode_canlii_path(url: str) -> Optional[CanLIIPath]:
+    """
+    Decodes a CanLII URL or data-path, e.g. "/en/sk/skca/doc/2019/2019skca12/2019skca12.html"
+    or "/en/ca/laws/stat/rsc-1985-c-c-46/latest/rsc-1985-c-c-46.html#sec276". Results are
+    cached by path, since frequently cited decisions appear in thousands of documents.
+
+    Args:
+        url (str): The full URL or the path.
+
+    Returns:
+        Optional[CanLIIPath]: The decoded path, or None if the path is not a CanLII document
+        path.
+    """
+
+    if "://" in url:
+        url = url.split("://", 1)[1]
+        url = url[url.find("/") :] if "/" in url else ""
+
+    path, _, anchor = url.partition("#")
+    parts = path.strip("/").split("/")
+
+    # Decisions: [language, jurisdiction, court, "doc", year, document, file]
+    # Legislation: [language, jurisdiction, "laws", type, document, version, file]
+    if len(parts) < 6:
+        return None
+
+    is_legislation = parts[2] == "laws"
+    if is_legislation and len(parts) < 7:
+        return None
+
+    if is_legislation:
+        collection, year = parts[3], 0
+    else:
+        collection, year = parts[2], int(parts[4]) if parts[4].isdigit() else 0
+
+    # The document ID is the file name without its extension, as in the primary key. Only the
+    # extension is removed: statute IDs such as "ss-2013-c-s-15.1" contain dots.
+    document_id = parts[-1] if len(parts) > 6 else parts[5]
+    if document_id.endswith(".html"):
+        document_id = document_id[: -len(".html")]
+
+    return CanLIIPath(
+        language=parts[0],
+        jurisdiction=parts[1].lower(),
+        collection=collection.lower(),
+        year=year,
+        document_id=document_id.replace("_smooth", ""),
+        anchor=anchor.replace("_smooth", ""),
+        is_legislation=is_legislation,
+    )
+
+
+class CaseEdge(NamedTuple):
+    """
+    A citation from one decision to another, decoded from a judgmentLinks data-path.
+    """
+
+    source: str
+    target: str
+    jurisdiction: str
+    court: str
+    year: int
+    path: str
+
+    @property
+    def url(self) -> str:
+        """The full CanLII URL of the cited decision."""
+        return f"https://www.canlii.org{self.path}"
+
+    @property
+    def court_level(self) -> str:
+        """The full name of the cited decision's court."""
+        return convert_court_level(self.court)
+
+
+class LegislationEdge(NamedTuple):
     """
-    Writes the URLs to a file.
+    A citation from a decision to a statute or regulation, decoded from a legislationLinks
+    data-path.
+    """
+
+    source: str
+    target: str
+    jurisdiction: str
+    path: str
+
+    @property
+    def url(self) -> str:
+        """The full CanLII URL of the cited legislation."""
+        return f"https://www.canlii.org{self.path}"
+
+    @property
+    def jurisdiction_name(self) -> str:
+        """The full name of the cited legislation's jurisdiction."""
+        return convert_jurisdiction(self.jurisdiction)
+
+    @property
+    def keys(self) -> List["LegislationKey"]:
+        """The statute provisions cited by this edge."""
+        return parse_legislation_key(self.target)
+
+
+def define_jurisprudential_network(urls: List[str], source: str = "") -> List[CaseEdge]:
+    """
+    Converts judgmentLinks data-paths into citation edges. Paths that cannot be decoded are
+    skipped. Anchor HTML is rendered by the template from the edge fields.
+
+    Args:
+        urls (List[str]): The data-paths, e.g. "/en/sk/skca/doc/2019/2019skca12/2019skca12.html".
+        source (str): The primary key of the citing decision.
+
+    Returns:
+        List[CaseEdge]: One edge per decodable path.
     """
 
-    # Initialize an empty list to store the dictionaries
     result_list = []
 
-    # Loop through the URLs
     for url in urls:
-        parts = url.split("/")  # Split the URL by "/"
-
-        # Check if there are enough parts to create the dictionary
-        if len(parts) >= 7:
-            # Create an HTML anchor tag with the text and URL
-            # Remove "_smooth" and ".html" from the primary key
-            data_dict = {
-                "primary_key": parts[6],
-                "jurisdiction": convert_jurisdiction(parts[2]),
-                "court_level": convert_court_level(parts[3]),
-                "year": parts[5],
-                "url": f"https://www.canlii.org{url}",  # Construct the full URL
-            }
-
-            # Escape the text to prevent HTML injection
-            escaped_text = escape(f"{data_dict['primary_key']}")
-
-            # Create the HTML anchor tag
-            anchor_tag = f'<a href="{data_dict["url"]}">{escaped_text}</a>'
+        decoded = decode_canlii_path(url)
 
+        # Skip paths that do not decode to a decision
+        if decoded is not None and not decoded.is_legislation:
             result_list.append(
-                f"{anchor_tag}: {data_dict['court_level']}, {data_dict['year']}"
+                CaseEdge(
+                    source=source,
+                    target=decoded.document_id,
+                    jurisdiction=decoded.jurisdiction,
+                    court=decoded.collection,
+                    year=decoded.year,
+                    path=url,
+                )
             )
-        else:
-            # Handle the case where there are not enough parts in the URL
-            result_list.append("None")
 
     return result_list
 
 
-def define_legislative_network(urls):
+def define_legislative_network(urls: List[str], source: str = "") -> List[LegislationEdge]:
     """
-    Writes the URLs to a file.
+    Converts legislationLinks data-paths into citation edges. Paths that cannot be decoded are
+    skipped. Anchor HTML is rendered by the template from the edge fields.
+
+    Args:
+        urls (List[str]): The data-paths, e.g.
+            "/en/ca/laws/stat/rsc-1985-c-c-46/latest/rsc-1985-c-c-46.html#sec276_smooth".
+        source (str): The primary key of the citing decision.
+
+    Returns:
+        List[LegislationEdge]: One edge per decodable path.
     """
 
-    # Initialize an empty list to store the dictionaries
     result_list = []
 
-    # Loop through the URLs
     for url in urls:
-        parts = url.split("/")  # Split the URL by "/"
-
-        # Check if there are enough parts to create the dictionary
-        if len(parts) >= 7:
-            # Create an HTML anchor tag with the text and URL
-            data_dict = {
-                "primary_key": parts[7].replace("_smooth", "").replace(".html", ""),
-                "jurisdiction": convert_jurisdiction(parts[2]),
-                "url": f"https://www.canlii.org{url}",  # Construct the full URL
-            }
+        decoded = decode_canlii_path(url)
 
-            # Escape the text to prevent HTML injection
-            escaped_text = escape(f"{data_dict['primary_key']}")
+        # Skip paths that do not decode to legislation
+        if decoded is not None and decoded.is_legislation:
+            target = decoded.document_id
+            if decoded.anchor:
+                target = f"{target}#{decoded.anchor}"
+            result_list.append(
+                LegislationEdge(
+                    source=source,
+                    target=target,
+                    jurisdiction=decoded.jurisdiction,
+                    path=url,
+                )
+            )
 
-            # Create the HTML anchor tag
-            anchor_tag = f'<a href="{data_dict["url"]}">{escaped_text}</a>'
+    return result_list
 
-            result_list.append(f"{anchor_tag}: {data_dict['jurisdiction']}")
-        else:
-            # Handle the case where there are not enough parts in the URL
-            result_list.append("None")
 
-    return result_list
+# Matches a CanLII legislation anchor such as "sec276", "sec276subsec1" or "sec718.2"
+LEGISLATION_ANCHOR_PATTERN = re.compile(
+    r"sec(?P<section>[0-9A-Za-z.]+?)(?:subsec(?P<subsection>[0-9A-Za-z.]+))?"
+)
 
 
-def format_legislation_keys(legislation_key):
+class LegislationKey(NamedTuple):
     """
-    Formats the legislation keys for display.
+    A cited statute provision. The section and subsection are empty strings when the citation
+    is to the statute as a whole or to a whole section.
     """
-    # Split the string by "#" if it exists
-    parts = legislation_key.split("#")
 
-    if len(parts) == 2:
-        # If there are two parts, return the first part
-        legislation = parts[0]
-        sections = parts[1]
+    statute: str
+    section: str
+    subsection: str
 
-        # Replace "sec" with "s "
-        sections = sections.replace("sec", "s ")
 
-        # Run a conditional if the parts[1] contains the string "subsec"
-        if "subsec" in sections:
-            # Split the string by "subsec"
-            subsec_parts = sections.split("subsec")
+def parse_legislation_key(legislation_key: str) -> List[LegislationKey]:
+    """
+    Parses a legislation key, e.g. "rsc-1985-c-c-46#sec276subsec1", into the provisions it
+    cites. Several provisions may be joined with "---"; a provision without a statute of its own
+    belongs to the statute before it.
 
-            # Run a loop to add a period to the end of each element
-            for i in range(len(subsec_parts)):
-                subsec_parts[i] = subsec_parts[i] + "."
+    Args:
+        legislation_key (str): The legislation key from a LegislationEdge target.
 
-            # Join the elements with "subsec"
-            sections = "subsec".join(subsec_parts)
+    Returns:
+        List[LegislationKey]: The cited provisions, in order and without duplicates.
+    """
 
-    else:
-        legislation = legislation_key
+    keys = []
+    statute = ""
+    for part in legislation_key.split("---"):
+        part_statute, _, anchor = part.partition("#")
+        part_statute = part_statute.replace("_smooth", "").replace(".html", "").strip()
+        if part_statute and not LEGISLATION_ANCHOR_PATTERN.fullmatch(part_statute):
+            statute = part_statute
+        elif part_statute:
+            # The part is a bare anchor, e.g. the "sec277" in "...#sec276---sec277"
+            anchor = part_statute
+
+        anchor_match = LEGISLATION_ANCHOR_PATTERN.fullmatch(anchor.replace("_smooth", ""))
+        if anchor_match:
+            key = LegislationKey(
+                statute, anchor_match.group("section"), anchor_match.group("subsection") or ""
+            )
+        else:
+            key = LegislationKey(statute, "", "")
 
-    legislation = legislation.replace("---", " & ")
+        if statute and key not in keys:
+            keys.append(key)
+
+    return keys
+
+
+def format_legislation_keys(legislation_key: str) -> str:
+    """
+    Formats a legislation key for display, e.g. "rsc-1985-c-c-46#sec276subsec1" becomes
+    "rsc-1985-c-c-46, s 276(1)". Several provisions are joined with " & ".
+    """
+
+    formatted = []
+    for key in parse_legislation_key(legislation_key):
+        if not key.section:
+            formatted.append(key.statute)
+        elif key.subsection:
+            formatted.append(f"{key.statute}, s {key.section}({key.subsection})")
+        else:
+            formatted.append(f"{key.statute}, s {key.section}")
 
-    pass
+    return " & ".join(formatted)
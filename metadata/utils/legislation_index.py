@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+"""
+Inverted index from cited statute provisions to the decisions that cite them.
+
+Every legislationLinks citation is parsed into (statute, section, subsection) keys and posted
+under three provision keys: the statute ("rsc-1985-c-c-46"), the section
+("rsc-1985-c-c-46 s 276") and, where given, the subsection ("rsc-1985-c-c-46 s 276(1)"). The
+postings are stored as CSR arrays like the citation graph, so a query such as "every SKCA
+decision citing s. 276 of the Criminal Code" is an array slice plus a court-code mask, and the
+index can be memory-mapped from disk.
+"""
+
+import json
+import os
+from array import array
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from .citation_graph import INDEX_DTYPE, NODE_DTYPE, DecisionTable, build_csr, save_array
+from .jurisdiction import LegislationEdge, LegislationKey
+from .vocabulary import Vocabulary
+
+
+def provision_keys(key: LegislationKey) -> List[str]:
+    """
+    Returns the provision keys a citation is posted under, from the statute down to the most
+    specific provision cited.
+    """
+
+    keys = [key.statute]
+    if key.section:
+        keys.append(f"{key.statute} s {key.section}")
+        if key.subsection:
+            keys.append(f"{key.statute} s {key.section}({key.subsection})")
+    return keys
+
+
+class LegislationIndex:
+    """
+    Maps statute provisions to the decisions citing them.
+
+    Example:
+        index = LegislationIndex()
+        index.add_decision("2019skca12", "skca", 2019, context["legislation_links"])
+        index.lookup("rsc-1985-c-c-46", "276", court="skca")
+        index.save("legislation_index/")
+    """
+
+    def __init__(self):
+        self.decisions = DecisionTable()
+        self.provisions = Vocabulary()
+        self.indptr = np.zeros(1, dtype=INDEX_DTYPE)
+        self.indices = np.empty(0, dtype=NODE_DTYPE)
+        self._pending_provisions = array("i")
+        self._pending_decisions = array("i")
+
+    def add_decision(
+        self, primary_key: str, court: str, year: int, edges: Iterable[LegislationEdge]
+    ) -> int:
+        """
+        Adds the legislation citations of a decision to the index.
+
+        Args:
+            primary_key (str): The citing decision's primary key.
+            court (str): The citing decision's court code.
+            year (int): The citing decision's year.
+            edges (Iterable[LegislationEdge]): The decision's legislationLinks edges.
+
+        Returns:
+            int: The ID of the decision in the index's decision table.
+        """
+
+        decision = self.decisions.add(primary_key, court, year)
+        for edge in edges:
+            for key in edge.keys:
+                for provision in provision_keys(key):
+                    self._pending_provisions.append(self.provisions.add(provision))
+                    self._pending_decisions.append(decision)
+        return decision
+
+    def compact(self) -> None:
+        """
+        Merges buffered postings into the CSR arrays. Duplicate postings are removed.
+        """
+
+        provision_count = len(self.provisions)
+        if not self._pending_provisions and len(self.indptr) == provision_count + 1:
+            return
+
+        existing_provisions = np.repeat(
+            np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr)
+        )
+        provisions = np.concatenate(
+            [existing_provisions, np.frombuffer(self._pending_provisions, dtype=np.int32)]
+        )
+        decisions = np.concatenate(
+            [
+                np.asarray(self.indices, dtype=np.int64),
+                np.frombuffer(self._pending_decisions, dtype=np.int32),
+            ]
+        )
+
+        self.indptr, self.indices = build_csr(
+            provisions, decisions, provision_count, len(self.decisions)
+        )
+        self._pending_provisions = array("i")
+        self._pending_decisions = array("i")
+
+    def decision_ids(
+        self,
+        statute: str,
+        section: str = "",
+        subsection: str = "",
+        court: Optional[str] = None,
+        years: Optional[range] = None,
+    ) -> np.ndarray:
+        """
+        Returns the IDs of the decisions citing a provision, optionally filtered by court and
+        year. See lookup().
+        """
+
+        provision = provision_keys(LegislationKey(statute, section, subsection))[-1]
+        code = self.provisions.code(provision)
+        if code < 0:
+            return np.empty(0, dtype=NODE_DTYPE)
+
+        self.compact()
+        ids = np.asarray(self.indices[self.indptr[code] : self.indptr[code + 1]])
+
+        if court is not None:
+            court_code = self.decisions.court_codes.code(court.lower())
+            ids = ids[self.decisions.courts_of(ids) == court_code]
+        if years is not None:
+            decision_years = self.decisions.years_of(ids)
+            ids = ids[(decision_years >= years.start) & (decision_years < years.stop)]
+
+        return ids
+
+    def lookup(
+        self,
+        statute: str,
+        section: str = "",
+        subsection: str = "",
+        court: Optional[str] = None,
+        years: Optional[range] = None,
+    ) -> List[str]:
+        """
+        Returns the primary keys of the decisions citing a provision.
+
+        Args:
+            statute (str): The statute ID, e.g. "rsc-1985-c-c-46".
+            section (str): The section, e.g. "276". Leave empty for any citation of the statute.
+            subsection (str): The subsection, e.g. "1". Leave empty for any citation of the
+                section.
+            court (Optional[str]): Only return decisions of this court, e.g. "skca".
+            years (Optional[range]): Only return decisions from these years, e.g.
+                range(2015, 2024).
+
+        Returns:
+            List[str]: The citing decisions' primary keys, ordered by ID.
+        """
+
+        keys = self.decisions.keys
+        ids = self.decision_ids(statute, section, subsection, court, years)
+        return [keys[decision] for decision in ids.tolist()]
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the index to a directory of .npy files plus the decision and provision tables.
+        """
+
+        self.compact()
+        os.makedirs(directory, exist_ok=True)
+        save_array(os.path.join(directory, "provision_indptr.npy"), self.indptr)
+        save_array(os.path.join(directory, "provision_indices.npy"), self.indices)
+        with open(os.path.join(directory, "provisions.json"), "w", encoding="utf-8") as file:
+            json.dump(list(self.provisions), file, ensure_ascii=False)
+        self.decisions.save(directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "LegislationIndex":
+        """
+        Loads an index saved with save(), memory-mapping the posting arrays by default.
+        """
+
+        index = cls()
+        mmap_mode = "r" if mmap else None
+        index.indptr = np.load(
+            os.path.join(directory, "provision_indptr.npy"), mmap_mode=mmap_mode
+        )
+        index.indices = np.load(
+            os.path.join(directory, "provision_indices.npy"), mmap_mode=mmap_mode
+        )
+        with open(os.path.join(directory, "provisions.json"), "r", encoding="utf-8") as file:
+            index.provisions = Vocabulary(json.load(file))
+        index.decisions = DecisionTable.load(directory)
+        return index
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Resolves parallel citations to the canonical decision they refer to.
+
+Every decision's neutral citation and "other citations" are parsed and encoded as int64 keys
+with a CitationCodec, which also normalizes them ("Sask. R." and "Sask R" encode the same way).
+The index is a sorted array of keys with a parallel array of decision IDs, so a batch of
+citation strings is resolved with one np.searchsorted call. Both arrays are saved as .npy files
+and can be memory-mapped.
+"""
+
+import os
+from array import array
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from .citation_graph import NODE_DTYPE, DecisionTable, save_array
+from .citations import MISSING_KEY, CitationCodec
+from .vocabulary import Vocabulary
+
+
+class ParallelCitationIndex:
+    """
+    Maps normalized neutral and reporter citations to decision primary keys.
+
+    Example:
+        index = ParallelCitationIndex()
+        index.add_decision("2016skca1", "2016 SKCA 1", ["(2016) 480 Sask R 1"], "skca", 2016)
+        index.resolve(["(2016) 480 Sask. R. 1", "[1990] 1 SCR 30"])
+        # ["2016skca1", None]
+    """
+
+    def __init__(self, codec: Optional[CitationCodec] = None):
+        self.codec = codec or CitationCodec()
+        self.decisions = DecisionTable()
+        self.keys = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0, dtype=NODE_DTYPE)
+        self._pending_keys = array("q")
+        self._pending_values = array("i")
+
+    def __len__(self) -> int:
+        self.compact()
+        return len(self.keys)
+
+    def add_decision(
+        self,
+        primary_key: str,
+        citation: str,
+        other_citations: Iterable[str],
+        court: str = "",
+        year: int = 0,
+    ) -> int:
+        """
+        Adds a decision's neutral citation and parallel citations to the index.
+
+        Args:
+            primary_key (str): The decision's primary key.
+            citation (str): The decision's neutral citation.
+            other_citations (Iterable[str]): The decision's reporter citations, as produced by
+                extract_other_citations().
+            court (str): The decision's court code.
+            year (int): The decision's year.
+
+        Returns:
+            int: The number of citations indexed for the decision.
+        """
+
+        decision = self.decisions.add(primary_key, court, year)
+        indexed = 0
+        for text in [citation, *other_citations]:
+            key = self.codec.key(text)
+            if key != MISSING_KEY:
+                self._pending_keys.append(key)
+                self._pending_values.append(decision)
+                indexed += 1
+        return indexed
+
+    def compact(self) -> None:
+        """
+        Merges buffered citations into the sorted arrays. If a citation was added for more than
+        one decision, the most recently added decision wins.
+        """
+
+        if not self._pending_keys:
+            return
+
+        keys = np.concatenate([self.keys, np.frombuffer(self._pending_keys, dtype=np.int64)])
+        values = np.concatenate(
+            [self.values, np.frombuffer(self._pending_values, dtype=np.int32)]
+        )
+
+        # A stable sort keeps insertion order within equal keys; keep the last of each run
+        order = np.argsort(keys, kind="stable")
+        keys, values = keys[order], values[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+
+        self.keys = keys[last]
+        self.values = values[last].astype(NODE_DTYPE, copy=False)
+        self._pending_keys = array("q")
+        self._pending_values = array("i")
+
+    def resolve_ids(self, citations: Iterable[str]) -> np.ndarray:
+        """
+        Resolves citation strings to decision IDs, with -1 for citations not in the index.
+        """
+
+        self.compact()
+        query = self.codec.encode_many(citations, grow=False)
+        if not len(self.keys):
+            return np.full(len(query), -1, dtype=NODE_DTYPE)
+
+        positions = np.searchsorted(self.keys, query)
+        positions = np.minimum(positions, len(self.keys) - 1)
+        found = (self.keys[positions] == query) & (query != MISSING_KEY)
+        return np.where(found, self.values[positions], -1).astype(NODE_DTYPE)
+
+    def resolve(self, citations: Iterable[str]) -> List[Optional[str]]:
+        """
+        Resolves a batch of citation strings to canonical primary keys.
+
+        Args:
+            citations (Iterable[str]): Neutral or reporter citations, in any normalization.
+
+        Returns:
+            List[Optional[str]]: The primary key of each citation's decision, or None if the
+            citation is not in the index.
+        """
+
+        keys = self.decisions.keys
+        return [
+            keys[decision] if decision >= 0 else None
+            for decision in self.resolve_ids(citations).tolist()
+        ]
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the index, its decision table and its codec vocabularies to a directory.
+        """
+
+        self.compact()
+        os.makedirs(directory, exist_ok=True)
+        save_array(os.path.join(directory, "citation_keys.npy"), self.keys)
+        save_array(os.path.join(directory, "citation_values.npy"), self.values)
+        self.codec.courts.save(os.path.join(directory, "citation_courts.json"))
+        self.codec.series.save(os.path.join(directory, "citation_series.json"))
+        self.decisions.save(directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ParallelCitationIndex":
+        """
+        Loads an index saved with save(), memory-mapping the key and value arrays by default.
+        """
+
+        codec = CitationCodec(
+            courts=Vocabulary.load(os.path.join(directory, "citation_courts.json")),
+            series=Vocabulary.load(os.path.join(directory, "citation_series.json")),
+        )
+        index = cls(codec)
+        mmap_mode = "r" if mmap else None
+        index.keys = np.load(os.path.join(directory, "citation_keys.npy"), mmap_mode=mmap_mode)
+        index.values = np.load(
+            os.path.join(directory, "citation_values.npy"), mmap_mode=mmap_mode
+        )
+        index.decisions = DecisionTable.load(directory)
+        return index
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""
+Single-pass scanner for citations in the body of a decision.
+
+CanLII's judgmentLinks div lists the cases a decision cites but not where it cites them. The
+scanner runs one precompiled alternation over the markdown main_content and reports every
+neutral citation, reporter citation and statute reference with the paragraph it appears in.
+Paragraph markers ("[12]" at the start of a line) are part of the same alternation, so the
+document is read once and the cost grows linearly with its length.
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+from .citations import Citation, parse_citation
+
+# Each alternative is a named group; the name of the group that matched is the hit's kind.
+# html2text wraps long lines, so citations may contain line breaks. The reporter alternative is
+# tried before the paragraph marker so that a wrapped "[1990] 1 SCR 30" is not read as paragraph
+# 1990. A section's "of the <Act>" tail ends on a capitalized word and stops before a statute
+# citation, so "s. 276 of the Criminal Code and RSC 1985, c C-46" is two hits. The alternatives
+# avoid nested unbounded quantifiers so that failed matches stay cheap.
+BODY_CITATION_PATTERN = re.compile(
+    r"(?P<neutral>\b(?:18|19|20)\d{2}\s+(?:CanLII|[A-Z]{2,8})\s+\d{1,6}\b)"
+    r"|(?P<reporter>[\[(](?:18|19|20)\d{2}[\])],?\s+(?:\d{1,4}\s+)?"
+    r"[A-Z][A-Za-z.&']*(?:\s+[A-Z][A-Za-z.&']*){0,3}"
+    r"(?:\s*\((?:2d|3d|[4-9]th)\))?\s+\d{1,6}\b)"
+    r"|(?m:^\[(?P<paragraph>\d{1,4})\])"
+    r"|(?P<statute>\b(?:RS|S)[A-Z]{0,3}\s+(?:18|19|20)\d{2},\s*c\.?\s*[A-Z0-9][\w-]*(?:\.\d+)*)"
+    r"|(?P<section>\b(?:ss?\.|sections?)\s*\d+(?:\.\d+)*(?:\([0-9a-z.]+\))*"
+    r"(?:\s+of\s+the\s+[A-Z][\w']*(?:(?:\s+(?:of|and|the|on|for)){0,2}"
+    r"\s+(?!(?:RS|S)[A-Z]{0,3}\s+\d{4},)[A-Z][\w']*){0,7})?)"
+)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+HIT_KINDS = ["neutral", "reporter", "statute", "section"]
+
+
+class CitationHit(NamedTuple):
+    """
+    A citation found in the body of a decision. The paragraph is 0 for text before the first
+    numbered paragraph, and the offset is the position of the hit in main_content.
+    """
+
+    kind: str
+    text: str
+    paragraph: int
+    offset: int
+
+    @property
+    def citation(self) -> Optional[Citation]:
+        """The parsed citation, for neutral and reporter hits."""
+        if self.kind in ("neutral", "reporter"):
+            return parse_citation(self.text)
+        return None
+
+
+def scan_citations(main_content: str) -> List[CitationHit]:
+    """
+    Finds every neutral citation, reporter citation and statute reference in the body of a
+    decision.
+
+    Args:
+        main_content (str): The markdown main content returned by process_markdown().
+
+    Returns:
+        List[CitationHit]: The hits in document order.
+    """
+
+    hits = []
+    paragraph = 0
+    for match in BODY_CITATION_PATTERN.finditer(main_content):
+        kind = match.lastgroup
+        if kind == "paragraph":
+            paragraph = int(match.group("paragraph"))
+        else:
+            # Collapse the line breaks html2text inserts inside long citations
+            text = WHITESPACE_PATTERN.sub(" ", match.group(kind))
+            hits.append(CitationHit(kind, text, paragraph, match.start()))
+
+    return hits
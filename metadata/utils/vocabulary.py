@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+"""
+Corpus-level vocabularies for the small set of strings that repeat across every decision:
+jurisdictions, courts, judicial roles, party roles and judge surnames.
+
+Each vocabulary interns its values so that a corpus run keeps a single copy of every unique
+string, and assigns each value a stable integer code so that columnar outputs can store the
+codes instead of the strings.
+"""
+
+import json
+import sys
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
+
+# NumPy is only needed for encode(), so it is imported there rather than by every web worker
+if TYPE_CHECKING:
+    import numpy as np
+
+from .jurisdiction import COURT_LEVEL_MAPPING, JURISDICTIONAL_MAPPING
+
+# Code returned for values that are not in a vocabulary
+MISSING_CODE = -1
+
+# Context keys holding lists of (judge, role) tuples produced by define_judicial_aggregate()
+JUDICIAL_ROLE_FIELDS = [
+    "written_reasons",
+    "majority_reasons",
+    "minority_reasons",
+    "dissenting_reasons",
+    "concurring_reasons",
+    "concurring",
+    "dissenting",
+]
+
+# Maps the role labels of a decision's headnote, e.g. "majority reasons by", to the standardized
+# roles that the rule sets record with each judge and the role vocabulary interns
+STANDARDIZED_ROLES = {
+    "written reasons by": "reasons",
+    "majority reasons by": "reasons",
+    "majority reasons": "reasons",
+    "dissenting reasons by": "dissenting reasons",
+    "dissenting reasons": "dissenting reasons",
+    "minority reasons by": "dissenting reasons",
+    "minority reasons": "dissenting reasons",
+    "concurring reasons by": "concurring reasons",
+    "concurring reasons": "concurring reasons",
+    "in concurrence": "concurring",
+    "in dissent": "dissenting",
+    "by": "reasons",
+}
+
+
+class Vocabulary:
+    """
+    An append-only mapping between interned strings and integer codes. Codes are assigned in
+    insertion order and never change, so codes written to disk stay valid as the vocabulary grows.
+    """
+
+    def __init__(self, values: Iterable[str] = ()):
+        self._codes: Dict[str, int] = {}
+        self._values: List[str] = []
+        for value in values:
+            self.add(value)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, value: object) -> bool:
+        return value in self._codes
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def add(self, value: str) -> int:
+        """
+        Adds a value to the vocabulary if it is not already present.
+
+        Args:
+            value (str): The value to add.
+
+        Returns:
+            int: The code of the value.
+        """
+
+        code = self._codes.get(value)
+        if code is None:
+            value = sys.intern(value)
+            code = len(self._values)
+            self._codes[value] = code
+            self._values.append(value)
+        return code
+
+    def intern(self, value: str) -> str:
+        """
+        Returns the vocabulary's single copy of a value, adding it if necessary.
+        """
+
+        return self._values[self.add(value)]
+
+    def code(self, value: str) -> int:
+        """
+        Returns the code of a value without adding it, or MISSING_CODE if it is unknown.
+        """
+
+        return self._codes.get(value, MISSING_CODE)
+
+    def value(self, code: int) -> Optional[str]:
+        """
+        Returns the value for a code, or None for MISSING_CODE.
+        """
+
+        if code == MISSING_CODE:
+            return None
+        return self._values[code]
+
+    def encode(self, values: Iterable[Optional[str]], grow: bool = True) -> "np.ndarray":
+        """
+        Encodes a column of values as an array of integer codes.
+
+        Args:
+            values (Iterable[Optional[str]]): The values to encode. None is encoded as
+                MISSING_CODE.
+            grow (bool): Whether unknown values are added to the vocabulary. If False, unknown
+                values are encoded as MISSING_CODE.
+
+        Returns:
+            np.ndarray: An int32 array of codes.
+        """
+
+        import numpy as np
+
+        lookup = self.add if grow else self.code
+        return np.fromiter(
+            (MISSING_CODE if value is None else lookup(value) for value in values),
+            dtype=np.int32,
+        )
+
+    def decode(self, codes: Iterable[int]) -> List[Optional[str]]:
+        """
+        Decodes an array of integer codes back into values.
+        """
+
+        return [self.value(int(code)) for code in codes]
+
+    def save(self, file_path: str) -> None:
+        """
+        Saves the vocabulary to a JSON file. The list position of each value is its code.
+        """
+
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump(self._values, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, file_path: str) -> "Vocabulary":
+        """
+        Loads a vocabulary saved with save().
+        """
+
+        with open(file_path, "r", encoding="utf-8") as file:
+            return cls(json.load(file))
+
+
+class CorpusVocabulary:
+    """
+    The set of vocabularies shared by a corpus run. The jurisdiction, court and role
+    vocabularies are prefilled from the lookup tables used by the rule sets, so their codes are
+    the same from run to run. Judge surnames are added as they are encountered.
+    """
+
+    FIELDS = [
+        "jurisdiction",
+        "jurisdiction_code",
+        "court",
+        "court_code",
+        "role",
+        "party_role",
+        "judge",
+    ]
+
+    def __init__(self):
+        # Imported here because the rule sets themselves use the utils modules
+        from ..rules.skca_2015 import PARTY_ROLES
+
+        self.jurisdiction = Vocabulary(JURISDICTIONAL_MAPPING.values())
+        self.jurisdiction_code = Vocabulary(JURISDICTIONAL_MAPPING.keys())
+        self.court = Vocabulary(COURT_LEVEL_MAPPING.values())
+        self.court_code = Vocabulary(COURT_LEVEL_MAPPING.keys())
+        self.role = Vocabulary(STANDARDIZED_ROLES.values())
+        self.party_role = Vocabulary(PARTY_ROLES)
+        self.judge = Vocabulary()
+
+    def __getitem__(self, field: str) -> Vocabulary:
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def intern_context(self, context: Dict[str, Any]) -> None:
+        """
+        Replaces the jurisdiction, court, judge and role strings in an extraction context with
+        their interned copies, so that every decision in a run shares the same string objects.
+
+        Args:
+            context (Dict[str, Any]): The context dictionary populated by the rule sets.
+        """
+
+        if isinstance(context.get("jurisdiction"), str):
+            context["jurisdiction"] = self.jurisdiction.intern(context["jurisdiction"])
+        if isinstance(context.get("court_level"), str):
+            context["court_level"] = self.court.intern(context["court_level"])
+
+        if isinstance(context.get("before"), list):
+            context["before"] = [self.judge.intern(judge) for judge in context["before"]]
+
+        for field in JUDICIAL_ROLE_FIELDS:
+            if isinstance(context.get(field), list):
+                context[field] = [
+                    (self.judge.intern(judge), self.role.intern(role))
+                    for judge, role in context[field]
+                ]
+
+        if isinstance(context.get("parties"), list):
+            context["parties"] = [
+                (name, self.party_role.intern(role)) for name, role in context["parties"]
+            ]
+
+    def encode_columns(
+        self, records: List[Dict[str, Any]], columns: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """
+        Builds a columnar view of a list of records, storing vocabulary columns as integer codes.
+
+        Args:
+            records (List[Dict[str, Any]]): The records to encode, e.g. one context per decision.
+            columns (Dict[str, str]): Maps each record key to the vocabulary field used to encode
+                it. Keys mapped to an empty string are kept as plain lists.
+
+        Returns:
+            Dict[str, Any]: A dictionary of columns, with an int32 array for every encoded column.
+        """
+
+        result = {}
+        for key, field in columns.items():
+            values = [record.get(key) for record in records]
+            result[key] = self[field].encode(values) if field else values
+        return result
+
+    def save(self, directory: str) -> None:
+        """
+        Saves every vocabulary to <directory>/<field>.json.
+        """
+
+        for field in self.FIELDS:
+            self[field].save(f"{directory}/{field}.json")
+
+    @classmethod
+    def load(cls, directory: str) -> "CorpusVocabulary":
+        """
+        Loads a corpus vocabulary saved with save().
+        """
+
+        vocabulary = cls()
+        for field in cls.FIELDS:
+            setattr(vocabulary, field, Vocabulary.load(f"{directory}/{field}.json"))
+        return vocabulary
+
+
+_CORPUS_VOCABULARY = None
+
+
+def get_corpus_vocabulary() -> CorpusVocabulary:
+    """
+    Returns the corpus vocabulary shared by the current process.
+    """
+
+    global _CORPUS_VOCABULARY
+    if _CORPUS_VOCABULARY is None:
+        _CORPUS_VOCABULARY = CorpusVocabulary()
+    return _CORPUS_VOCABULARY
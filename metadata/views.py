@@ -2,38 +2,58 @@
 Django views for the basic canlii_analytics app.
 """
 
-import re
 import os
-from django.shortcuts import render
+from concurrent.futures.process import BrokenProcessPool
+from functools import wraps
+from typing import Optional
 
-from .utils.html_to_markdown_canlii import (
-    convert_file,
-    html_to_markdown,
-    refine_markdown,
-)
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import DatabaseError
+from django.db.models import Count
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import etag, require_GET
 
-from .utils.markdown import process_markdown
+from .utils.html_to_markdown_canlii import convert_file
 
-from .rules.skca_2003 import skca_2003_instructions
-from .rules.skca_2015 import skca_2015_instructions
-from .rules.general import extract_general_metadata
+from .cache import (
+    cached_extract_decision,
+    cached_extract_decision_file,
+    document_digest,
+    file_digest,
+    get_cached_result,
+    get_result_cache,
+    result_cache_key,
+    result_etag,
+)
+from .metrics import read_snapshots, record_cache_lookups, render_metrics, write_snapshot
+from .models import JobDocument
+from .pipeline import PoolSaturated, extract_decision, extract_decision_file, get_extraction_pool
+from .profiling import PROFILE_PATH_KEY, PROFILERS, profiled
+from .utils.jurisdiction import decode_canlii_path
+from .utils.vocabulary import get_corpus_vocabulary
 
 
 def save_file(request, submitted_text, context, url):
     """
-    Saves the file to disk. If no file path is provided, the default file path is used.
+    Saves the file to disk. submitted_text is either the pasted page source or the uploaded
+    file. If no file path is provided, the default file path is used.
     Future versions will save the output as a JSON file, rather than saving HTML/Markdown files
     to disk.
     """
     file_path = request.POST.get("filePath")
+    decoded_url = decode_canlii_path(url)
+    primary_key = decoded_url.document_id if decoded_url else context.get("primary_key", "")
+    if not file_path and decoded_url is None:
+        context["message"] = "Could not determine a file path from the document URL."
+        return render(request, "index.html", context)
     if not file_path:
-        jurisdiction = url.split("/")[4]
-        court_level = url.split("/")[5]
-        decision_year = url.split("/")[7]
-        primary_key = url.split("/")[8]
         file_path = (
-            f"../canlii_data/{jurisdiction}/"
-            f"{court_level}/{decision_year}/"
+            f"../canlii_data/{decoded_url.jurisdiction}/"
+            f"{decoded_url.collection}/{decoded_url.year}/"
             f"{primary_key}/{primary_key}.html"
         )
 
@@ -48,8 +68,14 @@ def save_file(request, submitted_text, context, url):
 
     # Save the HTML file
     try:
-        with open(file_path, "w", encoding="utf-8") as file:
-            file.write(submitted_text)
+        if isinstance(submitted_text, str):
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write(submitted_text)
+        else:
+            # An uploaded page source, copied from its temporary file in chunks
+            with open(file_path, "wb") as file:
+                for chunk in submitted_text.chunks():
+                    file.write(chunk)
         context["file_saved"] = True
         context["file_path"] = file_path
         context["message"] = "File written."
@@ -68,71 +94,232 @@ def save_file(request, submitted_text, context, url):
     return render(request, "index.html", context)
 
 
-def process_main_content(main_content):
+# Links rendered with the page; the rest are loaded on demand from api/links/
+DEFAULT_LINKS_PAGE_SIZE = 50
+
+
+def paginate_links(context, digest):
+    """
+    Trims the case and legislation links rendered with the page to the first page of each, so
+    that the page size does not grow with the number of cited documents. The template loads
+    the remaining links from the links endpoint using the document digest.
+    """
+
+    page_size = getattr(settings, "METADATA_LINKS_PAGE_SIZE", DEFAULT_LINKS_PAGE_SIZE)
+    context["document_digest"] = digest
+    context["links_page_size"] = page_size
+    for field in ("case_links", "legislation_links"):
+        links = context.get(field) or []
+        context[f"{field}_total"] = len(links)
+        context[field] = links[:page_size]
+
+
+def finish_extraction(request, submitted_text, context, digest):
     """
-    Processes the main content of the markdown file.
+    The steps that stay in the web process after extraction: saving the file to disk,
+    interning the shared strings and trimming the links to their first page.
     """
 
-    # Split the main_content string whenever the pattern "\n__\n" is found
-    # This will split the main_content into paragraphs
-    paragraphs = main_content.split("\n__\n")
-    
-    for paragraph in paragraphs:
-        # Remove any leading or trailing whitespace
-        paragraph = paragraph.strip()
-        # Remove any leading or trailing newlines
-        paragraph = paragraph.replace("\n", " ")
+    paginate_links(context, digest)
 
-        # Replace "]               " with "] "
-        paragraph = re.sub(r"\]\s+", "] ", paragraph)
+    # Save the file to disk if the saveFile checkbox is checked
+    if "saveFile" in request.POST:  # Check if the save file box is checked
+        save_file(request, submitted_text, context, context.get("url", ""))
+
+    # Share one copy of the jurisdiction, court, judge and role strings across decisions
+    get_corpus_vocabulary().intern_context(context)
+
+
+def stream_uploads_to_disk(view):
+    """
+    Makes a view write uploaded files straight to a temporary file in chunks, whatever their
+    size, so that the page source of a large decision is never held in request memory.
+
+    Upload handlers have to be set before the request body is read, and the CSRF middleware
+    reads it before the view runs, so the view is exempted from the middleware and protected
+    again once the handlers are in place.
+    """
+
+    protected_view = csrf_protect(view)
+
+    if iscoroutinefunction(view):
+
+        async def wrapper(request, *args, **kwargs):
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+            return await protected_view(request, *args, **kwargs)
+
+    else:
+
+        def wrapper(request, *args, **kwargs):
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+            return protected_view(request, *args, **kwargs)
+
+    return csrf_exempt(wraps(view)(wrapper))
+
+
+@require_GET
+@etag(lambda request, digest: result_etag(digest))
+def result(request, digest):
+    """
+    The result page of a document that has already been submitted, addressed by its digest.
+    The page only depends on the document and the rule-set version, so browsers revalidate it
+    with If-None-Match and get 304 Not Modified while it is unchanged.
+    """
+
+    context = get_cached_result(digest)
+    if context is None:
+        context = {
+            "message": "This result is no longer cached. Please submit the page source again."
+        }
+        return render(request, "index.html", context, status=404)
+
+    get_corpus_vocabulary().intern_context(context)
+    paginate_links(context, digest)
+    return render(request, "index.html", context)
 
 
+def requested_profiler(request) -> Optional[str]:
+    """
+    Returns the profiler to extract a submission under: the one named by the X-Metadata-Profile
+    request header ("cprofile" or "sampling"; any other value but "0" picks cProfile) when the
+    METADATA_PROFILE_HEADER setting allows it, otherwise the METADATA_PROFILE setting, which
+    is None unless every submission is to be profiled.
+    """
+
+    header = request.headers.get("X-Metadata-Profile", "0")
+    if header != "0" and getattr(settings, "METADATA_PROFILE_HEADER", False):
+        return header if header in PROFILERS else "cprofile"
+    return getattr(settings, "METADATA_PROFILE", None)
+
+
+def add_profile_header(response, profile_path: Optional[str]):
+    """
+    Names the profile written for the response's decision, if any, in X-Metadata-Profile-File.
+    The profile itself stays on the server, in METADATA_PROFILE_DIR.
+    """
+
+    if profile_path is not None:
+        response["X-Metadata-Profile-File"] = os.path.basename(profile_path)
+    return response
+
+
+@stream_uploads_to_disk
 def index(request):
     """
-    The main view for the canlii_analytics app.
+    The main view for the canlii_analytics app. The page source is either pasted into the
+    textfield or uploaded as the sourcefile; an upload is extracted from its temporary file.
     """
     context = {}
+    profile_path = None
     if request.method == "POST":
-        submitted_text = request.POST.get("textfield")
-
-        # Extract general metadata from HTML using the general rule set
-        extract_general_metadata(submitted_text, context)
-
-        # Save the file to disk if the saveFile checkbox is checked
-        if "saveFile" in request.POST:  # Check if the save file box is checked
-            save_file(request, submitted_text, context, context.get("url", ""))
-
-        # Create a markdown file for jurisdiction-specific analysis
-        markdown_content = html_to_markdown(submitted_text)
-        refined_markdown_content = refine_markdown(markdown_content)
-
-        # Extract the headnote, file content and assign to context
-        metadata_lines, main_content = process_markdown(refined_markdown_content)
-        process_main_content(main_content)
-        context["headnote"] = metadata_lines
-
-        # Check to see if any special rules apply
-        # Saskatchewan Court of Appeal 2015 rules
-        context["rules"] = "default"
-        if (
-            context["jurisdiction"] == "Saskatchewan"
-            and int(context["decision_year"]) >= 2016
-        ):
-            skca_2015_instructions(context, metadata_lines)
-            context["rules"] = "skca_2015"
-
-        if context["jurisdiction"] == "Saskatchewan" and int(context["decision_year"]) == 2015:
-            context["rules"] = "skca_2003, skca_2015"
-            skca_2015_instructions(context, metadata_lines)
-            # Check if 'before' section is empty. If so, use the 2003 rules
-            if not context["before"]:
-                skca_2003_instructions(context, metadata_lines)
-                context["rules"] = "skca_2003"
+        upload = request.FILES.get("sourcefile")
+        profiler = requested_profiler(request)
+
+        # Run the general and jurisdiction-specific rule sets on the submitted HTML, unless the
+        # same HTML has already been processed. A profiled submission is always extracted, so
+        # that there is something to profile, and refreshes the cached result.
+        if upload is not None:
+            submitted_text = upload
+            digest = file_digest(upload.temporary_file_path())
+            if profiler is None:
+                context = cached_extract_decision_file(upload.temporary_file_path(), digest)
+            else:
+                context = profiled(extract_decision_file, profiler)(upload.temporary_file_path())
+        else:
+            submitted_text = request.POST.get("textfield")
+            digest = document_digest(submitted_text)
+            if profiler is None:
+                context = cached_extract_decision(submitted_text, digest)
             else:
-                context["rules"] = "skca_2015"
+                context = profiled(extract_decision, profiler)(submitted_text)
 
-        if context["jurisdiction"] == "Saskatchewan" and int(context["decision_year"]) <= 2014 and int(context["decision_year"]) >= 2003:
-            skca_2003_instructions(context, metadata_lines)
-            context["rules"] = "skca_2003"
+        if profiler is not None:
+            profile_path = context.pop(PROFILE_PATH_KEY, None)
+            get_result_cache().set(result_cache_key(digest), context)
+        finish_extraction(request, submitted_text, context, digest)
 
-    return render(request, "index.html", context)
+    return add_profile_header(render(request, "index.html", context), profile_path)
+
+
+@stream_uploads_to_disk
+async def index_async(request):
+    """
+    The main view, with extraction run in the worker pool so that large documents do not hold
+    up other requests. Responds with 503 when the pool is saturated.
+    """
+    context = {}
+    profile_path = None
+    if request.method == "POST":
+        upload = request.FILES.get("sourcefile")
+        profiler = requested_profiler(request)
+        if upload is not None:
+            submitted_text = upload
+            digest = await sync_to_async(file_digest)(upload.temporary_file_path())
+        else:
+            submitted_text = request.POST.get("textfield")
+            digest = document_digest(submitted_text)
+
+        cache = get_result_cache()
+        key = result_cache_key(digest)
+        cached = None
+        if profiler is None:
+            cached = await cache.aget(key)
+            record_cache_lookups(cached is not None, cached is None)
+        if cached is not None:
+            context = cached
+        else:
+            try:
+                # An upload is read by the worker from its temporary file, which stays in
+                # place until the request is finished. A profiled extraction writes its
+                # profile from the worker.
+                if upload is not None:
+                    context = await get_extraction_pool().extract_file(
+                        upload.temporary_file_path(), profiled(extract_decision_file, profiler)
+                    )
+                else:
+                    context = await get_extraction_pool().extract(
+                        submitted_text, profiled(extract_decision, profiler)
+                    )
+            except PoolSaturated:
+                context["message"] = "The server is busy. Please try again shortly."
+                response = render(request, "index.html", context, status=503)
+                response["Retry-After"] = "1"
+                return response
+            except BrokenProcessPool:
+                # The worker died, e.g. out of memory; the pool starts new workers on next use
+                context["message"] = "The extraction process stopped unexpectedly."
+                return render(request, "index.html", context, status=500)
+            profile_path = context.pop(PROFILE_PATH_KEY, None)
+            await cache.aset(key, context)
+
+        await sync_to_async(finish_extraction)(request, submitted_text, context, digest)
+
+    return add_profile_header(render(request, "index.html", context), profile_path)
+
+
+@require_GET
+def metrics(request):
+    """
+    Pipeline metrics for Prometheus, merged across every process that extracts decisions.
+    The background queue depth is counted from the database when scraped.
+    """
+
+    # Include what this process has recorded since its last periodic write
+    write_snapshot()
+
+    job_documents = {status: 0 for status, _ in JobDocument.STATUS_CHOICES}
+    try:
+        for row in JobDocument.objects.values("status").annotate(count=Count("id")):
+            job_documents[row["status"]] = row["count"]
+    except DatabaseError:
+        # e.g. migrations not applied yet; the pipeline metrics are still worth scraping
+        job_documents = {}
+    extra_gauges = {
+        ("canlii_job_documents", (("status", status),)): count
+        for status, count in job_documents.items()
+    }
+
+    return HttpResponse(
+        render_metrics(read_snapshots(), extra_gauges),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )